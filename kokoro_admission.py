@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Kokoro Admission Control
+Size caps, per-client rate limits and cost-based load shedding in front of the synthesis queue
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from kokoro_metrics import REGISTRY
+from kokoro_scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, priority_name
+
+# Characters of normalized text per second of audio at speed_factor 1.0 (200 words per minute)
+CHARS_PER_AUDIO_SECOND = 16.0
+# Render seconds per audio second assumed until real renders have been measured
+INITIAL_RENDER_RATIO = 0.25
+# Weight of the newest render in the render ratio's moving average
+RENDER_RATIO_SMOOTHING = 0.2
+# Share of the queueing budget each priority may use; background work is shed first
+PRIORITY_BUDGET_SHARE = {
+    PRIORITY_INTERACTIVE: 1.0,
+    PRIORITY_NORMAL: 0.75,
+    PRIORITY_BACKGROUND: 0.5
+}
+
+REJECTED = REGISTRY.counter(
+    'kokoro_rejected_requests_total',
+    'Requests turned away by admission control (text_too_long, audio_too_long, rate_limited, overloaded, queue_full)',
+    ['reason']
+)
+
+class AdmissionRejected(Exception):
+    """A request turned away before synthesis; `status` is the HTTP status to answer with"""
+    
+    status = 503
+    reason = 'overloaded'
+    
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        REJECTED.inc(reason=self.reason)
+    
+    @property
+    def retry_after_header(self) -> Optional[str]:
+        """Whole seconds for a Retry-After header, or None if retrying will not help"""
+        if self.retry_after is None:
+            return None
+        return str(max(1, math.ceil(self.retry_after)))
+
+class TextTooLong(AdmissionRejected):
+    status = 413
+    reason = 'text_too_long'
+
+class AudioTooLong(AdmissionRejected):
+    status = 413
+    reason = 'audio_too_long'
+
+class RateLimited(AdmissionRejected):
+    status = 429
+    reason = 'rate_limited'
+
+class Overloaded(AdmissionRejected):
+    status = 503
+    reason = 'overloaded'
+
+def estimate_audio_seconds(text: str, speed_factor: float) -> float:
+    """Expected length of the rendered audio; slower voices produce more audio per character"""
+    return len(text) / (CHARS_PER_AUDIO_SECOND * max(speed_factor, 0.1))
+
+class TokenBucket:
+    """Refills at `rate` tokens per second up to `burst` tokens"""
+    
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+    
+    def take(self, amount: float = 1.0) -> float:
+        """Take `amount` tokens; returns 0 on success, else the seconds until they would be available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+class ClientRateLimiter:
+    """One token bucket per client; a rate of 0 disables limiting"""
+    
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        # client -> bucket, least recently seen first
+        self._buckets: 'OrderedDict[str, TokenBucket]' = OrderedDict()
+        self.rejected = 0
+    
+    def check(self, client: str, cost: float = 1.0):
+        """Charge a client for a request, raising RateLimited if its bucket is empty"""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(client)
+            wait = bucket.take(min(cost, self.burst))
+            if wait:
+                self.rejected += 1
+        if wait:
+            raise RateLimited(f"Rate limit exceeded ({self.rate:g} requests/s, burst {self.burst:g})", wait)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'clients': len(self._buckets),
+            'rejected': self.rejected
+        }
+
+class AdmissionTicket:
+    """Estimated audio seconds a request holds against the admission budget until released"""
+    
+    def __init__(self, controller: 'AdmissionController', audio_seconds: float):
+        self.controller = controller
+        self.remaining = audio_seconds
+    
+    def release(self, audio_seconds: Optional[float] = None):
+        """Give back part of the reservation (all of it by default); safe to call repeatedly"""
+        self.controller._release(self, audio_seconds)
+
+class AdmissionController:
+    """Sheds work whose estimated queueing delay would exceed the budget
+    
+    Every admitted request reserves its estimated audio length. Multiplied by
+    the measured render seconds per audio second and divided by the workers,
+    the reservations give the expected wait for a new request. A request is
+    turned away with 503 and a Retry-After when that wait plus its own render
+    time exceeds its priority's share of `max_wait_seconds`, so long texts are
+    shed before short ones and latency stays bounded under a burst.
+    """
+    
+    def __init__(self, workers: int, max_text_chars: int, max_audio_seconds: float, max_wait_seconds: float):
+        self.workers = max(1, workers)
+        self.max_text_chars = max_text_chars
+        self.max_audio_seconds = max_audio_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.render_ratio = INITIAL_RENDER_RATIO
+        self._lock = threading.Lock()
+        self.outstanding = 0.0
+        self.admitted = 0
+        self.shed = 0
+    
+    def check_text(self, text: str):
+        """Reject oversized text before it is normalized"""
+        if self.max_text_chars and len(text) > self.max_text_chars:
+            raise TextTooLong(f"Text is {len(text)} characters (max {self.max_text_chars})")
+    
+    def estimated_wait(self) -> float:
+        """Seconds until the work admitted so far has been rendered"""
+        return self.outstanding * self.render_ratio / self.workers
+    
+    def check_audio(self, audio_seconds: float):
+        """Reject a single utterance whose estimated audio is over the cap"""
+        if self.max_audio_seconds and audio_seconds > self.max_audio_seconds:
+            raise AudioTooLong(f"Text would produce about {audio_seconds:.0f}s of audio "
+                               f"(max {self.max_audio_seconds:g}s)")
+    
+    def admit(self, audio_seconds: float, priority: int = PRIORITY_NORMAL) -> AdmissionTicket:
+        """Check one utterance against the audio cap and reserve it"""
+        self.check_audio(audio_seconds)
+        return self.reserve(audio_seconds, priority)
+    
+    def reserve(self, audio_seconds: float, priority: int = PRIORITY_NORMAL) -> AdmissionTicket:
+        """Reserve `audio_seconds` of rendering, or raise Overloaded if it would wait too long"""
+        with self._lock:
+            wait = self.estimated_wait()
+            budget = self.max_wait_seconds * PRIORITY_BUDGET_SHARE.get(priority, 1.0)
+            excess = wait + audio_seconds * self.render_ratio - budget
+            # An idle server always admits, so a single large request is never starved;
+            # cached audio costs nothing and is never shed
+            if self.max_wait_seconds and self.outstanding > 0 and audio_seconds > 0 and excess > 0:
+                self.shed += 1
+                shed = True
+            else:
+                self.outstanding += audio_seconds
+                self.admitted += 1
+                shed = False
+        if shed:
+            raise Overloaded(f"Server is overloaded (about {wait:.1f}s of synthesis queued, "
+                             f"{priority_name(priority)} budget {budget:.0f}s)", excess)
+        return AdmissionTicket(self, audio_seconds)
+    
+    def _release(self, ticket: AdmissionTicket, audio_seconds: Optional[float]):
+        with self._lock:
+            amount = ticket.remaining if audio_seconds is None else min(audio_seconds, ticket.remaining)
+            ticket.remaining -= amount
+            self.outstanding = max(0.0, self.outstanding - amount)
+    
+    def observe(self, audio_seconds: float, render_seconds: float):
+        """Calibrate the render ratio from a finished render"""
+        if audio_seconds <= 0:
+            return
+        with self._lock:
+            self.render_ratio += RENDER_RATIO_SMOOTHING * (render_seconds / audio_seconds - self.render_ratio)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'outstanding_audio_seconds': round(self.outstanding, 3),
+                'estimated_wait_seconds': round(self.estimated_wait(), 3),
+                'render_ratio': round(self.render_ratio, 4),
+                'max_wait_seconds': self.max_wait_seconds,
+                'max_text_chars': self.max_text_chars,
+                'max_audio_seconds': self.max_audio_seconds,
+                'admitted': self.admitted,
+                'shed': self.shed
+            }
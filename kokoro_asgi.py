@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Kokoro TTS ASGI Server for ArcanumIDE
+Serves the Kokoro TTS routes from one long-lived event loop per process
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional, Union
+
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.concurrency import iterate_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import HTTPConnection, Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocket
+
+from kokoro_admission import AdmissionRejected
+from kokoro_encoding import NotAcceptable, OutputFormat, UnsupportedFormat, negotiate_format
+from kokoro_metrics import CONTENT_TYPE, HTTP_RESPONSES, REGISTRY, observe_stage
+from kokoro_pack import RangeNotSatisfiable, byte_range
+from kokoro_scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_NORMAL,
+    CancellationToken,
+    parse_priority
+)
+from kokoro_session import SpeechSession
+from kokoro_tts_server import (
+    MAX_BATCH_ITEMS,
+    SynthesisCancelled,
+    encode_batch_multipart,
+    encode_batch_zip,
+    request_client_id,
+    segment_headers,
+    voice_engine
+)
+
+logger = logging.getLogger(__name__)
+
+# Number of server processes, each with its own event loop and synthesis pool
+DEFAULT_PROCESSES = int(os.environ.get('KOKORO_PROCESSES', 1))
+
+def error(message: str, status_code: int) -> JSONResponse:
+    return JSONResponse({'error': message}, status_code=status_code)
+
+def rejection(e: AdmissionRejected) -> JSONResponse:
+    """Error response for a request turned away by admission control"""
+    headers = {'Retry-After': e.retry_after_header} if e.retry_after_header else None
+    return JSONResponse({'error': str(e)}, status_code=e.status, headers=headers)
+
+def rate_limit_key(request: HTTPConnection, client_id: Optional[str]) -> str:
+    """Clients are rate limited by client id, else by address"""
+    return client_id or (request.client.host if request.client else None) or 'anonymous'
+
+async def read_json(request: Request):
+    """Request body as JSON, or None when it is missing or malformed"""
+    try:
+        return await request.json()
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+class AudioResponse(Response):
+    """A response whose body may be a memoryview (a voice pack clip), handed to the server without a copy"""
+    
+    def render(self, content) -> Union[bytes, memoryview]:
+        if isinstance(content, memoryview):
+            return content
+        return super().render(content)
+
+def audio_response(audio_data: Union[bytes, memoryview], output: OutputFormat, stem: str, voice_id: str,
+                   headers: Optional[Dict[str, str]] = None, request: Optional[Request] = None,
+                   etag: Optional[str] = None) -> Response:
+    """Audio from memory or a voice pack; a GET `request` may ask for a byte range, checked against `etag` by If-Range"""
+    headers = {
+        'Content-Disposition': f'inline; filename="{stem}.{output.codec.extension}"',
+        'Vary': 'Accept',
+        **(headers or {})
+    }
+    if etag:
+        headers['ETag'] = f'"{etag}"'
+    status_code = 200
+    if request is not None and request.method == 'GET':
+        headers['Accept-Ranges'] = 'bytes'
+        if_range = request.headers.get('if-range')
+        if if_range is None or (etag and if_range == headers['ETag']):
+            length = len(audio_data)
+            try:
+                span = byte_range(request.headers.get('range'), length)
+            except RangeNotSatisfiable:
+                return Response(status_code=416, headers={'Content-Range': f'bytes */{length}'})
+            if span is not None:
+                start, end = span
+                audio_data = memoryview(audio_data)[start:end]
+                headers['Content-Range'] = f'bytes {start}-{end - 1}/{length}'
+                status_code = 206
+    
+    # Background tasks run once the body has been sent
+    started = time.perf_counter()
+    return AudioResponse(
+        audio_data,
+        status_code=status_code,
+        media_type=output.codec.mimetype,
+        headers=headers,
+        background=BackgroundTask(lambda: observe_stage('response_send', voice_id, time.perf_counter() - started))
+    )
+
+class ResponseCounter:
+    """ASGI middleware counting responses per endpoint and status for /metrics"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        
+        status = {}
+        
+        async def send_and_record(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            # The router stores the matched endpoint in the shared scope
+            endpoint = getattr(scope.get('endpoint'), '__name__', 'unknown')
+            HTTP_RESPONSES.inc(endpoint=endpoint, status=str(status.get('code', 500)))
+
+async def cancel_on_disconnect(request: Request, token: CancellationToken):
+    """Cancel `token` as soon as the client goes away
+    
+    Only call this once the body has been read: the next ASGI message is then
+    the disconnect.
+    """
+    while True:
+        message = await request.receive()
+        if message['type'] == 'http.disconnect':
+            token.cancel()
+            return
+
+async def run_cancellable(request: Request, token: CancellationToken, work):
+    """Await `work`, cancelling its renders if the client disconnects first"""
+    watcher = asyncio.ensure_future(cancel_on_disconnect(request, token))
+    try:
+        return await work
+    finally:
+        watcher.cancel()
+
+async def health_check(request: Request) -> Response:
+    """Health check endpoint"""
+    return JSONResponse(voice_engine.health_status())
+
+async def metrics(request: Request) -> Response:
+    """Prometheus metrics for this server process"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+async def get_voices(request: Request) -> Response:
+    """Get available voice configurations"""
+    return JSONResponse({'voices': voice_engine.describe_voices()})
+
+async def synthesize(request: Request) -> Response:
+    """Main TTS synthesis endpoint; GET takes the same fields as query parameters"""
+    try:
+        data = dict(request.query_params) if request.method == 'GET' else await read_json(request)
+        
+        if not data:
+            return error('No JSON data provided', 400)
+        
+        text = data.get('text', '')
+        voice_id = data.get('voice', 'kiro_assistant')
+        
+        if not text:
+            return error('No text provided', 400)
+        
+        try:
+            output = negotiate_format(data, request.headers.get('accept'))
+            priority = parse_priority(data.get('priority'), PRIORITY_INTERACTIVE)
+        except NotAcceptable as e:
+            return error(str(e), 406)
+        except ValueError as e:
+            return error(str(e), 400)
+        
+        logger.info(f"🎭 Synthesizing: '{text[:50]}...' with voice: {voice_id} as {output.name}")
+        
+        client_id = request_client_id(request.headers, data)
+        token = voice_engine.clients.issue(client_id)
+        report = {}
+        try:
+            voice_engine.rate_limiter.check(rate_limit_key(request, client_id))
+            clip = voice_engine.packed_clip(text, voice_id, output)
+            if clip is not None:
+                # Sent straight from the pack's mapping
+                return audio_response(clip.data, output, f'{voice_id}_speech', clip.entry.voice_id,
+                                      {'X-Voice-Pack': 'hit'}, request, etag=clip.entry.key)
+            audio_data = await run_cancellable(request, token, voice_engine.synthesize_speech(
+                text, voice_id, output=output, priority=priority, token=token, report=report
+            ))
+        except AdmissionRejected as e:
+            return rejection(e)
+        except SynthesisCancelled as e:
+            return error(str(e), 499)
+        except UnsupportedFormat as e:
+            return error(str(e), 406)
+        finally:
+            voice_engine.clients.release(client_id, token)
+        
+        return audio_response(audio_data, output, f'{voice_id}_speech', voice_engine.resolve_voice_id(voice_id),
+                              segment_headers(report), request)
+    
+    except Exception as e:
+        logger.error(f"Synthesis error: {e}")
+        return error(str(e), 500)
+
+async def synthesize_stream(request: Request) -> Response:
+    """Chunked TTS endpoint: audio starts after the first sentence is rendered"""
+    try:
+        data = await read_json(request)
+        
+        if not data:
+            return error('No JSON data provided', 400)
+        
+        text = data.get('text', '')
+        voice_id = data.get('voice', 'kiro_assistant')
+        
+        if not text:
+            return error('No text provided', 400)
+        
+        try:
+            priority = parse_priority(data.get('priority'), PRIORITY_INTERACTIVE)
+        except ValueError as e:
+            return error(str(e), 400)
+        
+        logger.info(f"🌊 Streaming: '{text[:50]}...' with voice: {voice_id}")
+        # stream_speech would block the event loop on a starting engine
+        await voice_engine.wait_until_ready()
+        
+        client_id = request_client_id(request.headers, data)
+        token = voice_engine.clients.issue(client_id)
+        try:
+            voice_engine.rate_limiter.check(rate_limit_key(request, client_id))
+            stream = voice_engine.stream_speech(text, voice_id, priority=priority, token=token)
+        except AdmissionRejected as e:
+            token.cancel()
+            voice_engine.clients.release(client_id, token)
+            return rejection(e)
+        
+        async def body():
+            # The generator blocks on worker results, so it is iterated in the thread pool.
+            # Starlette cancels this on disconnect, which drops the chunks still queued.
+            try:
+                async for chunk in iterate_in_threadpool(stream):
+                    yield chunk
+            finally:
+                token.cancel()
+                voice_engine.clients.release(client_id, token)
+        
+        return StreamingResponse(
+            body(),
+            media_type='audio/wav',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    
+    except Exception as e:
+        logger.error(f"Streaming synthesis error: {e}")
+        return error(str(e), 500)
+
+async def synthesize_batch(request: Request) -> Response:
+    """Render several utterances in one call, grouped by voice"""
+    try:
+        data = await read_json(request)
+        
+        if not data:
+            return error('No JSON data provided', 400)
+        
+        items = data.get('items')
+        if not isinstance(items, list) or not items:
+            return error('No items provided', 400)
+        if len(items) > MAX_BATCH_ITEMS:
+            return error(f'Too many items (max {MAX_BATCH_ITEMS})', 400)
+        
+        response_format = data.get('format', 'multipart')
+        if response_format not in ('multipart', 'zip'):
+            return error(f"Unknown batch format '{response_format}'", 400)
+        
+        try:
+            priority = parse_priority(data.get('priority'), PRIORITY_NORMAL)
+        except ValueError as e:
+            return error(str(e), 400)
+        
+        logger.info(f"📦 Batch synthesizing {len(items)} items")
+        
+        client_id = request_client_id(request.headers, data)
+        token = voice_engine.clients.issue(client_id)
+        try:
+            # Each item costs one request against the client's rate limit
+            voice_engine.rate_limiter.check(rate_limit_key(request, client_id), cost=len(items))
+            results = await run_cancellable(request, token, voice_engine.synthesize_batch(
+                items, priority=priority, token=token
+            ))
+        except AdmissionRejected as e:
+            return rejection(e)
+        finally:
+            voice_engine.clients.release(client_id, token)
+        
+        if response_format == 'zip':
+            return Response(
+                encode_batch_zip(results),
+                media_type='application/zip',
+                headers={'Content-Disposition': 'attachment; filename="batch_speech.zip"'}
+            )
+        
+        body, mimetype = encode_batch_multipart(results)
+        return Response(body, media_type=mimetype)
+    
+    except Exception as e:
+        logger.error(f"Batch synthesis error: {e}")
+        return error(str(e), 500)
+
+async def test_voice(request: Request) -> Response:
+    """Test a specific voice"""
+    voice_id = request.path_params['voice_id']
+    try:
+        test_text = voice_engine.test_phrase(voice_id)
+        
+        # Previews are background work unless asked otherwise
+        try:
+            output = negotiate_format(request.query_params, request.headers.get('accept'))
+            priority = parse_priority(request.query_params.get('priority'), PRIORITY_BACKGROUND)
+        except NotAcceptable as e:
+            return error(str(e), 406)
+        except ValueError as e:
+            return error(str(e), 400)
+        
+        client_id = request_client_id(request.headers, request.query_params)
+        token = voice_engine.clients.issue(client_id)
+        try:
+            voice_engine.rate_limiter.check(rate_limit_key(request, client_id))
+            audio_data = await run_cancellable(request, token, voice_engine.synthesize_speech(
+                test_text, voice_id, output=output, priority=priority, token=token
+            ))
+        except AdmissionRejected as e:
+            return rejection(e)
+        except SynthesisCancelled as e:
+            return error(str(e), 499)
+        except UnsupportedFormat as e:
+            return error(str(e), 406)
+        finally:
+            voice_engine.clients.release(client_id, token)
+        
+        return audio_response(audio_data, output, f'test_{voice_id}', voice_engine.resolve_voice_id(voice_id))
+    
+    except Exception as e:
+        logger.error(f"Voice test error: {e}")
+        return error(str(e), 500)
+
+async def cancel_requests(request: Request) -> Response:
+    """Cancel every outstanding request of one client"""
+    client_id = request_client_id(request.headers, await read_json(request))
+    
+    if not client_id:
+        return error('No client_id provided', 400)
+    
+    cancelled = voice_engine.clients.cancel(client_id)
+    logger.info(f"🛑 Cancelled {cancelled} request(s) for client {client_id}")
+    return JSONResponse({'client_id': client_id, 'cancelled': cancelled})
+
+async def speech_session(websocket: WebSocket):
+    """Conversational TTS session: text pushed in as it is generated, PCM frames pushed back sentence by sentence"""
+    await websocket.accept()
+    client_id = request_client_id(websocket.headers, websocket.query_params)
+    session = SpeechSession(voice_engine, websocket.send_json, websocket.send_bytes, rate_limit_key(websocket, client_id),
+                            lambda code: websocket.close(code=code))
+    try:
+        try:
+            # Query parameters preset the voice, priority and window, as a config message would
+            await voice_engine.wait_until_ready()
+            session.configure(websocket.query_params)
+        except ValueError as e:
+            await websocket.send_json({'type': 'error', 'message': str(e)})
+            await websocket.close(code=1008)
+            return
+        
+        logger.info(f"💬 Session opened with voice: {session.voice_id}")
+        await websocket.send_json({'type': 'ready', **session.describe()})
+        while True:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+            try:
+                data = json.loads(message.get('text') or 'null')
+                if not isinstance(data, dict):
+                    raise ValueError('Messages must be JSON objects')
+                await session.handle(data)
+            except AdmissionRejected as e:
+                # The rejected text is dropped; the session carries on with whatever comes next
+                await websocket.send_json({'type': 'error', 'message': str(e), 'status': e.status,
+                                           'retry_after': e.retry_after})
+            except (ValueError, TypeError) as e:
+                await websocket.send_json({'type': 'error', 'message': str(e)})
+    finally:
+        await session.close()
+        logger.info(f"💬 Session closed after {session.seq} frames")
+
+app = Starlette(
+    routes=[
+        Route('/health', health_check, methods=['GET']),
+        Route('/metrics', metrics, methods=['GET']),
+        Route('/voices', get_voices, methods=['GET']),
+        Route('/synthesize', synthesize, methods=['GET', 'POST']),
+        Route('/synthesize/stream', synthesize_stream, methods=['POST']),
+        Route('/synthesize/batch', synthesize_batch, methods=['POST']),
+        Route('/cancel', cancel_requests, methods=['POST']),
+        Route('/test/{voice_id}', test_voice, methods=['GET']),
+        WebSocketRoute('/session', speech_session)
+    ],
+    middleware=[
+        # Same policy as flask_cors defaults: any origin, method and header
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'],
+                   expose_headers=['X-Segments', 'X-Segments-Reused', 'X-Voice-Pack', 'Content-Range']),
+        Middleware(ResponseCounter)
+    ],
+    # Warm the engine in the background as soon as this worker process starts
+    on_startup=[voice_engine.start],
+    on_shutdown=[voice_engine.pool.shutdown]
+)
+
+if __name__ == '__main__':
+    import uvicorn
+    
+    parser = argparse.ArgumentParser(description='Kokoro TTS ASGI server')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5002)
+    parser.add_argument('--workers', type=int, default=DEFAULT_PROCESSES,
+                        help='server processes, each with its own event loop and synthesis pool')
+    args = parser.parse_args()
+    
+    print("🎭 Starting Kokoro TTS ASGI Server...")
+    print(f"🌟 Available at: http://localhost:{args.port} ({args.workers} process(es))")
+    
+    # An import string lets uvicorn start every worker process with its own app
+    uvicorn.run('kokoro_asgi:app', host=args.host, port=args.port, workers=args.workers)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Kokoro Audio Helpers
+WAV container handling shared by the TTS server's audio paths
+"""
+
+import io
+import struct
+import wave
+from typing import NamedTuple, Tuple
+
+# Data size used for WAV streams whose final length is not known yet
+STREAMING_DATA_SIZE = 0xFFFFFFFF
+
+class AudioFormat(NamedTuple):
+    """PCM layout of a clip"""
+    channels: int
+    sample_width: int
+    sample_rate: int
+
+def decode_wav(audio_data: bytes) -> Tuple[AudioFormat, bytes]:
+    """Split a WAV file into its PCM format and raw frames"""
+    with wave.open(io.BytesIO(audio_data), 'rb') as wav:
+        audio_format = AudioFormat(wav.getnchannels(), wav.getsampwidth(), wav.getframerate())
+        frames = wav.readframes(wav.getnframes())
+    return audio_format, frames
+
+def wav_duration(audio_data: bytes) -> float:
+    """Length of a WAV clip in seconds, read from its header"""
+    with wave.open(io.BytesIO(audio_data), 'rb') as wav:
+        return wav.getnframes() / float(wav.getframerate())
+
+def silence(audio_format: AudioFormat, seconds: float) -> bytes:
+    """PCM frames of silence (8-bit PCM is unsigned, so its silence is 0x80)"""
+    frames = int(seconds * audio_format.sample_rate) * audio_format.channels
+    fill = b'\x80' if audio_format.sample_width == 1 else b'\0' * audio_format.sample_width
+    return fill * frames
+
+def wav_header(audio_format: AudioFormat, data_size: int = STREAMING_DATA_SIZE) -> bytes:
+    """Build a PCM WAV header; the default size marks an open-ended stream"""
+    block_align = audio_format.channels * audio_format.sample_width
+    riff_size = min(data_size + 36, 0xFFFFFFFF)
+    return b''.join((
+        b'RIFF', struct.pack('<I', riff_size), b'WAVE',
+        b'fmt ', struct.pack('<IHHIIHH', 16, 1, audio_format.channels, audio_format.sample_rate,
+                             audio_format.sample_rate * block_align, block_align,
+                             audio_format.sample_width * 8),
+        b'data', struct.pack('<I', data_size)
+    ))
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Kokoro Synthesis Backends
+Speech engines the synthesis workers render with, selected per voice
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from kokoro_metrics import observe_stage
+from kokoro_voice_index import SystemVoice, describe_system_voice
+
+logger = logging.getLogger(__name__)
+
+# Backend for voices that do not name one
+DEFAULT_BACKEND = os.environ.get('KOKORO_BACKEND', 'pyttsx3')
+# Per-voice overrides: "voice_id=backend[:model_voice],..."
+VOICE_BACKENDS = os.environ.get('KOKORO_VOICE_BACKENDS', '')
+
+# pyttsx3 words per minute at speed_factor 1.0
+BASE_RATE = 200
+
+# Neural Kokoro model: directory holding config.json, the .pth weights and voices/<name>.pt
+MODEL_DIR = Path(os.environ.get('KOKORO_MODEL_DIR', Path.home() / '.cache' / 'kokoro' / 'Kokoro-82M'))
+# int8 dynamic quantization of the model's Linear and LSTM layers
+MODEL_QUANTIZE = os.environ.get('KOKORO_MODEL_QUANTIZE', '0') == '1'
+# Intra-op threads for the model; 0 splits the cores evenly between the workers
+MODEL_THREADS = int(os.environ.get('KOKORO_MODEL_THREADS', 0))
+# Most utterances packed into one forward pass (1 disables packing)
+MODEL_BATCH = int(os.environ.get('KOKORO_MODEL_BATCH', 8))
+MODEL_SAMPLE_RATE = 24000
+# Token context of the model, including the two boundary tokens
+MODEL_CONTEXT = 510
+# Kokoro voice packs for character voices that do not name one, by (base_voice, british accent)
+MODEL_VOICES = {
+    ('female', False): 'af_heart',
+    ('female', True): 'bf_emma',
+    ('male', False): 'am_michael',
+    ('male', True): 'bm_george'
+}
+
+# Per-text result of a backend render: WAV bytes, or the exception for that text
+RenderOutcome = Union[bytes, Exception]
+
+# pyttsx3's espeak and NSSpeechSynthesizer drivers keep their state per process (one synthesizer,
+# one audio callback, one voice and rate), so thread workers share one engine and take turns;
+# SAPI5 engines are per-thread COM objects and render side by side
+_shared_engine: Optional[Any] = None
+_shared_engine_lock = threading.Lock()
+
+class BackendUnavailable(Exception):
+    """Raised when a backend cannot be created in this process"""
+
+class SynthesisBackend:
+    """A speech engine owned by one synthesis worker thread
+    
+    Backends are created on the worker thread that uses them, so engines that
+    are bound to a thread (SAPI5 COM objects, pyttsx3 drivers) stay there.
+    """
+    
+    name = ''
+    
+    def list_voices(self) -> Tuple[List[SystemVoice], Optional[str]]:
+        """Installed voices and the engine's default voice id"""
+        return [], None
+    
+    def render(self, texts: List[str], voice_id: str, voice_config: Dict[str, Any],
+               system_voice_id: Optional[str]) -> List[RenderOutcome]:
+        """Render each text with one voice; returns WAV bytes or an exception per text"""
+        raise NotImplementedError
+    
+    def close(self):
+        pass
+
+class Pyttsx3Backend(SynthesisBackend):
+    """System voices through pyttsx3 (SAPI5, NSSpeechSynthesizer or espeak)
+    
+    On espeak and NSSpeechSynthesizer every worker thread of a process uses
+    the same engine, one render at a time; use process workers to render
+    those in parallel. `engine_factory` engines are owned by their worker.
+    """
+    
+    name = 'pyttsx3'
+    # True when this backend takes turns on the process-wide engine
+    shared = False
+    
+    def __init__(self, scratch_file: Path, workers: int, engine_factory: Optional[Callable[[], Any]] = None):
+        global _shared_engine
+        if engine_factory is not None:
+            self.engine = engine_factory()
+            self.lock = threading.Lock()
+        elif sys.platform == 'win32':
+            # SAPI5 is COM based and needs COM initialised on every thread
+            import pythoncom
+            pythoncom.CoInitialize()
+            import pyttsx3
+            
+            # pyttsx3.init() caches one engine per driver, so build it directly
+            self.engine = pyttsx3.Engine()
+            self.lock = threading.Lock()
+        else:
+            import pyttsx3
+            
+            with _shared_engine_lock:
+                if _shared_engine is None:
+                    _shared_engine = pyttsx3.Engine()
+            self.engine = _shared_engine
+            self.lock = _shared_engine_lock
+            self.shared = True
+        with self.lock:
+            self.engine.setProperty('rate', BASE_RATE)
+            self.engine.setProperty('volume', 0.8)
+        # pyttsx3 can only render to a path, so each worker reuses one scratch file
+        self.scratch_file = scratch_file
+    
+    def list_voices(self) -> Tuple[List[SystemVoice], Optional[str]]:
+        with self.lock:
+            voices = [describe_system_voice(voice) for voice in self.engine.getProperty('voices') or []]
+            return voices, self.engine.getProperty('voice')
+    
+    def render(self, texts: List[str], voice_id: str, voice_config: Dict[str, Any],
+               system_voice_id: Optional[str]) -> List[RenderOutcome]:
+        # Held for the whole group, so no other worker changes the voice or rate in between
+        with self.lock:
+            try:
+                self.engine.setProperty('rate', int(BASE_RATE * voice_config['speed_factor']))
+                # Always set a voice so a previous job's voice never carries over
+                if system_voice_id:
+                    self.engine.setProperty('voice', system_voice_id)
+            except Exception as e:
+                logger.warning(f"Could not apply voice characteristics: {e}")
+            
+            outcomes: List[RenderOutcome] = []
+            for text in texts:
+                try:
+                    outcomes.append(self._render_one(text, voice_id))
+                except Exception as e:
+                    outcomes.append(e)
+            return outcomes
+    
+    def _render_one(self, text: str, voice_id: str) -> bytes:
+        started = time.perf_counter()
+        # Empty the scratch file so a silent engine failure cannot hand back
+        # the previous job's audio
+        with open(self.scratch_file, 'wb'):
+            pass
+        
+        # runAndWait() returns once the engine has finished writing the file
+        synthesis_started = time.perf_counter()
+        self.engine.save_to_file(text, str(self.scratch_file))
+        self.engine.runAndWait()
+        
+        read_started = time.perf_counter()
+        audio_data = self.scratch_file.read_bytes()
+        if not audio_data:
+            raise Exception("Audio file was not created")
+        observe_stage('synthesis', voice_id, read_started - synthesis_started)
+        observe_stage('file_io', voice_id, (synthesis_started - started) + (time.perf_counter() - read_started))
+        return audio_data
+    
+    def close(self):
+        try:
+            self.scratch_file.unlink()
+        except OSError:
+            pass
+
+class KokoroModel:
+    """The neural Kokoro model, its voice packs and G2P pipelines, shared by every worker"""
+    
+    _shared: Optional['KokoroModel'] = None
+    _shared_error: Optional[Exception] = None
+    _shared_lock = threading.Lock()
+    
+    def __init__(self, model_dir: Path, quantize: bool, threads: int):
+        import torch
+        from kokoro import KModel
+        
+        weights = sorted(model_dir.glob('*.pth'))
+        if not (model_dir / 'config.json').is_file() or not weights:
+            raise BackendUnavailable(f"no Kokoro config.json and .pth weights in {model_dir}")
+        
+        torch.set_num_threads(threads)
+        model = KModel(config=str(model_dir / 'config.json'), model=str(weights[-1])).eval()
+        if quantize:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8)
+        
+        self.torch = torch
+        self.model = model
+        self.vocab: Dict[str, int] = model.vocab
+        self.model_dir = model_dir
+        self._voices: Dict[str, Any] = {}
+        self._pipelines: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        logger.info(f"🧠 Kokoro model loaded from {weights[-1]} ({threads} threads, int8={quantize})")
+    
+    @classmethod
+    def shared(cls, workers: int) -> 'KokoroModel':
+        """Load the model once per process; a failed load is not retried"""
+        with cls._shared_lock:
+            if cls._shared is None and cls._shared_error is None:
+                threads = MODEL_THREADS or max(1, (os.cpu_count() or 1) // max(1, workers))
+                try:
+                    cls._shared = cls(MODEL_DIR, MODEL_QUANTIZE, threads)
+                except Exception as e:
+                    cls._shared_error = e
+            if cls._shared is None:
+                raise BackendUnavailable(f"Kokoro model unavailable: {cls._shared_error}")
+            return cls._shared
+    
+    def voice_pack(self, name: str):
+        """Style vectors for one voice, indexed by phoneme count"""
+        with self._lock:
+            pack = self._voices.get(name)
+            if pack is None:
+                path = self.model_dir / 'voices' / f"{name}.pt"
+                pack = self._voices[name] = self.torch.load(str(path), weights_only=True)
+            return pack
+    
+    def phoneme_chunks(self, voice_name: str, text: str) -> List[List[int]]:
+        """Token ids for each chunk the G2P pipeline splits a text into"""
+        from kokoro import KPipeline
+        
+        # Voice names start with their language code ('a' American, 'b' British, ...)
+        lang_code = voice_name[0]
+        with self._lock:
+            pipeline = self._pipelines.get(lang_code)
+            if pipeline is None:
+                pipeline = self._pipelines[lang_code] = KPipeline(lang_code=lang_code, model=False)
+            # The G2P models are not documented as thread safe
+            results = list(pipeline(text))
+        
+        chunks = []
+        for result in results:
+            ids = [self.vocab[p] for p in result.phonemes or '' if p in self.vocab]
+            if ids:
+                chunks.append(ids[:MODEL_CONTEXT - 2])
+        return chunks
+
+class KokoroTorchBackend(SynthesisBackend):
+    """The neural Kokoro model on CPU with torch
+    
+    Several utterances for one voice are packed into a single forward pass,
+    separated by a pause token, and the output is cut back apart using the
+    model's predicted token durations.
+    """
+    
+    name = 'kokoro'
+    
+    def __init__(self, scratch_file: Path, workers: int):
+        self.model = KokoroModel.shared(workers)
+        self.separator = self.model.vocab.get(' ')
+    
+    def list_voices(self) -> Tuple[List[SystemVoice], Optional[str]]:
+        voices = [
+            SystemVoice(path.stem, path.stem, (path.stem[0],), None)
+            for path in sorted((self.model.model_dir / 'voices').glob('*.pt'))
+        ]
+        return voices, MODEL_VOICES[('female', False)]
+    
+    def render(self, texts: List[str], voice_id: str, voice_config: Dict[str, Any],
+               system_voice_id: Optional[str]) -> List[RenderOutcome]:
+        from kokoro_dsp import encode_wav
+        
+        import numpy as np
+        
+        voice_name = model_voice(voice_config)
+        speed = voice_config.get('speed_factor', 1.0)
+        outcomes: List[Optional[RenderOutcome]] = [None] * len(texts)
+        # (text index, token ids) for every G2P chunk, in order
+        segments: List[Tuple[int, List[int]]] = []
+        for index, text in enumerate(texts):
+            try:
+                chunks = self.model.phoneme_chunks(voice_name, text)
+                if not chunks:
+                    raise Exception("Text produced no phonemes")
+                segments.extend((index, ids) for ids in chunks)
+            except Exception as e:
+                outcomes[index] = e
+        
+        pieces: Dict[int, list] = {index: [] for index, _ in segments}
+        try:
+            pack = self.model.voice_pack(voice_name)
+            started = time.perf_counter()
+            with self.model.torch.inference_mode():
+                for batch in self._pack(segments):
+                    for index, audio in self._forward(batch, pack, speed):
+                        pieces[index].append(audio)
+            observe_stage('synthesis', voice_id, time.perf_counter() - started)
+        except Exception as e:
+            for index in pieces:
+                outcomes[index] = e
+            return outcomes
+        
+        for index, audio in pieces.items():
+            if outcomes[index] is None:
+                samples = np.concatenate(audio)
+                outcomes[index] = encode_wav(samples[:, None], MODEL_SAMPLE_RATE)
+        return outcomes
+    
+    def _pack(self, segments: List[Tuple[int, List[int]]]) -> List[List[Tuple[int, List[int]]]]:
+        """Group consecutive segments into batches that fit the model context"""
+        batches, batch, tokens = [], [], 2
+        for segment in segments:
+            needed = len(segment[1]) + (1 if batch else 0)
+            if batch and (tokens + needed > MODEL_CONTEXT or len(batch) >= MODEL_BATCH or self.separator is None):
+                batches.append(batch)
+                batch, tokens, needed = [], 2, len(segment[1])
+            batch.append(segment)
+            tokens += needed
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def _forward(self, batch: List[Tuple[int, List[int]]], pack, speed: float) -> List[Tuple[int, Any]]:
+        """One forward pass over a packed batch, split back into per-segment audio"""
+        torch = self.model.torch
+        ids, separators = [0], []
+        for position, (_, segment_ids) in enumerate(batch):
+            if position:
+                separators.append(len(ids))
+                ids.append(self.separator)
+            ids.extend(segment_ids)
+        ids.append(0)
+        
+        # Style vectors are indexed by the phoneme count, without boundary tokens
+        ref_s = pack[min(len(ids) - 3, len(pack) - 1)]
+        audio, durations = self.model.model.forward_with_tokens(torch.LongTensor([ids]), ref_s, speed)
+        audio = audio.float().cpu().numpy().reshape(-1)
+        durations = durations.cpu().numpy().reshape(-1)
+        
+        if len(batch) == 1:
+            return [(batch[0][0], audio)]
+        if len(durations) != len(ids):
+            # Alignment not as expected: render the segments one by one instead
+            return [piece for segment in batch for piece in self._forward([segment], pack, speed)]
+        
+        # Cut in the middle of each separator's predicted duration
+        frame_ends = durations.cumsum()
+        samples_per_frame = len(audio) / frame_ends[-1]
+        cuts = [int(round((frame_ends[p] - durations[p] / 2) * samples_per_frame)) for p in separators]
+        bounds = [0] + cuts + [len(audio)]
+        return [(index, audio[bounds[i]:bounds[i + 1]]) for i, (index, _) in enumerate(batch)]
+
+def model_voice(voice_config: Dict[str, Any]) -> str:
+    """Kokoro voice pack for a character voice, from 'model_voice' or its gender and accent"""
+    if voice_config.get('model_voice'):
+        return voice_config['model_voice']
+    female = voice_config.get('base_voice') != 'male'
+    return MODEL_VOICES[('female' if female else 'male', voice_config.get('accent') == 'british')]
+
+def parse_voice_backends(spec: str) -> Dict[str, Dict[str, str]]:
+    """Voice config overrides from a KOKORO_VOICE_BACKENDS value"""
+    overrides = {}
+    for entry in spec.split(','):
+        voice_id, _, choice = entry.strip().partition('=')
+        if not voice_id or not choice:
+            continue
+        backend, _, voice_name = choice.strip().partition(':')
+        overrides[voice_id.strip()] = {'backend': backend.strip()}
+        if voice_name:
+            overrides[voice_id.strip()]['model_voice'] = voice_name.strip()
+    return overrides
+
+# Backend name -> factory(scratch_file=..., workers=...) called on the worker thread
+BACKENDS: Dict[str, Callable[..., SynthesisBackend]] = {
+    Pyttsx3Backend.name: Pyttsx3Backend,
+    KokoroTorchBackend.name: KokoroTorchBackend
+}
+
+def register_backend(name: str, factory: Callable[..., SynthesisBackend]):
+    """Add or replace a backend, e.g. a stub for load tests"""
+    BACKENDS[name] = factory
+
+def create_backend(name: str, scratch_file: Path, workers: int) -> SynthesisBackend:
+    factory = BACKENDS.get(name)
+    if factory is None:
+        raise BackendUnavailable(f"Unknown synthesis backend '{name}' (choose from {', '.join(BACKENDS)})")
+    return factory(scratch_file=scratch_file, workers=workers)
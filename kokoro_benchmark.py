@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Kokoro TTS Benchmarks
+Checks the TTS server against its documented performance budgets
+"""
+
+import argparse
+import http.client
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
+
+# Startup budget (see KOKORO_SETUP.md): a cold `import kokoro_tts_server`
+# must stay cheap, and the engine must be ready shortly after start()
+STARTUP_BUDGET = {
+    'import_seconds': 1.5,
+    'ready_seconds': 5.0,
+    'import_rss_mb': 150.0
+}
+# Modules that must not be loaded just by importing the server
+HEAVY_MODULES = ('torch', 'torchaudio', 'numpy', 'pyttsx3')
+
+STARTUP_PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import kokoro_tts_server
+imported = time.perf_counter()
+from kokoro_benchmark import HEAVY_MODULES, peak_rss_mb
+import_rss = peak_rss_mb()
+heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+ready = kokoro_tts_server.voice_engine.start().result(timeout=120)
+print(json.dumps({
+    'import_seconds': imported - started,
+    'ready_seconds': time.perf_counter() - imported,
+    'import_rss_mb': import_rss,
+    'ready_rss_mb': peak_rss_mb(),
+    'engine_ready': ready,
+    'heavy_modules_at_import': heavy
+}))
+'''
+
+# Load test texts: one sentence repeated to each length, so runs are comparable
+LOAD_SENTENCE = "The quick brown fox jumps over the lazy dog near the riverbank."
+LOAD_TEXT_SENTENCES = {'short': 1, 'medium': 3, 'long': 8}
+# Metrics compared against a baseline, and whether higher values are better
+REGRESSION_METRICS = {
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'requests_per_second': True,
+    'rtf': True
+}
+
+# Stub backend timing: words per second of audio, and how much faster than real time it renders
+STUB_WORDS_PER_SECOND = 2.5
+STUB_REALTIME_FACTOR = 20.0
+STUB_SAMPLE_RATE = 22050
+
+class StubVoice(NamedTuple):
+    id: str
+    name: str
+    languages: Tuple[str, ...]
+    gender: Optional[str]
+
+class StubEngine:
+    """Deterministic stand-in for a pyttsx3 engine, driven by the pyttsx3 backend
+    
+    Produces silence whose length depends only on the word count and rate,
+    after sleeping for a fixed fraction of that length, so load test results
+    reflect the server rather than the speech backend.
+    """
+    
+    voices = [
+        StubVoice('stub-female', 'Stub Female', ('en-us',), 'female'),
+        StubVoice('stub-male', 'Stub Male', ('en-us',), 'male'),
+        StubVoice('stub-gb', 'Stub English (Great Britain)', ('en-gb',), 'male')
+    ]
+    
+    def __init__(self):
+        self.properties = {'rate': 200, 'volume': 1.0, 'voice': self.voices[0].id, 'voices': self.voices}
+        self.pending: List[Tuple[str, str]] = []
+    
+    def setProperty(self, name: str, value: Any):
+        self.properties[name] = value
+    
+    def getProperty(self, name: str) -> Any:
+        return self.properties[name]
+    
+    def save_to_file(self, text: str, path: str):
+        self.pending.append((text, path))
+    
+    def runAndWait(self):
+        for text, path in self.pending:
+            words = max(1, len(text.split()))
+            seconds = words / STUB_WORDS_PER_SECOND * 200 / max(1, self.properties['rate'])
+            time.sleep(seconds / STUB_REALTIME_FACTOR)
+            with wave.open(path, 'wb') as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(STUB_SAMPLE_RATE)
+                wav.writeframes(b'\0\0' * int(seconds * STUB_SAMPLE_RATE))
+        self.pending = []
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process, where the platform reports it"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def measure_startup(runs: int) -> Dict[str, Any]:
+    """Cold-start the server module in fresh interpreters and keep the best run"""
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', STARTUP_PROBE],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    
+    best = min(samples, key=lambda sample: sample['import_seconds'] + sample['ready_seconds'])
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in best.items()}
+
+def check_startup(result: Dict[str, Any]) -> list:
+    """Budget violations for one startup measurement"""
+    failures = []
+    for metric, budget in STARTUP_BUDGET.items():
+        value = result.get(metric)
+        if value is not None and value > budget:
+            failures.append(f"{metric} = {value} exceeds budget {budget}")
+    if result['heavy_modules_at_import']:
+        failures.append(f"heavy modules loaded at import: {', '.join(result['heavy_modules_at_import'])}")
+    if not result['engine_ready']:
+        failures.append("engine did not become ready")
+    return failures
+
+def run_startup(args) -> int:
+    result = measure_startup(args.runs)
+    failures = check_startup(result)
+    report = {'benchmark': 'startup', 'budget': STARTUP_BUDGET, 'result': result, 'failures': failures}
+    
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    return 1 if failures else 0
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Linear-interpolated percentile of a list of samples"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def wav_seconds(audio_data: bytes) -> float:
+    with wave.open(io.BytesIO(audio_data), 'rb') as wav:
+        return wav.getnframes() / float(wav.getframerate())
+
+def register_stub_backends():
+    """Render every backend a voice may be configured with through the stub"""
+    import kokoro_backends
+    
+    for name in list(kokoro_backends.BACKENDS):
+        kokoro_backends.register_backend(
+            name, lambda **kwargs: kokoro_backends.Pyttsx3Backend(engine_factory=StubEngine, **kwargs)
+        )
+
+def load_server(args):
+    """Import the server configured for load testing and start its engine"""
+    os.environ['KOKORO_WORKERS'] = str(args.workers)
+    os.environ['KOKORO_WORKER_MODE'] = args.worker_mode
+    # Every request should reach the engine unless the cache is under test
+    if not args.cache:
+        os.environ['KOKORO_CACHE_MB'] = '0'
+        os.environ['KOKORO_DISK_CACHE_MB'] = '0'
+    
+    if args.backend == 'stub':
+        # Worker processes register the stub themselves
+        os.environ['KOKORO_WORKER_INIT'] = 'kokoro_benchmark:register_stub_backends'
+        register_stub_backends()
+    import kokoro_tts_server
+    
+    if not kokoro_tts_server.voice_engine.start().result(timeout=120):
+        raise RuntimeError("TTS engine did not become ready")
+    # Measure steady state, not the prewarm renders
+    kokoro_tts_server.voice_engine.warmed.wait(120)
+    return kokoro_tts_server
+
+class InProcessClient:
+    """Calls the Flask app directly through its test client (one per thread)"""
+    
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+    
+    def post(self, path: str, body: Dict[str, Any]) -> Tuple[int, bytes]:
+        if not hasattr(self.local, 'client'):
+            self.local.client = self.app.test_client()
+        response = self.local.client.post(path, json=body)
+        return response.status_code, response.get_data()
+    
+    def close(self):
+        pass
+
+class SocketClient:
+    """Serves the Flask app on a local port and calls it over HTTP (one connection per thread)"""
+    
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.port = self.server.server_port
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.local = threading.local()
+    
+    def post(self, path: str, body: Dict[str, Any]) -> Tuple[int, bytes]:
+        if not hasattr(self.local, 'connection'):
+            self.local.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=120)
+        connection = self.local.connection
+        try:
+            connection.request('POST', path, json.dumps(body), {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            # Reconnect on the next request
+            connection.close()
+            del self.local.connection
+            raise
+    
+    def close(self):
+        self.server.shutdown()
+
+def load_requests(voices: List[str], lengths: List[str], rounds: int) -> List[Dict[str, Any]]:
+    """Every voice at every text length, `rounds` times
+    
+    Every sentence names its request, so no segment is coalesced or cached.
+    """
+    requests = []
+    for round_index in range(rounds):
+        for length in lengths:
+            for voice_id in voices:
+                number = len(requests) + 1
+                text = ' '.join(f"Request {number}, part {part + 1}: {LOAD_SENTENCE}"
+                                for part in range(LOAD_TEXT_SENTENCES[length]))
+                requests.append({'length': length, 'body': {'text': text, 'voice': voice_id}})
+    return requests
+
+def run_level(client, requests: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    """Send every request with `concurrency` in flight and summarise the results"""
+    def send(item):
+        started = time.perf_counter()
+        try:
+            status, body = client.post('/synthesize', item['body'])
+        except Exception:
+            status, body = None, b''
+        elapsed = time.perf_counter() - started
+        audio_seconds = wav_seconds(body) if status == 200 else 0.0
+        return item['length'], status, elapsed, audio_seconds
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(send, requests))
+    wall_seconds = time.perf_counter() - started
+    
+    latencies = [elapsed * 1000 for _, status, elapsed, _ in outcomes if status == 200]
+    audio_seconds = sum(seconds for _, _, _, seconds in outcomes)
+    by_length = {}
+    for length in LOAD_TEXT_SENTENCES:
+        samples = [elapsed * 1000 for name, status, elapsed, _ in outcomes if name == length and status == 200]
+        if samples:
+            by_length[length] = {'p50_ms': round(percentile(samples, 50), 2), 'p95_ms': round(percentile(samples, 95), 2)}
+    
+    def rounded(value):
+        return round(value, 2) if value is not None else None
+    
+    return {
+        'concurrency': concurrency,
+        'requests': len(outcomes),
+        'errors': sum(1 for _, status, _, _ in outcomes if status != 200),
+        'p50_ms': rounded(percentile(latencies, 50)),
+        'p95_ms': rounded(percentile(latencies, 95)),
+        'p99_ms': rounded(percentile(latencies, 99)),
+        'requests_per_second': round(len(outcomes) / wall_seconds, 2),
+        # Audio seconds delivered per wall second across all concurrent requests
+        'rtf': round(audio_seconds / wall_seconds, 2),
+        'peak_rss_mb': peak_rss_mb(),
+        'by_length': by_length
+    }
+
+def compare_to_baseline(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> list:
+    """Regressions of `report` against a stored report, matched by concurrency level"""
+    failures = []
+    if baseline.get('config', {}).get('backend') != report['config']['backend']:
+        failures.append(f"baseline backend {baseline.get('config', {}).get('backend')} does not match "
+                        f"{report['config']['backend']}")
+        return failures
+    
+    previous_levels = {level['concurrency']: level for level in baseline.get('levels', [])}
+    for level in report['levels']:
+        previous = previous_levels.get(level['concurrency'])
+        if previous is None:
+            continue
+        for metric, higher_is_better in REGRESSION_METRICS.items():
+            value, reference = level.get(metric), previous.get(metric)
+            if value is None or not reference:
+                continue
+            change = (value - reference) / reference
+            if (-change if higher_is_better else change) > tolerance:
+                failures.append(f"concurrency {level['concurrency']}: {metric} = {value} "
+                                f"vs baseline {reference} ({change:+.0%})")
+        if level['errors'] > previous.get('errors', 0):
+            failures.append(f"concurrency {level['concurrency']}: {level['errors']} errors "
+                            f"vs baseline {previous.get('errors', 0)}")
+    return failures
+
+def run_load(args) -> int:
+    server = load_server(args)
+    voices = list(server.voice_engine.voice_configs)
+    lengths = [length for length in args.lengths.split(',') if length]
+    unknown = [length for length in lengths if length not in LOAD_TEXT_SENTENCES]
+    if unknown:
+        raise SystemExit(f"unknown text lengths: {', '.join(unknown)} (choose from {', '.join(LOAD_TEXT_SENTENCES)})")
+    
+    client = SocketClient(server.app) if args.transport == 'socket' else InProcessClient(server.app)
+    levels = []
+    try:
+        # One unmeasured pass so engine and voice caches are warm
+        run_level(client, load_requests(voices, lengths, 1)[:len(voices)], 1)
+        for concurrency in args.concurrency:
+            levels.append(run_level(client, load_requests(voices, lengths, args.rounds), concurrency))
+    finally:
+        client.close()
+        server.voice_engine.pool.shutdown()
+    
+    report = {
+        'benchmark': 'load',
+        'config': {
+            'backend': args.backend,
+            'transport': args.transport,
+            'workers': args.workers,
+            'worker_mode': args.worker_mode,
+            'cache': args.cache,
+            'voices': voices,
+            'lengths': lengths,
+            'rounds': args.rounds
+        },
+        'levels': levels,
+        'failures': []
+    }
+    if args.baseline:
+        report['failures'] = compare_to_baseline(report, json.loads(Path(args.baseline).read_text()), args.tolerance)
+    
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    return 1 if report['failures'] else 0
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Kokoro TTS benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    startup = commands.add_parser('startup', help='cold import and time-to-ready against the startup budget')
+    startup.add_argument('--runs', type=int, default=3)
+    startup.add_argument('--output', help='write the JSON report to this file')
+    startup.set_defaults(handler=run_startup)
+    
+    load = commands.add_parser('load', help='latency, throughput and RTF of /synthesize under concurrent load')
+    load.add_argument('--backend', choices=('stub', 'real'), default='stub',
+                      help='deterministic stub engine, or the configured synthesis backends')
+    load.add_argument('--transport', choices=('inprocess', 'socket'), default='inprocess',
+                      help='Flask test client, or HTTP over a local socket')
+    load.add_argument('--concurrency', type=lambda value: [int(level) for level in value.split(',')],
+                      default=[1, 2, 4, 8], help='comma separated concurrency levels (default 1,2,4,8)')
+    load.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help='synthesis workers')
+    load.add_argument('--worker-mode', choices=('thread', 'process'), default='thread',
+                      help='synthesis workers as threads of the server process, or one process each')
+    load.add_argument('--lengths', default=','.join(LOAD_TEXT_SENTENCES), help='text lengths to cover')
+    load.add_argument('--rounds', type=int, default=2, help='passes over every voice and length per level')
+    load.add_argument('--cache', action='store_true', help='keep the audio cache enabled')
+    load.add_argument('--output', help='write the JSON report to this file')
+    load.add_argument('--baseline', help='JSON report to compare against; regressions fail the run')
+    load.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression (default 0.2)')
+    load.set_defaults(handler=run_load)
+    
+    args = parser.parse_args()
+    return args.handler(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
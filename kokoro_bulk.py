@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Kokoro Bulk Rendering
+Renders a phrase manifest for every voice into a voice pack, offline and resumable
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+from kokoro_pack import PackWriter
+
+logger = logging.getLogger(__name__)
+
+# Seconds between progress lines
+PROGRESS_SECONDS = 10.0
+
+async def render_manifest(engine, phrases: list, writer: PackWriter, output, window: int) -> Dict[str, Any]:
+    """Render every phrase not already in the pack, `window` at a time, appending each as it finishes"""
+    stats = {'phrases': len(phrases), 'rendered': 0, 'skipped': 0, 'failed': 0}
+    started = last_progress = time.monotonic()
+    queued = set()
+    pending = set()
+    
+    async def render(key: str, phrase) -> tuple:
+        return key, phrase, await engine.synthesize_speech(phrase.text, phrase.voice_id, output=output)
+    
+    def settle(done):
+        nonlocal last_progress
+        for task in done:
+            try:
+                key, phrase, audio_data = task.result()
+            except Exception as e:
+                stats['failed'] += 1
+                logger.warning(f"Could not render phrase: {e}")
+                continue
+            writer.add(key, phrase.voice_id, phrase.text, phrase.name, output.codec.mimetype, audio_data)
+            stats['rendered'] += 1
+        if time.monotonic() - last_progress >= PROGRESS_SECONDS:
+            last_progress = time.monotonic()
+            finished = stats['rendered'] + stats['skipped'] + stats['failed']
+            logger.info(f"📦 {finished}/{stats['phrases']} phrases, "
+                        f"{stats['rendered'] / (last_progress - started):.1f} renders/s")
+    
+    for phrase in phrases:
+        # The key is the audio cache's content address, so a changed voice config renders afresh
+        key = engine.content_key(phrase.text, phrase.voice_id, output)
+        if key in writer or key in queued:
+            stats['skipped'] += 1
+            continue
+        queued.add(key)
+        pending.add(asyncio.ensure_future(render(key, phrase)))
+        if len(pending) >= window:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            settle(done)
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        settle(done)
+    
+    stats['seconds'] = round(time.monotonic() - started, 3)
+    return stats
+
+def queue_size(workers: int, window: int) -> int:
+    """Queue slots `window` phrases in flight can fill at once, each rendered a few chunks ahead"""
+    return window * (workers + 1)
+
+def run(args) -> int:
+    # The engine reads its settings at import. Bulk rendering paces itself, so nothing is shed,
+    # and there is no point prewarming voices the manifest is about to render anyway
+    window = args.window or args.workers * 2
+    os.environ['KOKORO_WORKER_MODE'] = args.worker_mode
+    os.environ['KOKORO_WORKERS'] = str(args.workers)
+    os.environ['KOKORO_MAX_QUEUE_SECONDS'] = '0'
+    # A multi-sentence phrase queues up to one chunk per worker plus one, and nothing may be turned away
+    os.environ['KOKORO_QUEUE_SIZE'] = str(max(queue_size(args.workers, window),
+                                              int(os.environ.get('KOKORO_QUEUE_SIZE', 0))))
+    os.environ['KOKORO_PREWARM'] = '0'
+    os.environ['KOKORO_PRERENDER_MANIFEST'] = ''
+    os.environ['KOKORO_VOICE_PACK'] = ''
+    from kokoro_encoding import negotiate_format
+    from kokoro_tts_server import voice_engine
+    
+    output = negotiate_format({'format': args.format, 'sample_rate': args.sample_rate})
+    phrases = voice_engine.read_phrase_manifest(Path(args.manifest))
+    if args.voices:
+        voices = set(args.voices.split(','))
+        phrases = [phrase for phrase in phrases if phrase.voice_id in voices]
+    
+    writer = PackWriter(Path(args.output))
+    logger.info(f"📦 Rendering {len(phrases)} phrases into {args.output} "
+                f"({len(writer.entries)} clips already packed)")
+    try:
+        stats = asyncio.run(render_manifest(voice_engine, phrases, writer, output, window))
+    finally:
+        writer.close()
+        voice_engine.pool.shutdown()
+    
+    stats.update(clips=len(writer.entries), pack_bytes=writer.size)
+    print(json.dumps(stats, indent=2))
+    return 1 if stats['failed'] else 0
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Render a phrase manifest into a Kokoro voice pack')
+    parser.add_argument('manifest', help='.jsonl, .csv, .json or one-phrase-per-line manifest')
+    parser.add_argument('--output', required=True, help='voice pack directory (created, or resumed if it exists)')
+    parser.add_argument('--voices', help='comma separated voice ids to render (default: as the manifest says)')
+    parser.add_argument('--format', default='wav', help='output format (wav, opus, mp3, flac, ...)')
+    parser.add_argument('--sample-rate', type=int, help='resample the output to this rate')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='synthesis workers')
+    parser.add_argument('--worker-mode', choices=('thread', 'process'), default='process',
+                        help='one process per synthesis worker (default), or threads of this process')
+    parser.add_argument('--window', type=int, default=0, help='renders in flight (default: two per worker)')
+    return run(parser.parse_args())
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Kokoro Audio Cache
+Content-addressed cache for synthesized audio with a memory and a disk tier
+"""
+
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Any, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: without the lock, concurrent evictions may only remove a few clips too many
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# How often the disk tier re-reads its directory to account for clips other processes wrote
+DISK_SYNC_SECONDS = 5.0
+
+def config_hash(voice_config: Dict[str, Any]) -> str:
+    """Stable hash of a voice configuration"""
+    encoded = json.dumps(voice_config, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+def cache_key(text: str, voice_id: str, voice_config: Dict[str, Any], output_format: str = 'wav') -> str:
+    """Content address for one rendered clip"""
+    digest = hashlib.sha256()
+    for part in (text, voice_id, config_hash(voice_config), output_format):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+class AudioCache:
+    """Two-tier LRU cache: bytes-bounded memory tier plus optional disk tier
+    
+    Several server processes can share one disk directory. Clips are
+    published with an atomic rename, a lookup that misses this process's
+    index checks the directory for clips other processes wrote, and the size
+    limit is enforced over the whole directory under a file lock, oldest
+    (least recently read) clips first. A clip evicted by another process
+    while being read is just a miss.
+    """
+    
+    def __init__(self, max_memory_bytes: int, disk_dir: Optional[Path] = None, max_disk_bytes: int = 0):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes if disk_dir else 0
+        self.disk_dir = disk_dir if self.max_disk_bytes > 0 else None
+        
+        self._lock = threading.Lock()
+        # key -> (voice_id, audio bytes), oldest first
+        self._memory: 'OrderedDict[str, Tuple[str, bytes]]' = OrderedDict()
+        self._memory_bytes = 0
+        # key -> (voice_id, file size), oldest first
+        self._disk: 'OrderedDict[str, Tuple[str, int]]' = OrderedDict()
+        self._disk_bytes = 0
+        self._disk_synced = 0.0
+        
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._load_disk_index()
+    
+    def _disk_path(self, voice_id: str, key: str) -> Path:
+        return self.disk_dir / voice_id / f"{key}.bin"
+    
+    def _load_disk_index(self):
+        """Rebuild the disk tier index from files left by a previous run"""
+        with self._disk_lock():
+            self._scan_disk()
+            self._evict_disk()
+        
+        if self._disk:
+            logger.info(f"💾 Audio cache loaded {len(self._disk)} clips ({self._disk_bytes} bytes) from disk")
+    
+    def _scan_disk(self):
+        """Index every clip in the directory, least recently read first"""
+        entries = []
+        for path in self.disk_dir.glob("*/*.bin"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path.parent.name, path.stem, stat.st_size))
+        
+        self._disk.clear()
+        self._disk_bytes = 0
+        for _, voice_id, key, size in sorted(entries):
+            self._disk[key] = (voice_id, size)
+            self._disk_bytes += size
+        self._disk_synced = time.monotonic()
+    
+    @contextmanager
+    def _disk_lock(self) -> Iterator[None]:
+        """Exclusive lock on the disk directory across processes"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.disk_dir / '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _find_shared(self, key: str) -> Optional[str]:
+        """Voice of a clip another process wrote since the last scan, indexing it"""
+        for voice_dir in self.disk_dir.iterdir():
+            if not voice_dir.is_dir():
+                continue
+            try:
+                size = self._disk_path(voice_dir.name, key).stat().st_size
+            except OSError:
+                continue
+            self._disk[key] = (voice_dir.name, size)
+            self._disk_bytes += size
+            return voice_dir.name
+        return None
+    
+    def get(self, key: str) -> Optional[bytes]:
+        """Look up a clip, promoting disk hits into memory"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[1]
+            
+            disk_entry = self._disk.get(key)
+            voice_id = disk_entry[0] if disk_entry is not None else None
+            if voice_id is None and self.disk_dir:
+                voice_id = self._find_shared(key)
+            if voice_id is not None:
+                path = self._disk_path(voice_id, key)
+                try:
+                    audio_data = path.read_bytes()
+                    # The file's mtime is the LRU order every sharing process evicts by
+                    os.utime(path)
+                except OSError:
+                    self._drop_disk(key)
+                else:
+                    self._disk.move_to_end(key)
+                    self.disk_hits += 1
+                    self._store_memory(key, voice_id, audio_data)
+                    return audio_data
+            
+            self.misses += 1
+            return None
+    
+    def __contains__(self, key: str) -> bool:
+        """Whether a clip is cached, without counting a hit or a miss"""
+        with self._lock:
+            if key in self._memory or key in self._disk:
+                return True
+            return bool(self.disk_dir) and self._find_shared(key) is not None
+    
+    def put(self, key: str, voice_id: str, audio_data: bytes) -> None:
+        """Store a clip in every enabled tier"""
+        with self._lock:
+            self._store_memory(key, voice_id, audio_data)
+            if self.disk_dir and key not in self._disk:
+                self._store_disk(key, voice_id, audio_data)
+    
+    def invalidate_voice(self, voice_id: str) -> int:
+        """Drop every cached clip rendered with the given voice"""
+        with self._lock:
+            removed = 0
+            for key in [k for k, (v, _) in self._memory.items() if v == voice_id]:
+                _, audio_data = self._memory.pop(key)
+                self._memory_bytes -= len(audio_data)
+                removed += 1
+            for key in [k for k, (v, _) in self._disk.items() if v == voice_id]:
+                self._drop_disk(key)
+                removed += 1
+            return removed
+    
+    def _store_memory(self, key: str, voice_id: str, audio_data: bytes):
+        if len(audio_data) > self.max_memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous[1])
+        self._memory[key] = (voice_id, audio_data)
+        self._memory_bytes += len(audio_data)
+        
+        while self._memory_bytes > self.max_memory_bytes:
+            _, (_, evicted) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.evictions += 1
+    
+    def _store_disk(self, key: str, voice_id: str, audio_data: bytes):
+        if len(audio_data) > self.max_disk_bytes:
+            return
+        path = self._disk_path(voice_id, key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            # Per process, so two processes storing the same clip never write one temp file
+            tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+            tmp_path.write_bytes(audio_data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write audio cache entry: {e}")
+            return
+        
+        self._disk[key] = (voice_id, len(audio_data))
+        self._disk_bytes += len(audio_data)
+        if self._disk_bytes > self.max_disk_bytes or time.monotonic() - self._disk_synced > DISK_SYNC_SECONDS:
+            with self._disk_lock():
+                # Other processes' clips count against the same limit
+                self._scan_disk()
+                self._evict_disk()
+    
+    def _evict_disk(self):
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            self._drop_disk(next(iter(self._disk)))
+            self.evictions += 1
+    
+    def _drop_disk(self, key: str):
+        entry = self._disk.pop(key, None)
+        if entry is None:
+            return
+        voice_id, size = entry
+        self._disk_bytes -= size
+        try:
+            self._disk_path(voice_id, key).unlink()
+        except OSError:
+            pass
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'hits': self.memory_hits + self.disk_hits,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_bytes
+            }
+
+class _Inflight:
+    """One shared render and the callers waiting on it"""
+    
+    def __init__(self, priority: int, promote: Optional[Callable[[int], Any]]):
+        self.future: Optional[concurrent.futures.Future] = None
+        self.waiters: Set[concurrent.futures.Future] = set()
+        self.finished = False
+        self.priority = priority
+        self.promote = promote
+
+class InflightRequests:
+    """Coalesces identical renders that are in flight at the same time
+    
+    The first caller for a key starts the render; later callers with the same
+    key attach to it. Every caller gets its own future, so one of them giving
+    up (a closed stream, a disconnected client) never cancels the render for
+    the rest. The shared job is cancelled only when nobody waits for it any
+    more and it has not started. Failures reach every waiter, because an
+    identical retry would fail the same way. A caller more urgent than the
+    render's current priority promotes it through the leader's `promote`.
+    """
+    
+    def __init__(self):
+        self._entries: Dict[str, _Inflight] = {}
+        self._lock = threading.Lock()
+        
+        self.started = 0
+        self.coalesced = 0
+        self.abandoned = 0
+        self.promoted = 0
+    
+    def submit(self, key: str, start: Callable[[], concurrent.futures.Future], priority: int = 0,
+               promote: Optional[Callable[[int], Any]] = None) -> concurrent.futures.Future:
+        """Future for the render under `key`, calling `start` only if none is in flight
+        
+        Lower `priority` values are more urgent.
+        """
+        waiter = concurrent.futures.Future()
+        promote_to = None
+        with self._lock:
+            entry = self._entries.get(key)
+            leader = entry is None
+            if leader:
+                entry = self._entries[key] = _Inflight(priority, promote)
+                self.started += 1
+            else:
+                self.coalesced += 1
+                if priority < entry.priority:
+                    entry.priority = priority
+                    # Before the job is queued the leader applies the promotion itself
+                    if entry.future is not None and entry.promote:
+                        promote_to = priority
+                        self.promoted += 1
+            entry.waiters.add(waiter)
+        waiter.add_done_callback(lambda done: self._detach(key, entry, done))
+        if promote_to is not None:
+            entry.promote(promote_to)
+        
+        if leader:
+            try:
+                shared = start()
+            except Exception as e:
+                # Callers that attached meanwhile share the leader's failure (e.g. a full queue)
+                self._finish(key, entry)
+                for other in self._take_waiters(entry, exclude=waiter):
+                    if other.set_running_or_notify_cancel():
+                        other.set_exception(e)
+                raise
+            with self._lock:
+                entry.future = shared
+                promote_to = entry.priority if entry.priority < priority else None
+                if promote_to is not None:
+                    self.promoted += 1
+            shared.add_done_callback(lambda done: self._deliver(key, entry, done))
+            # A more urgent caller may have joined while the job was being queued
+            if promote_to is not None and promote:
+                promote(promote_to)
+            # Everyone may have given up while the job was being queued
+            self._abandon_if_unwanted(key, entry)
+        return waiter
+    
+    def _finish(self, key: str, entry: _Inflight):
+        with self._lock:
+            entry.finished = True
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+    
+    def _take_waiters(self, entry: _Inflight, exclude: Optional[concurrent.futures.Future] = None) -> list:
+        with self._lock:
+            waiters = [w for w in entry.waiters if w is not exclude]
+            entry.waiters.clear()
+        return waiters
+    
+    def _deliver(self, key: str, entry: _Inflight, shared: concurrent.futures.Future):
+        self._finish(key, entry)
+        for waiter in self._take_waiters(entry):
+            if shared.cancelled():
+                waiter.cancel()
+            elif not waiter.set_running_or_notify_cancel():
+                continue
+            elif shared.exception() is not None:
+                waiter.set_exception(shared.exception())
+            else:
+                waiter.set_result(shared.result())
+    
+    def _detach(self, key: str, entry: _Inflight, waiter: concurrent.futures.Future):
+        if waiter.cancelled():
+            with self._lock:
+                entry.waiters.discard(waiter)
+            self._abandon_if_unwanted(key, entry)
+    
+    def _abandon_if_unwanted(self, key: str, entry: _Inflight):
+        """Drop a still-queued render once its last waiter is gone
+        
+        A running render stays in flight so new identical requests can still join it.
+        """
+        with self._lock:
+            shared = entry.future
+            if entry.finished or entry.waiters or shared is None or shared.running():
+                return
+            entry.finished = True
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+        # Cancelling runs the shared future's callbacks, so it must happen outside the lock
+        if shared.cancel():
+            with self._lock:
+                self.abandoned += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'in_flight': len(self._entries),
+                'renders_started': self.started,
+                'coalesced_requests': self.coalesced,
+                'promoted_renders': self.promoted,
+                'abandoned_renders': self.abandoned
+            }
@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+Kokoro Voice Effects
+Vectorized post-synthesis DSP that turns voice_configs characteristics into sound
+"""
+
+import io
+import wave
+import zlib
+from typing import Dict, Any, List, NamedTuple, Optional
+
+import numpy as np
+
+from kokoro_audio import AudioFormat, decode_wav
+
+# How far a pitch_shift of +/-1.0 moves the voice
+PITCH_RANGE_SEMITONES = 6.0
+# Phase-vocoder frame size for pitch shifting; frames overlap by 75%
+PITCH_FFT_SIZE = 1024
+# Characteristic values that leave the sound untouched
+NEUTRAL_WARMTH = 0.5
+NEUTRAL_CLARITY = 0.8
+# Length of the linear-phase EQ kernel
+EQ_TAPS = 512
+# Overlap at every join of stitched clips: long enough to hide the click, too short to smear a syllable
+CROSSFADE_SECONDS = 0.01
+# Silence trimming: analysis window, level below which a window is silent, and silence kept at each edge
+TRIM_WINDOW_SECONDS = 0.01
+TRIM_THRESHOLD_DBFS = -45.0
+TRIM_KEEP_SECONDS = 0.1
+# Loudness measurement (ITU-R BS.1770): 400 ms gating blocks made of four 100 ms steps
+LOUDNESS_STEP_SECONDS = 0.1
+LOUDNESS_STEPS_PER_BLOCK = 4
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = 10.0
+# Most gain the leveler applies either way, and the peak it keeps below
+MAX_GAIN_DB = 20.0
+PEAK_CEILING = 0.98
+
+def pcm_to_float(frames: bytes, audio_format: AudioFormat) -> np.ndarray:
+    """Decode interleaved PCM into a (samples, channels) float32 array in [-1, 1]"""
+    width = audio_format.sample_width
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype='<i2').astype(np.float32) / 32768.0
+    elif width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        padded = np.zeros((len(raw), 4), dtype=np.uint8)
+        padded[:, 1:] = raw
+        samples = padded.view('<i4').ravel().astype(np.float32) / 2147483648.0
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype='<i4').astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Unsupported sample width: {width}")
+    return samples.reshape(-1, audio_format.channels)
+
+def float_to_pcm16(samples: np.ndarray) -> bytes:
+    """Encode a (samples, channels) float array as interleaved 16-bit PCM"""
+    clipped = np.clip(samples, -1.0, 1.0)
+    return (clipped * 32767.0).astype('<i2').tobytes()
+
+def encode_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    """Write a float array as a 16-bit PCM WAV file"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(samples.shape[1])
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(float_to_pcm16(samples))
+    return buffer.getvalue()
+
+def fft_size(length: int) -> int:
+    """Next power of two, so kernel spectra can be reused across clips"""
+    return 1 << max(0, length - 1).bit_length()
+
+class VoiceEffectsChain:
+    """Precomputed effects for one voice at one sample rate
+    
+    Stages run in order: pitch shift, gruffness saturation, breathiness noise,
+    then a single FFT convolution that applies the warmth/clarity EQ and the
+    reverb together.
+    """
+    
+    def __init__(self, voice_id: str, voice_config: Dict[str, Any], sample_rate: int):
+        characteristics = voice_config.get('characteristics', {})
+        self.sample_rate = sample_rate
+        # Seed per voice so identical input always renders identical (cacheable) audio
+        self.seed = zlib.crc32(voice_id.encode('utf-8'))
+        
+        # Pitch shift: phase-vocoder time stretch followed by resampling
+        semitones = voice_config.get('pitch_shift', 0.0) * PITCH_RANGE_SEMITONES
+        self.pitch_ratio = 2.0 ** (semitones / 12.0)
+        self.pv_hop = PITCH_FFT_SIZE // 4
+        self.pv_window = np.hanning(PITCH_FFT_SIZE + 1)[:-1]
+        self.pv_bin_advance = 2.0 * np.pi * self.pv_hop * np.arange(PITCH_FFT_SIZE // 2 + 1) / PITCH_FFT_SIZE
+        
+        self.gruffness = float(characteristics.get('gruffness', 0.0))
+        self.breathiness = float(characteristics.get('breathiness', 0.0))
+        self.breath_window = max(1, int(0.01 * sample_rate))
+        
+        warmth = float(characteristics.get('warmth', NEUTRAL_WARMTH))
+        clarity = float(characteristics.get('clarity', NEUTRAL_CLARITY))
+        self.reverb = float(characteristics.get('reverb', 0.0))
+        
+        # EQ and reverb collapse into one kernel: eq * (dry + wet * ir)
+        kernel = None
+        self.kernel_delay = 0
+        if abs(warmth - NEUTRAL_WARMTH) > 1e-3 or abs(clarity - NEUTRAL_CLARITY) > 1e-3:
+            kernel = self._design_eq(warmth, clarity)
+            self.kernel_delay = EQ_TAPS // 2
+        self.tail = 0
+        if self.reverb > 0:
+            impulse = self._design_reverb(self.reverb)
+            room = np.zeros(len(impulse), dtype=np.float64)
+            room[0] = 1.0
+            room += self.reverb * impulse
+            kernel = room if kernel is None else np.convolve(kernel, room)
+            self.tail = len(impulse)
+        self.kernel = kernel
+        self._kernel_spectra: Dict[int, np.ndarray] = {}
+    
+    def _design_eq(self, warmth: float, clarity: float) -> np.ndarray:
+        """Linear-phase FIR for a spectral tilt (warmth) plus a presence band (clarity)"""
+        freqs = np.fft.rfftfreq(EQ_TAPS, 1.0 / self.sample_rate)
+        octaves = np.log2(np.maximum(freqs, 20.0) / 1000.0)
+        
+        # Warm voices tilt energy towards the low end, pivoting at 1 kHz
+        tilt_db = np.clip(-(warmth - NEUTRAL_WARMTH) * 6.0 * octaves, -12.0, 12.0)
+        # Clarity lifts or dips the 3.5 kHz presence region
+        presence = np.exp(-0.5 * (np.log2(np.maximum(freqs, 20.0) / 3500.0) / 0.6) ** 2)
+        presence_db = (clarity - NEUTRAL_CLARITY) * 20.0 * presence
+        
+        gain = 10.0 ** ((tilt_db + presence_db) / 20.0)
+        kernel = np.roll(np.fft.irfft(gain, EQ_TAPS), EQ_TAPS // 2)
+        return kernel * np.hanning(EQ_TAPS)
+    
+    def _design_reverb(self, amount: float) -> np.ndarray:
+        """Synthetic room impulse: sparse early reflections and a decaying noise tail"""
+        rng = np.random.default_rng(self.seed)
+        rt60 = 0.3 + 1.2 * amount
+        length = int(rt60 * self.sample_rate)
+        t = np.arange(length) / self.sample_rate
+        
+        impulse = rng.standard_normal(length) * np.exp(-6.9 * t / rt60)
+        reflections = rng.integers(int(0.005 * self.sample_rate), int(0.05 * self.sample_rate), size=6)
+        impulse[reflections] += rng.uniform(0.3, 0.7, size=6) * np.sign(rng.standard_normal(6))
+        impulse[0] = 0.0
+        return impulse / np.sqrt(np.sum(impulse ** 2))
+    
+    def _kernel_spectrum(self, n_fft: int) -> np.ndarray:
+        spectrum = self._kernel_spectra.get(n_fft)
+        if spectrum is None:
+            spectrum = np.fft.rfft(self.kernel, n_fft)
+            self._kernel_spectra[n_fft] = spectrum
+        return spectrum
+    
+    def _stft(self, x: np.ndarray) -> np.ndarray:
+        padded = np.pad(x, (PITCH_FFT_SIZE, PITCH_FFT_SIZE))
+        count = 1 + (len(padded) - PITCH_FFT_SIZE) // self.pv_hop
+        frames = np.lib.stride_tricks.as_strided(
+            padded, shape=(count, PITCH_FFT_SIZE),
+            strides=(padded.strides[0] * self.pv_hop, padded.strides[0])
+        )
+        return np.fft.rfft(frames * self.pv_window, axis=1)
+    
+    def _istft(self, spectra: np.ndarray) -> np.ndarray:
+        frames = np.fft.irfft(spectra, PITCH_FFT_SIZE, axis=1) * self.pv_window
+        positions = (np.arange(len(frames))[:, None] * self.pv_hop + np.arange(PITCH_FFT_SIZE)[None, :]).ravel()
+        out = np.bincount(positions, weights=frames.ravel())
+        overlap = np.bincount(positions, weights=np.tile(self.pv_window ** 2, len(frames)))
+        return out / np.maximum(overlap, 1e-6)
+    
+    def _pitch_shift(self, x: np.ndarray) -> np.ndarray:
+        """Stretch time by the pitch ratio, then resample back to the original duration"""
+        n = len(x)
+        spectra = self._stft(x.astype(np.float64))
+        
+        # Read analysis frames at fractional steps; magnitudes are interpolated
+        steps = np.arange(0, len(spectra) - 1, 1.0 / self.pitch_ratio)
+        base = steps.astype(int)
+        frac = (steps - base)[:, None]
+        magnitude = (1.0 - frac) * np.abs(spectra[base]) + frac * np.abs(spectra[base + 1])
+        
+        # Accumulate each bin's true phase advance so partials stay coherent
+        advance = np.angle(spectra[base + 1]) - np.angle(spectra[base]) - self.pv_bin_advance
+        advance -= 2.0 * np.pi * np.round(advance / (2.0 * np.pi))
+        phase = np.angle(spectra[0]) + np.cumsum(self.pv_bin_advance + advance, axis=0)
+        phase = np.vstack([np.angle(spectra[:1]), phase[:-1]])
+        
+        stretched = self._istft(magnitude * np.exp(1j * phase))[PITCH_FFT_SIZE:]
+        read_positions = np.arange(n) * self.pitch_ratio
+        return np.interp(read_positions, np.arange(len(stretched)), stretched, right=0.0).astype(np.float32)
+    
+    def _saturate(self, x: np.ndarray) -> np.ndarray:
+        """Soft clipping plus a low-rate amplitude flutter for a growl"""
+        drive = 1.0 + 6.0 * self.gruffness
+        saturated = np.tanh(drive * x) / np.tanh(drive)
+        t = np.arange(len(x), dtype=np.float32) / self.sample_rate
+        flutter = 1.0 - 0.3 * self.gruffness * (0.5 + 0.5 * np.sin(2.0 * np.pi * 28.0 * t))
+        return ((1.0 - self.gruffness) * x + self.gruffness * saturated) * flutter
+    
+    def _add_breath(self, x: np.ndarray) -> np.ndarray:
+        """High-passed noise that follows the speech envelope"""
+        rng = np.random.default_rng(self.seed)
+        cumulative = np.cumsum(np.abs(x), dtype=np.float64)
+        w = self.breath_window
+        envelope = np.empty_like(cumulative)
+        envelope[:w] = cumulative[:w] / np.arange(1, w + 1)
+        envelope[w:] = (cumulative[w:] - cumulative[:-w]) / w
+        noise = np.diff(rng.standard_normal(len(x) + 1)) * 0.5
+        return x + (self.breathiness * 0.5 * envelope * noise).astype(np.float32)
+    
+    def _convolve(self, x: np.ndarray) -> np.ndarray:
+        """Apply the combined EQ/reverb kernel, keeping the reverb tail"""
+        n_fft = fft_size(len(x) + len(self.kernel) - 1)
+        y = np.fft.irfft(np.fft.rfft(x, n_fft) * self._kernel_spectrum(n_fft), n_fft)
+        start = self.kernel_delay
+        return y[start:start + len(x) + self.tail].astype(np.float32)
+    
+    def process_channel(self, x: np.ndarray) -> np.ndarray:
+        if abs(self.pitch_ratio - 1.0) > 1e-3:
+            x = self._pitch_shift(x)
+        if self.gruffness > 0:
+            x = self._saturate(x)
+        if self.breathiness > 0:
+            x = self._add_breath(x)
+        if self.kernel is not None:
+            x = self._convolve(x)
+        return x
+    
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Run the chain over a (samples, channels) float32 array"""
+        if len(samples) == 0:
+            return samples
+        out = np.stack([self.process_channel(samples[:, c]) for c in range(samples.shape[1])], axis=1)
+        
+        # Keep EQ boosts and saturation from clipping
+        peak = float(np.max(np.abs(out)))
+        if peak > 0.99:
+            out *= 0.99 / peak
+        return out
+
+def stitch_clips(clips: List[bytes], pauses: List[float], crossfade_seconds: float = CROSSFADE_SECONDS) -> bytes:
+    """Join WAV clips of one format into one WAV, each followed by its pause
+    
+    Every join (clip to pause, pause to clip, clip to clip) is an equal-gain
+    crossfade of `crossfade_seconds`. The last clip's pause is dropped.
+    """
+    decoded = [decode_wav(audio_data) for audio_data in clips]
+    audio_format = decoded[0][0]
+    if any(clip_format != audio_format for clip_format, _ in decoded):
+        raise ValueError("Stitched clips do not share one audio format")
+    
+    pieces = []
+    for index, (_, frames) in enumerate(decoded):
+        pieces.append(pcm_to_float(frames, audio_format))
+        pause = int(pauses[index] * audio_format.sample_rate) if index < len(decoded) - 1 else 0
+        if pause > 0:
+            pieces.append(np.zeros((pause, audio_format.channels), dtype=np.float32))
+    
+    fade = max(1, int(crossfade_seconds * audio_format.sample_rate))
+    overlaps = [0] + [min(fade, len(before), len(after)) for before, after in zip(pieces, pieces[1:])]
+    out = np.zeros((sum(len(piece) for piece in pieces) - sum(overlaps), audio_format.channels), dtype=np.float32)
+    position = 0
+    for piece, overlap in zip(pieces, overlaps):
+        start = position - overlap
+        if overlap:
+            ramp = np.linspace(0.0, 1.0, overlap, dtype=np.float32)[:, None]
+            out[start:position] = out[start:position] * (1.0 - ramp) + piece[:overlap] * ramp
+        out[position:start + len(piece)] = piece[overlap:]
+        position = start + len(piece)
+    return encode_wav(out, audio_format.sample_rate)
+
+def _biquad_power(b: List[float], a: List[float], w: np.ndarray) -> np.ndarray:
+    """Squared magnitude response of a biquad at normalized angular frequencies `w`"""
+    z = np.exp(-1j * w)
+    return np.abs(np.polyval(b[::-1], z)) ** 2 / np.abs(np.polyval(a[::-1], z)) ** 2
+
+def k_weighting(n_fft: int, sample_rate: int) -> np.ndarray:
+    """Per-bin factors turning |rfft|^2 of n_fft samples into their K-weighted mean square
+    
+    K-weighting (ITU-R BS.1770) is a +4 dB high shelf from about 1.5 kHz
+    followed by a 38 Hz high-pass. Applied to the spectrum by Parseval instead
+    of filtering sample by sample, so a whole batch of steps is one rfft.
+    """
+    w = 2 * np.pi * np.fft.rfftfreq(n_fft, 1.0 / sample_rate) / sample_rate
+    
+    gain = 10 ** (4.0 / 40)
+    w0 = 2 * np.pi * 1500.0 / sample_rate
+    cos_w0, alpha = np.cos(w0), np.sin(w0) / (2 * np.sqrt(0.5))
+    shelf = _biquad_power(
+        [gain * ((gain + 1) + (gain - 1) * cos_w0 + 2 * np.sqrt(gain) * alpha),
+         -2 * gain * ((gain - 1) + (gain + 1) * cos_w0),
+         gain * ((gain + 1) + (gain - 1) * cos_w0 - 2 * np.sqrt(gain) * alpha)],
+        [(gain + 1) - (gain - 1) * cos_w0 + 2 * np.sqrt(gain) * alpha,
+         2 * ((gain - 1) - (gain + 1) * cos_w0),
+         (gain + 1) - (gain - 1) * cos_w0 - 2 * np.sqrt(gain) * alpha],
+        w
+    )
+    w0 = 2 * np.pi * 38.0 / sample_rate
+    cos_w0, alpha = np.cos(w0), np.sin(w0) / (2 * 0.5)
+    high_pass = _biquad_power(
+        [(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2],
+        [1 + alpha, -2 * cos_w0, 1 - alpha],
+        w
+    )
+    # Every bin but DC (and Nyquist, for even sizes) stands for two conjugate bins
+    fold = np.full(len(w), 2.0)
+    fold[0] = 1.0
+    if n_fft % 2 == 0:
+        fold[-1] = 1.0
+    return (shelf * high_pass * fold / n_fft ** 2).astype(np.float32)
+
+def _lufs(power: float) -> float:
+    return -0.691 + 10 * np.log10(max(power, 1e-12))
+
+def _power(lufs: float) -> float:
+    return 10 ** ((lufs + 0.691) / 10)
+
+class Leveler:
+    """Streaming silence trim and loudness normalization for one clip or stream
+    
+    Audio goes through process() chunk by chunk and the stream ends with
+    flush(). Loudness is measured as it arrives (K-weighted and gated per
+    ITU-R BS.1770) and the gain toward `target_lufs` follows the running
+    measurement, ramped across each chunk so it never steps. Leading silence is
+    dropped before the first sound; silence after the latest sound is held
+    back until more sound follows, so trailing silence is only dropped by
+    flush(). Between chunks only that held silence and under one 100 ms step
+    of unmeasured audio are kept.
+    """
+    
+    def __init__(self, sample_rate: int, channels: int, target_lufs: Optional[float], trim: bool = True):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.target_lufs = target_lufs
+        self.trim = trim
+        self.step = max(1, int(LOUDNESS_STEP_SECONDS * sample_rate))
+        self.weights = k_weighting(self.step, sample_rate)
+        self.window = max(1, int(TRIM_WINDOW_SECONDS * sample_rate))
+        self.keep = int(TRIM_KEEP_SECONDS * sample_rate)
+        # Mean square per sample (over all channels) below which a window is silent
+        self.threshold = 10 ** (TRIM_THRESHOLD_DBFS / 10)
+        self.gain: Optional[float] = None
+        self.trimmed_frames = 0
+        self._empty = np.zeros((0, channels), dtype=np.float32)
+        self._unmeasured = self._empty
+        self._step_powers: List[float] = []
+        self._heard = False
+        # Silence before the first sound (at most `keep` frames), and silence after the latest sound
+        self._lead = self._empty
+        self._held: List[np.ndarray] = []
+    
+    @property
+    def trimmed_seconds(self) -> float:
+        return self.trimmed_frames / self.sample_rate
+    
+    def _weighted_power(self, steps: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """K-weighted mean square of (count, frames, channels) steps, summed over channels"""
+        spectra = np.fft.rfft(steps, axis=1)
+        power = spectra.real ** 2 + spectra.imag ** 2
+        return np.einsum('sfc,f->s', power, weights)
+    
+    def _measure(self, samples: np.ndarray):
+        pending = np.concatenate([self._unmeasured, samples]) if len(self._unmeasured) else samples
+        count = len(pending) // self.step
+        if count:
+            steps = pending[:count * self.step].reshape(count, self.step, self.channels)
+            self._step_powers.extend(self._weighted_power(steps, self.weights).tolist())
+        self._unmeasured = pending[count * self.step:]
+    
+    def loudness(self) -> Optional[float]:
+        """Gated integrated loudness of the audio measured so far in LUFS, or None if it is all silence"""
+        powers = np.asarray(self._step_powers)
+        if len(powers) >= LOUDNESS_STEPS_PER_BLOCK:
+            blocks = np.convolve(powers, np.full(LOUDNESS_STEPS_PER_BLOCK, 1.0 / LOUDNESS_STEPS_PER_BLOCK), 'valid')
+        elif len(powers):
+            blocks = np.array([powers.mean()])
+        elif len(self._unmeasured):
+            # Shorter than one step: measure what there is
+            n_fft = len(self._unmeasured)
+            blocks = self._weighted_power(self._unmeasured[None], k_weighting(n_fft, self.sample_rate))
+        else:
+            return None
+        blocks = blocks[blocks > _power(ABSOLUTE_GATE_LUFS)]
+        if not len(blocks):
+            return None
+        blocks = blocks[blocks > _power(_lufs(blocks.mean()) - RELATIVE_GATE_LU)]
+        return _lufs(blocks.mean())
+    
+    def _apply_gain(self, samples: np.ndarray) -> np.ndarray:
+        self._measure(samples)
+        loudness = self.loudness()
+        gain = 1.0 if self.gain is None else self.gain
+        if loudness is not None:
+            gain = 10 ** (np.clip(self.target_lufs - loudness, -MAX_GAIN_DB, MAX_GAIN_DB) / 20)
+        peak = float(np.abs(samples).max())
+        if peak * gain > PEAK_CEILING:
+            gain = PEAK_CEILING / peak
+        previous = gain if self.gain is None else self.gain
+        self.gain = gain
+        if previous == gain:
+            return samples * np.float32(gain)
+        return samples * np.linspace(previous, gain, len(samples), dtype=np.float32)[:, None]
+    
+    def _keep_tail(self, silence: np.ndarray) -> np.ndarray:
+        dropped = max(0, len(silence) - self.keep)
+        self.trimmed_frames += dropped
+        return silence[dropped:]
+    
+    def _trim(self, samples: np.ndarray) -> np.ndarray:
+        frames = len(samples)
+        windows = -(-frames // self.window)
+        padded = samples
+        if windows * self.window != frames:
+            padded = np.concatenate([samples, np.zeros((windows * self.window - frames, self.channels), dtype=samples.dtype)])
+        energy = np.square(padded).reshape(windows, self.window * self.channels).mean(axis=1)
+        sound = np.flatnonzero(energy > self.threshold)
+        if not len(sound):
+            if self._heard:
+                self._held.append(samples)
+            else:
+                self._lead = self._keep_tail(np.concatenate([self._lead, samples]))
+            return self._empty
+        
+        first = sound[0] * self.window
+        last = min(frames, (sound[-1] + 1) * self.window)
+        if self._heard:
+            pieces = self._held + [samples[:last]]
+        else:
+            pieces = [self._keep_tail(np.concatenate([self._lead, samples[:first]])), samples[first:last]]
+            self._lead = self._empty
+            self._heard = True
+        self._held = [samples[last:]] if last < frames else []
+        return np.concatenate(pieces)
+    
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Level and trim the next (samples, channels) float chunk; the result may be shorter or empty"""
+        if not len(samples):
+            return self._empty
+        if self.target_lufs is not None:
+            samples = self._apply_gain(samples)
+        return self._trim(samples) if self.trim else samples
+    
+    def flush(self) -> np.ndarray:
+        """End the stream: the silence kept after the last sound"""
+        if not self.trim:
+            return self._empty
+        tail = np.concatenate([self._lead] + self._held)
+        self._lead, self._held = self._empty, []
+        self.trimmed_frames += max(0, len(tail) - self.keep)
+        return tail[:self.keep]
+    
+    def process_pcm(self, frames: bytes, audio_format: AudioFormat) -> bytes:
+        """process() for interleaved PCM frames; the result is 16-bit PCM"""
+        return float_to_pcm16(self.process(pcm_to_float(frames, audio_format)))
+    
+    def flush_pcm(self) -> bytes:
+        return float_to_pcm16(self.flush())
+
+class ProcessedClip(NamedTuple):
+    audio: bytes
+    trimmed_seconds: float
+    trimmed_bytes: int
+
+def postprocess(audio_data: bytes, chain_for_rate=None, target_lufs: Optional[float] = None,
+                trim: bool = False) -> ProcessedClip:
+    """Decode a WAV once, run the voice's effects chain and the leveler, and re-encode it
+    
+    `chain_for_rate` maps a sample rate to the voice's VoiceEffectsChain, or is
+    None to skip effects. A whole clip goes through the leveler as one chunk,
+    so its gain comes from the clip's own loudness.
+    """
+    audio_format, frames = decode_wav(audio_data)
+    samples = pcm_to_float(frames, audio_format)
+    if chain_for_rate is not None:
+        chain: VoiceEffectsChain = chain_for_rate(audio_format.sample_rate)
+        samples = chain.process(samples)
+    trimmed_frames = 0
+    if target_lufs is not None or trim:
+        leveler = Leveler(audio_format.sample_rate, samples.shape[1], target_lufs, trim)
+        samples = np.concatenate([leveler.process(samples), leveler.flush()])
+        trimmed_frames = leveler.trimmed_frames
+    return ProcessedClip(
+        encode_wav(samples, audio_format.sample_rate),
+        trimmed_frames / audio_format.sample_rate,
+        # Output is 16-bit PCM
+        trimmed_frames * samples.shape[1] * 2
+    )
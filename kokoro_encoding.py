@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Kokoro Output Encoding
+Negotiates the response audio format and encodes synthesized WAV into it
+"""
+
+import io
+import os
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from kokoro_audio import AudioFormat, decode_wav, silence, wav_header
+
+class UnsupportedFormat(ValueError):
+    """Raised when a requested output format or option cannot be produced"""
+
+class NotAcceptable(UnsupportedFormat):
+    """Raised when an Accept header only takes formats this process cannot encode (HTTP 406)"""
+
+class CodecSpec(NamedTuple):
+    """How one output format is produced with torchaudio's FFmpeg StreamWriter"""
+    mimetype: str
+    extension: str
+    container: Optional[str]           # FFmpeg muxer, None for plain WAV
+    encoder: Optional[str]
+    encoder_format: Optional[str]      # sample format the encoder accepts
+    default_bitrate: Optional[int]     # kbps, None for lossless formats
+    sample_rates: Tuple[int, ...]      # rates the codec supports, empty = any
+
+CODECS: Dict[str, CodecSpec] = {
+    'wav': CodecSpec('audio/wav', 'wav', None, None, None, None, ()),
+    'opus': CodecSpec('audio/ogg; codecs=opus', 'opus', 'ogg', 'libopus', 'flt', 32,
+                      (8000, 12000, 16000, 24000, 48000)),
+    'ogg': CodecSpec('audio/ogg; codecs=vorbis', 'ogg', 'ogg', 'libvorbis', 'fltp', 64, ()),
+    'mp3': CodecSpec('audio/mpeg', 'mp3', 'mp3', 'libmp3lame', 'fltp', 64,
+                     (8000, 11025, 12000, 16000, 22050, 24000, 32000, 44100, 48000)),
+    'flac': CodecSpec('audio/flac', 'flac', 'flac', 'flac', 's16', None, ())
+}
+
+# Accept-header media types, in the order they are preferred on equal q
+MEDIA_TYPES = [
+    ('audio/opus', 'opus'),
+    ('audio/ogg', 'opus'),
+    ('audio/mpeg', 'mp3'),
+    ('audio/mp3', 'mp3'),
+    ('audio/flac', 'flac'),
+    ('audio/x-flac', 'flac'),
+    ('audio/wav', 'wav'),
+    ('audio/x-wav', 'wav'),
+    ('audio/wave', 'wav')
+]
+
+# Accept-header wildcards that admit a WAV fallback
+WILDCARD_TYPES = ('audio/*', '*/*')
+
+DEFAULT_FORMAT = os.environ.get('KOKORO_OUTPUT_FORMAT', 'wav')
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 48000
+
+class OutputFormat(NamedTuple):
+    """A negotiated output: codec name plus optional sample rate and bitrate (kbps)"""
+    name: str
+    sample_rate: Optional[int] = None
+    bitrate: Optional[int] = None
+    
+    @property
+    def codec(self) -> CodecSpec:
+        return CODECS[self.name]
+    
+    @property
+    def cache_tag(self) -> str:
+        """Distinguishes encoded variants of one clip in the audio cache"""
+        if self.name == 'wav' and self.sample_rate is None:
+            return 'wav'
+        return f"{self.name}@{self.sample_rate or 'native'}/{self.bitrate or 'default'}"
+    
+    def target_rate(self, source_rate: int) -> int:
+        rate = self.sample_rate or source_rate
+        supported = self.codec.sample_rates
+        if supported and rate not in supported:
+            # Snap up to the nearest supported rate so no bandwidth is lost
+            rate = next((r for r in supported if r >= rate), supported[-1])
+        return rate
+
+def _parse_accept(header: str) -> List[Tuple[str, float, Dict[str, str]]]:
+    entries = []
+    for item in header.split(','):
+        parts = [part.strip() for part in item.split(';') if part.strip()]
+        if not parts:
+            continue
+        params = dict(part.split('=', 1) for part in parts[1:] if '=' in part)
+        try:
+            quality = float(params.pop('q', 1))
+        except ValueError:
+            quality = 0.0
+        entries.append((parts[0].lower(), quality, {k.lower(): v.lower() for k, v in params.items()}))
+    return entries
+
+@lru_cache(maxsize=None)
+def encodable(name: str) -> bool:
+    """Whether this process can encode a codec, probed once by encoding a few ms of silence"""
+    if name == 'wav':
+        return True
+    probe_format = AudioFormat(1, 2, 24000)
+    frames = silence(probe_format, 0.02)
+    try:
+        encode_audio(wav_header(probe_format, len(frames)) + frames, OutputFormat(name))
+    except UnsupportedFormat:
+        return False
+    return True
+
+def format_from_accept(header: Optional[str]) -> Optional[str]:
+    """Best codec for an Accept header that this process can encode, or None if it names none"""
+    if not header:
+        return None
+    entries = _parse_accept(header)
+    best, best_quality, best_rank = None, 0.0, len(MEDIA_TYPES)
+    named = False
+    for media_type, quality, params in entries:
+        for rank, (known_type, name) in enumerate(MEDIA_TYPES):
+            if media_type != known_type:
+                continue
+            if known_type == 'audio/ogg' and params.get('codecs') == 'vorbis':
+                name = 'ogg'
+            named = named or quality > 0
+            if not encodable(name):
+                continue
+            if quality > best_quality or (quality == best_quality and quality > 0 and rank < best_rank):
+                best, best_quality, best_rank = name, quality, rank
+    if best is None and named:
+        # Only codecs this process cannot encode were asked for: WAV, if the client takes it
+        if not any(quality > 0 for media_type, quality, _ in entries if media_type in WILDCARD_TYPES):
+            raise NotAcceptable(f"None of the accepted audio formats can be encoded here (accept: {header})")
+        return 'wav'
+    return best
+
+def negotiate_format(options: Dict, accept: Optional[str] = None) -> OutputFormat:
+    """Pick the output from the request's `format` field, else its Accept header
+    
+    The request's own fields are checked before the Accept header, so a bad
+    field is reported as such rather than as an unacceptable header.
+    """
+    name = options.get('format')
+    if name is not None and str(name).lower() not in CODECS:
+        raise UnsupportedFormat(f"Unsupported output format '{name}' (choose from {', '.join(CODECS)})")
+    
+    sample_rate = options.get('sample_rate')
+    if sample_rate is not None:
+        try:
+            sample_rate = int(sample_rate)
+        except (TypeError, ValueError):
+            raise UnsupportedFormat(f"Invalid sample_rate '{sample_rate}'")
+        if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+            raise UnsupportedFormat(f"sample_rate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE}")
+    
+    bitrate = options.get('bitrate')
+    if bitrate is not None:
+        try:
+            bitrate = int(bitrate)
+        except (TypeError, ValueError):
+            raise UnsupportedFormat(f"Invalid bitrate '{bitrate}'")
+        if not 6 <= bitrate <= 320:
+            raise UnsupportedFormat("bitrate must be between 6 and 320 kbps")
+    
+    name = name or format_from_accept(accept)
+    if name is None:
+        # A default this process cannot encode is not worth failing every request over
+        name = DEFAULT_FORMAT if DEFAULT_FORMAT not in CODECS or encodable(DEFAULT_FORMAT) else 'wav'
+    name = str(name).lower()
+    if name not in CODECS:
+        raise UnsupportedFormat(f"Unsupported output format '{name}' (choose from {', '.join(CODECS)})")
+    if bitrate is not None and CODECS[name].default_bitrate is None:
+        raise UnsupportedFormat(f"Format '{name}' does not take a bitrate")
+    
+    return OutputFormat(name, sample_rate, bitrate)
+
+def encode_audio(wav_data: bytes, output: OutputFormat) -> bytes:
+    """Resample (torchaudio) and encode a synthesized WAV into the requested format"""
+    if output.cache_tag == 'wav':
+        return wav_data
+    
+    try:
+        import torch
+        import torchaudio.functional
+    except ImportError as e:
+        raise UnsupportedFormat(f"Encoding {output.name} requires torchaudio: {e}")
+    from kokoro_dsp import encode_wav, pcm_to_float
+    
+    audio_format, frames = decode_wav(wav_data)
+    samples = torch.from_numpy(pcm_to_float(frames, audio_format).T.copy())
+    rate = output.target_rate(audio_format.sample_rate)
+    if rate != audio_format.sample_rate:
+        samples = torchaudio.functional.resample(samples, audio_format.sample_rate, rate)
+    
+    codec = output.codec
+    if codec.container is None:
+        return encode_wav(samples.T.numpy(), rate)
+    
+    try:
+        from torchaudio.io import StreamWriter
+    except ImportError as e:
+        raise UnsupportedFormat(f"Encoding {output.name} requires torchaudio with FFmpeg: {e}")
+    
+    bitrate = output.bitrate or codec.default_bitrate
+    buffer = io.BytesIO()
+    try:
+        writer = StreamWriter(buffer, format=codec.container)
+        writer.add_audio_stream(
+            sample_rate=rate,
+            num_channels=samples.shape[0],
+            format='flt',
+            encoder=codec.encoder,
+            encoder_option={'b': f'{bitrate}k'} if bitrate else None,
+            encoder_format=codec.encoder_format
+        )
+        with writer.open():
+            writer.write_audio_chunk(0, samples.T.contiguous())
+    except (RuntimeError, OSError) as e:
+        raise UnsupportedFormat(f"Could not encode {output.name}: {e}")
+    return buffer.getvalue()
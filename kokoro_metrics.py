@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Kokoro Metrics
+Prometheus-style counters, gauges and histograms served from /metrics
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds, from a warm cache lookup up to a long paragraph on a slow engine
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Audio seconds per wall second; below 1 the engine is slower than real time
+REALTIME_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0)
+
+LabelValues = Tuple[str, ...]
+# metric name, value, labels: one counter increment or histogram observation
+Observation = Tuple[str, float, Dict[str, str]]
+# name, type, help, [(labels, value)] produced by a collector at scrape time
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if value == float('inf'):
+        return '+Inf'
+    return str(int(value)) if value.is_integer() else repr(value)
+
+class _Metric:
+    """Shared label handling; values are kept per tuple of label values"""
+    
+    kind = ''
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+    
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+    
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+class Counter(_Metric):
+    """Monotonically increasing total"""
+    
+    kind = 'counter'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+    
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        if _forwarded is not None:
+            _forwarded.append((self.name, amount, labels))
+            return
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def render(self) -> Iterator[str]:
+        yield from super().render()
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram with sum and count"""
+    
+    kind = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = STAGE_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> ([count per bucket, +Inf last], sum)
+        self._values: Dict[LabelValues, list] = {}
+    
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        if _forwarded is not None:
+            _forwarded.append((self.name, value, labels))
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+    
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the wall time of a `with` block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+    
+    def render(self) -> Iterator[str]:
+        yield from super().render()
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in values:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(labels)} {cumulative}"
+
+class MetricsRegistry:
+    """Metrics owned by this process plus collectors sampled at scrape time"""
+    
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+    
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = STAGE_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+    
+    def replay(self, observations: Iterable[Observation]):
+        """Record observations forwarded by a worker process as if they had been made here"""
+        metrics = {metric.name: metric for metric in self._metrics}
+        for name, value, labels in observations:
+            metric = metrics.get(name)
+            if isinstance(metric, Counter):
+                metric.inc(value, **labels)
+            elif isinstance(metric, Histogram):
+                metric.observe(value, **labels)
+    
+    def register_collector(self, collector: Callable[[], Iterable[Family]]):
+        """Add a callable yielding (name, type, help, samples) for values read on demand"""
+        self._collectors.append(collector)
+    
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+# Observations held back in a synthesis worker process, for its front end to replay (None records them here)
+_forwarded: Optional[List[Observation]] = None
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'kokoro_stage_seconds',
+    'Time spent per request stage (queue_wait, preprocess, synthesis, file_io, postprocess, stitch, encode, response_send)',
+    ['stage', 'voice_id']
+)
+REALTIME_FACTOR = REGISTRY.histogram(
+    'kokoro_realtime_factor',
+    'Audio seconds produced per wall second of rendering, per render',
+    ['voice_id'],
+    buckets=REALTIME_BUCKETS
+)
+AUDIO_SECONDS = REGISTRY.counter(
+    'kokoro_audio_seconds_total',
+    'Seconds of audio rendered by the synthesis workers',
+    ['voice_id']
+)
+RENDER_SECONDS = REGISTRY.counter(
+    'kokoro_render_seconds_total',
+    'Wall seconds the synthesis workers spent rendering audio',
+    ['voice_id']
+)
+WORKER_BUSY_SECONDS = REGISTRY.counter(
+    'kokoro_worker_busy_seconds_total',
+    'Wall seconds the synthesis workers spent on jobs of any kind'
+)
+SEGMENTS = REGISTRY.counter(
+    'kokoro_segments_total',
+    'Chunks of segment-cached renders, by whether they were reused from the cache or rendered',
+    ['voice_id', 'result']
+)
+ERRORS = REGISTRY.counter(
+    'kokoro_errors_total',
+    'Failures by stage (synthesis, encode, queue_full)',
+    ['stage', 'voice_id']
+)
+TRIMMED_SECONDS = REGISTRY.counter(
+    'kokoro_trimmed_silence_seconds_total',
+    'Seconds of leading and trailing silence trimmed from rendered clips',
+    ['voice_id']
+)
+TRIMMED_BYTES = REGISTRY.counter(
+    'kokoro_trimmed_silence_bytes_total',
+    'PCM bytes saved by trimming silence from rendered clips',
+    ['voice_id']
+)
+VOICE_PACK_LOOKUPS = REGISTRY.counter(
+    'kokoro_voice_pack_lookups_total',
+    'Voice pack lookups before synthesis, by whether the pack had the clip (hit, miss)',
+    ['voice_id', 'result']
+)
+HTTP_RESPONSES = REGISTRY.counter(
+    'kokoro_http_responses_total',
+    'HTTP responses by endpoint and status code',
+    ['endpoint', 'status']
+)
+
+def observe_stage(stage: str, voice_id: Optional[str], seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage, voice_id=voice_id or 'none')
+
+def forward_metrics():
+    """Hold counter increments and histogram observations for take_forwarded() instead of recording them here"""
+    global _forwarded
+    _forwarded = []
+
+def take_forwarded() -> List[Observation]:
+    """Observations held back since the last call"""
+    observations = list(_forwarded or [])
+    if _forwarded:
+        _forwarded.clear()
+    return observations
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Kokoro Voice Packs
+Pre-rendered clips packed back to back in one file, with an index of where each one starts
+"""
+
+import json
+import logging
+import mmap
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Clips appended back to back, and one JSON line per clip giving its offset and length in the pack
+PACK_FILE = 'clips.pack'
+INDEX_FILE = 'index.jsonl'
+# Clips written between fsyncs of the pack and its index
+SYNC_EVERY = 64
+
+class RangeNotSatisfiable(ValueError):
+    """A Range header that selects no byte of the body (HTTP 416)"""
+
+def byte_range(header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """The [start, end) span a `Range: bytes=...` header asks for, or None to send the whole body
+    
+    Malformed headers and multi-range requests get the whole body, which
+    HTTP allows; a range entirely past the end raises RangeNotSatisfiable.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    first, _, last = header[len('bytes='):].strip().partition('-')
+    if not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+    if not first:
+        # bytes=-N: the last N bytes
+        if not int(last):
+            raise RangeNotSatisfiable(header)
+        return max(0, length - int(last)), length
+    start = int(first)
+    end = int(last) + 1 if last else length
+    if start >= length:
+        raise RangeNotSatisfiable(header)
+    if end <= start:
+        return None
+    return start, min(end, length)
+
+class PackEntry(NamedTuple):
+    """Where one clip lives in a pack; `key` is its content address (kokoro_cache.cache_key)"""
+    key: str
+    voice_id: str
+    text: str
+    name: Optional[str]
+    mimetype: str
+    offset: int
+    length: int
+
+def read_index(directory: Path) -> Tuple[Dict[str, PackEntry], bool]:
+    """Entries of a pack's index by key, and whether every line of the index was usable
+    
+    A line torn by an interrupted run, or an entry pointing past the end of
+    the pack, is left out.
+    """
+    index_path = directory / INDEX_FILE
+    pack_path = directory / PACK_FILE
+    if not index_path.exists():
+        return {}, True
+    pack_size = pack_path.stat().st_size if pack_path.exists() else 0
+    
+    entries: Dict[str, PackEntry] = {}
+    clean = True
+    with open(index_path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                entry = PackEntry(**json.loads(line))
+            except (ValueError, TypeError):
+                clean = False
+                continue
+            if entry.offset + entry.length > pack_size:
+                clean = False
+                continue
+            entries[entry.key] = entry
+    return entries, clean
+
+class PackWriter:
+    """Appends clips to a pack and its index
+    
+    A clip's bytes are written before its index line, so every index entry
+    points at complete data. Opening an existing pack keeps what its index
+    accounts for and cuts off anything after that (a clip an interruption
+    left half written), so an interrupted run resumes where it stopped.
+    """
+    
+    def __init__(self, directory: Path):
+        directory.mkdir(parents=True, exist_ok=True)
+        self.directory = directory
+        self.entries, clean = read_index(directory)
+        if not clean:
+            self._rewrite_index()
+        
+        self.size = max((entry.offset + entry.length for entry in self.entries.values()), default=0)
+        self.pack = open(directory / PACK_FILE, 'a+b')
+        self.pack.truncate(self.size)
+        self.index = open(directory / INDEX_FILE, 'a', encoding='utf-8')
+        self.unsynced = 0
+    
+    def _rewrite_index(self):
+        """Replace the index with its usable entries, atomically"""
+        scratch = self.directory / f".{INDEX_FILE}.{os.getpid()}.tmp"
+        with open(scratch, 'w', encoding='utf-8') as f:
+            for entry in sorted(self.entries.values(), key=lambda entry: entry.offset):
+                f.write(json.dumps(entry._asdict()) + '\n')
+        os.replace(scratch, self.directory / INDEX_FILE)
+        logger.warning(f"Dropped unusable entries from {self.directory / INDEX_FILE}")
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+    
+    def add(self, key: str, voice_id: str, text: str, name: Optional[str], mimetype: str, data: bytes) -> PackEntry:
+        entry = PackEntry(key, voice_id, text, name, mimetype, self.size, len(data))
+        self.pack.write(data)
+        self.pack.flush()
+        self.index.write(json.dumps(entry._asdict()) + '\n')
+        self.index.flush()
+        self.size += len(data)
+        self.entries[key] = entry
+        self.unsynced += 1
+        if self.unsynced >= SYNC_EVERY:
+            self.sync()
+        return entry
+    
+    def sync(self):
+        os.fsync(self.pack.fileno())
+        os.fsync(self.index.fileno())
+        self.unsynced = 0
+    
+    def close(self):
+        self.sync()
+        self.pack.close()
+        self.index.close()
+
+class PackClip(NamedTuple):
+    """A clip found in a voice pack: its entry and a view of its bytes in the pack's mapping"""
+    entry: PackEntry
+    data: memoryview
+
+class VoicePack:
+    """One voice pack mapped read-only; clips are memoryviews into the mapping, never copies
+    
+    The mapping is never closed explicitly: it is released once the pack and
+    every view handed out from it have been dropped.
+    """
+    
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.view = memoryview(b'')
+        pack_path = directory / PACK_FILE
+        if pack_path.exists() and pack_path.stat().st_size:
+            with open(pack_path, 'rb') as f:
+                self.view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        # Mapped before the index is read, so a pack still being appended to
+        # only shows the entries whose bytes made it into the mapping
+        entries, _ = read_index(directory)
+        self.entries = {key: entry for key, entry in entries.items() if entry.offset + entry.length <= len(self.view)}
+    
+    def get(self, key: str) -> Optional[PackClip]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        return PackClip(entry, self.view[entry.offset:entry.offset + entry.length])
+
+class VoicePackStore:
+    """The voice pack at `path`, reopened by refresh() when its files change
+    
+    A new pack goes live by renaming a finished pack directory over `path` or
+    by repointing a symlink at `path`; kokoro_bulk.py appending to the pack
+    in place is picked up too. Lookups keep using the current pack until its
+    replacement has loaded completely, and responses still sending clips from
+    a replaced pack keep its mapping alive until they are done.
+    """
+    
+    def __init__(self, path: str):
+        self.path = Path(path) if path else None
+        self.pack: Optional[VoicePack] = None
+        self.loads = 0
+        self._signature: Optional[tuple] = None
+        self._lock = threading.Lock()
+    
+    def _stat(self) -> Optional[tuple]:
+        """Which files are at `path` (resolved directory and inodes), then how big and how new the index is"""
+        try:
+            index = (self.path / INDEX_FILE).stat()
+            pack = (self.path / PACK_FILE).stat()
+        except OSError:
+            return None
+        return (os.path.realpath(self.path), index.st_ino, pack.st_ino, index.st_size, index.st_mtime_ns)
+    
+    def refresh(self) -> bool:
+        """Load the pack if its files changed since the last load; returns True if a new pack is live"""
+        if self.path is None:
+            return False
+        with self._lock:
+            signature = self._stat()
+            if signature is None or signature == self._signature:
+                return False
+            try:
+                pack = VoicePack(self.path)
+            except Exception as e:
+                logger.warning(f"Could not load voice pack {self.path}: {e}")
+                return False
+            # Swapped mid-load: the mapping and index may come from different packs, so retry next time
+            current = self._stat()
+            if current is None or current[:3] != signature[:3]:
+                return False
+            self.pack = pack
+            self._signature = signature
+            self.loads += 1
+        logger.info(f"📼 Voice pack {self.path} loaded: {len(pack.entries)} clips, {len(pack.view) / 1048576:.1f} MB")
+        return True
+    
+    def get(self, key: str) -> Optional[PackClip]:
+        pack = self.pack
+        return pack.get(key) if pack is not None else None
+    
+    def stats(self) -> Dict[str, Any]:
+        pack = self.pack
+        return {
+            'path': str(self.path) if self.path else None,
+            'clips': len(pack.entries) if pack is not None else 0,
+            'bytes': len(pack.view) if pack is not None else 0,
+            'loads': self.loads
+        }
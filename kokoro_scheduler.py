@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Kokoro Synthesis Scheduler
+Priority classes, cancellation tokens and the priority job queue feeding the workers
+"""
+
+import heapq
+import itertools
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Priority classes, most urgent first; workers always take the most urgent queued job
+PRIORITY_INTERACTIVE = 0   # the assistant answering the user
+PRIORITY_NORMAL = 1        # batches and other client requested work
+PRIORITY_BACKGROUND = 2    # previews, prewarming and bulk rendering
+PRIORITIES = {
+    'interactive': PRIORITY_INTERACTIVE,
+    'normal': PRIORITY_NORMAL,
+    'background': PRIORITY_BACKGROUND
+}
+# Background jobs may fill at most this share of the queue, so interactive work is never turned away by them
+BACKGROUND_QUEUE_SHARE = 0.5
+
+def parse_priority(value: Any, default: int) -> int:
+    """Priority class from a request field ('interactive', 'normal', 'background')"""
+    if value is None:
+        return default
+    if str(value).lower() not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{value}' (choose from {', '.join(PRIORITIES)})")
+    return PRIORITIES[str(value).lower()]
+
+def priority_name(priority: int) -> str:
+    return next(name for name, value in PRIORITIES.items() if value == priority)
+
+class CancellationToken:
+    """Cancels every future attached to it, e.g. when a client disconnects"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], Any]] = []
+        self._cancelled = False
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+    
+    def add_callback(self, callback: Callable[[], Any]):
+        """Run `callback` on cancellation (immediately if already cancelled)"""
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+    
+    def attach(self, future):
+        """Cancel `future` together with this token"""
+        self.add_callback(future.cancel)
+    
+    def cancel(self) -> bool:
+        """Cancel the token; returns False if it already was"""
+        with self._lock:
+            if self._cancelled:
+                return False
+            self._cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+        return True
+
+class ClientTokens:
+    """Outstanding cancellation tokens per client id, so a client can drop all of its work"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens: Dict[str, set] = {}
+    
+    def issue(self, client_id: Optional[str] = None) -> CancellationToken:
+        token = CancellationToken()
+        if client_id:
+            with self._lock:
+                self._tokens.setdefault(client_id, set()).add(token)
+        return token
+    
+    def release(self, client_id: Optional[str], token: CancellationToken):
+        """Forget a token once its request has finished"""
+        if not client_id:
+            return
+        with self._lock:
+            tokens = self._tokens.get(client_id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens[client_id]
+    
+    def cancel(self, client_id: str) -> int:
+        """Cancel every outstanding request of a client; returns how many were cancelled"""
+        with self._lock:
+            tokens = self._tokens.pop(client_id, set())
+        return sum(1 for token in tokens if token.cancel())
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'clients': len(self._tokens),
+                'outstanding_requests': sum(len(tokens) for tokens in self._tokens.values())
+            }
+
+class JobScheduler:
+    """Bounded priority queue of synthesis jobs
+    
+    Jobs of equal priority run in submission order. Because long texts are
+    queued as one job per chunk, an urgent request waits at most for the
+    chunks already being rendered, never for a whole background utterance.
+    Cancelled jobs give their slot back immediately rather than when a worker
+    would have reached them.
+    """
+    
+    _REMOVED = object()
+    
+    def __init__(self, maxsize: int, background_share: float = BACKGROUND_QUEUE_SHARE):
+        self.maxsize = max(1, maxsize)
+        self.background_limit = max(1, int(self.maxsize * background_share))
+        self._heap: List[list] = []
+        # job -> its live heap entry [priority, sequence, job]
+        self._entries: Dict[Any, list] = {}
+        self._sequence = itertools.count()
+        self._not_empty = threading.Condition()
+        self.promotions = 0
+    
+    def _limit(self, priority: int) -> int:
+        return self.background_limit if priority >= PRIORITY_BACKGROUND else self.maxsize
+    
+    def put(self, job, timeout: Optional[float] = None):
+        """Queue a job at its priority, waiting up to `timeout` seconds for space"""
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._not_empty:
+            while len(self._entries) >= self._limit(job.priority):
+                remaining = deadline - time.monotonic() if deadline else 0
+                if remaining <= 0:
+                    raise queue.Full
+                self._not_empty.wait(remaining)
+            self._push(job, job.priority)
+        job.future.add_done_callback(lambda done: self._discard(job) if done.cancelled() else None)
+    
+    def _push(self, job, priority: int):
+        entry = [priority, next(self._sequence), job]
+        self._entries[job] = entry
+        heapq.heappush(self._heap, entry)
+        self._not_empty.notify_all()
+    
+    def _discard(self, job):
+        with self._not_empty:
+            entry = self._entries.pop(job, None)
+            if entry is not None:
+                entry[-1] = self._REMOVED
+                self._not_empty.notify_all()
+    
+    def promote(self, job, priority: int) -> bool:
+        """Move a queued job up to a more urgent priority"""
+        with self._not_empty:
+            entry = self._entries.get(job)
+            if entry is None or entry[0] <= priority:
+                return False
+            entry[-1] = self._REMOVED
+            job.priority = priority
+            self._push(job, priority)
+            self.promotions += 1
+            return True
+    
+    def get(self, claim: Optional[Callable[[Any], bool]] = None):
+        """Most urgent queued job, blocking until there is one (None means stop)
+        
+        With `claim`, the worker takes the most urgent job that `claim` accepts
+        and leaves the others for the rest of the workers. `claim` runs under
+        the queue lock.
+        """
+        with self._not_empty:
+            while True:
+                while not self._heap:
+                    self._not_empty.wait()
+                if claim is not None:
+                    job = self._claim(claim)
+                    if job is self._REMOVED:
+                        self._not_empty.wait()
+                        continue
+                    self._not_empty.notify_all()
+                    return job
+                _, _, job = heapq.heappop(self._heap)
+                if job is self._REMOVED:
+                    continue
+                if job is not None:
+                    del self._entries[job]
+                self._not_empty.notify_all()
+                return job
+    
+    def _claim(self, claim: Callable[[Any], bool]):
+        """Remove and return the most urgent job `claim` accepts, or _REMOVED if there is none"""
+        while self._heap and self._heap[0][-1] is self._REMOVED:
+            heapq.heappop(self._heap)
+        for entry in sorted(self._heap):
+            job = entry[-1]
+            if job is self._REMOVED:
+                continue
+            if job is None or claim(job):
+                entry[-1] = self._REMOVED
+                if job is not None:
+                    del self._entries[job]
+                return job
+        return self._REMOVED
+    
+    def close(self, workers: int):
+        """Queue one stop marker per worker, behind every queued job"""
+        with self._not_empty:
+            for _ in range(workers):
+                heapq.heappush(self._heap, [len(PRIORITIES), next(self._sequence), None])
+            self._not_empty.notify_all()
+    
+    def qsize(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._not_empty:
+            queued = {name: 0 for name in PRIORITIES}
+            for priority, _, _ in self._entries.values():
+                queued[priority_name(priority)] += 1
+            return {
+                'queued_by_priority': queued,
+                'background_capacity': self.background_limit,
+                'promotions': self.promotions
+            }
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Kokoro Speech Sessions
+Conversations that take text as it is generated and speak each sentence as soon as it is complete
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import struct
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from kokoro_admission import AdmissionTicket
+from kokoro_audio import AudioFormat, decode_wav, silence
+from kokoro_metrics import TRIMMED_BYTES, TRIMMED_SECONDS, observe_stage
+from kokoro_scheduler import PRIORITY_INTERACTIVE, CancellationToken, parse_priority, priority_name
+from kokoro_text import Chunk, split_ready_text
+from kokoro_workers import TRIM_SILENCE, levels_audio, loudness_target
+
+logger = logging.getLogger(__name__)
+
+# Milliseconds of audio per binary frame
+FRAME_MS = int(os.environ.get('KOKORO_SESSION_FRAME_MS', 100))
+# Frames a client may leave unacknowledged before the session stops sending (0 turns flow control off)
+SESSION_WINDOW = int(os.environ.get('KOKORO_SESSION_WINDOW', 50))
+# Characters buffered without a sentence end before they are spoken anyway, cut at a word boundary
+MAX_PENDING_CHARS = int(os.environ.get('KOKORO_SESSION_MAX_PENDING_CHARS', 400))
+
+# Every binary frame starts with its sequence number and its utterance number
+FRAME_HEADER = struct.Struct('<II')
+
+class _Render:
+    """One chunk of an utterance on its way to the client, or the end of the utterance if `chunk` is None"""
+    
+    def __init__(self, utterance: int, chunk: Optional[Chunk] = None, voice_id: Optional[str] = None,
+                 voice_config: Optional[Dict[str, Any]] = None, priority: int = PRIORITY_INTERACTIVE,
+                 cost: float = 0.0, ticket: Optional[AdmissionTicket] = None, level: bool = True):
+        self.utterance = utterance
+        self.chunk = chunk
+        self.voice_id = voice_id
+        self.voice_config = voice_config
+        self.priority = priority
+        self.cost = cost
+        self.ticket = ticket
+        # False when the session levels the utterance as a whole
+        self.level = level
+        self.future: Optional[concurrent.futures.Future] = None
+    
+    def release(self):
+        """Give the chunk's share of the admission budget back, once"""
+        if self.ticket is not None:
+            self.ticket.release(self.cost)
+            self.ticket = None
+
+class SpeechSession:
+    """One client's conversation: text in as it is generated, numbered PCM frames out in order
+    
+    Every sentence starts rendering as soon as its end arrives, a few chunks
+    ahead of what is being sent, so speech starts while the rest of the reply
+    is still being written. Each frame carries a sequence number and its
+    utterance; the client acknowledges the frames it has played and at most
+    `window` frames are ever unacknowledged. A cancel drops the buffered
+    text, the queued and running renders and every frame not yet sent.
+    Like a stream, each utterance goes through one Leveler, so its gain
+    carries across sentences.
+    `send_json` and `send_bytes` are the transport's send coroutines, and
+    `close_transport`, given a close code, ends the connection if sending fails.
+    """
+    
+    def __init__(self, engine, send_json: Callable[[Dict[str, Any]], Awaitable[None]],
+                 send_bytes: Callable[[bytes], Awaitable[None]], client_key: str,
+                 close_transport: Optional[Callable[[int], Awaitable[None]]] = None):
+        self.engine = engine
+        self.send_json = send_json
+        self.send_bytes = send_bytes
+        self.close_transport = close_transport
+        self.client_key = client_key
+        self.voice_id = engine.resolve_voice_id('kiro_assistant')
+        self.voice_config = engine.get_voice_config(self.voice_id)
+        self.priority = PRIORITY_INTERACTIVE
+        self.window = SESSION_WINDOW
+        self.text = ''
+        # Incoming text belongs to `utterance`; frames of utterances before `live` were cancelled
+        self.utterance = 1
+        self.live = 1
+        self.charged = 0
+        self.first_text: Dict[int, float] = {}
+        # Sequence number of the next frame, and how many frames the client has acknowledged
+        self.seq = 0
+        self.acked = 0
+        self.renders: Deque[_Render] = deque()
+        self.token = CancellationToken()
+        self.stream_format: Optional[AudioFormat] = None
+        # Leveler of the utterance being sent, if its voice is leveled
+        self.leveler = None
+        self.leveled_utterance = 0
+        self.closed = False
+        self.wakeup = asyncio.Event()
+        self.credit = asyncio.Event()
+        self.sender = asyncio.ensure_future(self._send_loop())
+    
+    def configure(self, options: Dict[str, Any]):
+        """Apply a voice, priority or window to the text that arrives from now on"""
+        if options.get('voice'):
+            self.voice_id = self.engine.resolve_voice_id(options['voice'])
+            self.voice_config = self.engine.get_voice_config(self.voice_id)
+        self.priority = parse_priority(options.get('priority'), self.priority)
+        if options.get('window') is not None:
+            window = int(options['window'])
+            if window < 0:
+                raise ValueError("window must not be negative")
+            self.window = window
+            self.credit.set()
+    
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'voice': self.voice_id,
+            'priority': priority_name(self.priority),
+            'window': self.window,
+            'frame_ms': FRAME_MS
+        }
+    
+    async def handle(self, message: Dict[str, Any]):
+        """Act on one client message; a malformed one raises ValueError or TypeError"""
+        kind = message.get('type')
+        if kind == 'text':
+            self.feed(str(message.get('text', '')))
+        elif kind == 'flush':
+            self.flush()
+        elif kind == 'cancel':
+            await self.send_json({'type': 'cancelled', 'utterance': self.cancel()})
+        elif kind == 'ack':
+            self.ack(int(message.get('seq')))
+        elif kind == 'config':
+            self.configure(message)
+            await self.send_json({'type': 'config', **self.describe()})
+        else:
+            raise ValueError(f"Unknown message type '{kind}'")
+    
+    def feed(self, text: str):
+        """Buffer text and start rendering every sentence it completes"""
+        ready, self.text = split_ready_text(self.text + text)
+        while len(self.text) > MAX_PENDING_CHARS:
+            # A run-on sentence with no end in sight is spoken a word boundary at a time
+            cut = self.text.rfind(' ', 1, MAX_PENDING_CHARS)
+            if cut <= 0:
+                cut = MAX_PENDING_CHARS
+            ready, self.text = ready + self.text[:cut], self.text[cut:]
+        self._speak(ready)
+    
+    def flush(self):
+        """Speak whatever is buffered and end the utterance"""
+        text, self.text = self.text, ''
+        try:
+            self._speak(text)
+        finally:
+            self.renders.append(_Render(self.utterance))
+            self.utterance += 1
+            self.wakeup.set()
+    
+    def _speak(self, text: str):
+        """Queue the chunks of complete text, admitted as one piece of work"""
+        if not text.strip():
+            return
+        self.engine.admission.check_text(text)
+        if self.charged != self.utterance:
+            # Each utterance costs one request against the client's rate limit
+            self.engine.rate_limiter.check(self.client_key)
+            self.charged = self.utterance
+        chunks = self.engine.split_into_chunks(self.engine.segment_text(text, self.voice_config), self.voice_config)
+        level = not levels_audio(self.voice_config)
+        costs = [self.engine.render_cost(chunk.text, self.voice_id, self.voice_config, level) for chunk in chunks]
+        ticket = self.engine.admission.admit(sum(costs), self.priority)
+        renders = [_Render(self.utterance, chunk, self.voice_id, self.voice_config, self.priority, cost, ticket, level)
+                   for chunk, cost in zip(chunks, costs)]
+        self.renders.extend(renders)
+        try:
+            self._submit()
+        except Exception:
+            # Turned away (e.g. a full queue): none of this text is spoken
+            for _ in renders:
+                self.renders.pop()
+            for render in renders:
+                if render.future is not None:
+                    render.future.cancel()
+            ticket.release()
+            raise
+        self.first_text.setdefault(self.utterance, time.perf_counter())
+        self.wakeup.set()
+    
+    def _start(self, render: _Render):
+        render.future = self.engine.submit_processed(render.chunk.text, render.voice_id, render.voice_config,
+                                                     priority=render.priority, token=self.token, level=render.level)
+    
+    def _submit(self):
+        """Keep every worker busy plus one chunk ready to go, in the order the chunks are spoken"""
+        ahead = self.engine.pool.num_workers + 1
+        for render in self.renders:
+            if ahead <= 0:
+                break
+            if render.chunk is None:
+                continue
+            if render.future is None:
+                self._start(render)
+            ahead -= 1
+    
+    def ack(self, seq: int):
+        """The client has played every frame up to and including `seq`"""
+        self.acked = max(self.acked, min(seq + 1, self.seq))
+        self.credit.set()
+    
+    def cancel(self) -> int:
+        """Drop buffered text, queued renders and unsent frames; returns the last utterance cancelled"""
+        cancelled = self.utterance
+        self.text = ''
+        self.token.cancel()
+        self.token = CancellationToken()
+        self._drop_renders()
+        self._end_leveling()
+        self.first_text.clear()
+        self.utterance += 1
+        self.live = self.utterance
+        # The client stops playing, so it is no longer holding any frame
+        self.acked = self.seq
+        self.credit.set()
+        logger.info(f"🛑 Session for {self.voice_id} cancelled utterance {cancelled}")
+        return cancelled
+    
+    def _drop_renders(self):
+        for render in self.renders:
+            render.release()
+        self.renders.clear()
+    
+    def _end_leveling(self) -> bytes:
+        """Flush the utterance's leveler, returning the silence it kept at the end"""
+        leveler, self.leveler = self.leveler, None
+        if leveler is None:
+            return b''
+        tail = leveler.flush_pcm()
+        if leveler.trimmed_frames:
+            TRIMMED_SECONDS.inc(leveler.trimmed_seconds, voice_id=self.voice_id)
+            TRIMMED_BYTES.inc(leveler.trimmed_frames * leveler.channels * 2, voice_id=self.voice_id)
+        return tail
+    
+    async def close(self):
+        """Stop sending and drop every render still queued or running"""
+        self.closed = True
+        self.token.cancel()
+        self._drop_renders()
+        self.sender.cancel()
+        await asyncio.gather(self.sender, return_exceptions=True)
+    
+    async def _send_loop(self):
+        while True:
+            if not self.renders:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            render = self.renders.popleft()
+            try:
+                await self._send_render(render)
+            except Exception as e:
+                # Per-utterance failures are reported by _send_render, so the transport itself failed
+                logger.error(f"Session sender stopped: {e}")
+                await self._abort()
+                return
+            finally:
+                render.release()
+    
+    async def _abort(self):
+        """Drop everything still queued or running and close the connection (internal error)"""
+        self.closed = True
+        self.token.cancel()
+        self._drop_renders()
+        if self.close_transport is not None:
+            try:
+                await self.close_transport(1011)
+            except Exception:
+                pass
+    
+    async def _utterance_error(self, render: _Render, error: Exception):
+        logger.error(f"Session render failed: {error}")
+        await self.send_json({'type': 'error', 'utterance': render.utterance, 'message': str(error)})
+    
+    async def _send_render(self, render: _Render):
+        """Send one finished chunk as frames, or the end of its utterance"""
+        if render.chunk is None:
+            leveler = self.leveler
+            try:
+                tail = self._end_leveling()
+            except Exception as e:
+                await self._utterance_error(render, e)
+                tail = b''
+            if tail and self.leveled_utterance == render.utterance:
+                # 16-bit like the rest of the utterance, which may all have been held back until now
+                await self._send_frames(render, AudioFormat(leveler.channels, 2, leveler.sample_rate), tail)
+            await self.send_json({'type': 'done', 'utterance': render.utterance})
+            return
+        try:
+            # Not started yet when the queue turned it away earlier
+            if render.future is None:
+                self._start(render)
+            self._submit()
+        except Exception as e:
+            # Chunks the queue still turns away are skipped; the ones after them are tried again next time
+            if render.future is None:
+                logger.warning(f"Session chunk dropped: {e}")
+                await self.send_json({'type': 'error', 'utterance': render.utterance, 'message': str(e)})
+                return
+        try:
+            audio_data = await asyncio.wrap_future(render.future)
+        except asyncio.CancelledError:
+            # A cancelled render just drops its chunk; a closed session stops altogether
+            if self.closed:
+                raise
+            return
+        except Exception as e:
+            await self._utterance_error(render, e)
+            return
+        if render.utterance < self.live:
+            return
+        try:
+            audio_format, frames = self._level(render, audio_data)
+        except Exception as e:
+            # A clip that cannot be decoded or leveled is skipped like a failed render
+            self.leveler = None
+            await self._utterance_error(render, e)
+            return
+        await self._send_frames(render, audio_format, frames)
+    
+    def _level(self, render: _Render, audio_data: bytes) -> Tuple[AudioFormat, bytes]:
+        """PCM of one rendered chunk with its trailing pause, through the utterance's leveler"""
+        audio_format, frames = decode_wav(audio_data)
+        # The voice's pause follows the chunk unless the utterance ends with it
+        if render.chunk.pause > 0 and not (self.renders and self.renders[0].chunk is None):
+            frames += silence(audio_format, render.chunk.pause)
+        if self.leveled_utterance != render.utterance:
+            self._end_leveling()
+            self.leveled_utterance = render.utterance
+            if not render.level:
+                from kokoro_dsp import Leveler
+                self.leveler = Leveler(audio_format.sample_rate, audio_format.channels,
+                                       loudness_target(render.voice_config), TRIM_SILENCE)
+        if self.leveler is not None:
+            frames = self.leveler.process_pcm(frames, audio_format)
+            # The leveler writes 16-bit PCM
+            audio_format = audio_format._replace(sample_width=2)
+        return audio_format, frames
+    
+    async def _send_frames(self, render: _Render, audio_format: AudioFormat, frames: bytes):
+        """Send PCM as numbered frames, waiting for the client's acknowledgements as the window fills"""
+        if not frames:
+            return
+        if audio_format != self.stream_format:
+            self.stream_format = audio_format
+            await self.send_json({'type': 'format', **audio_format._asdict()})
+        started = self.first_text.pop(render.utterance, None)
+        if started is not None:
+            observe_stage('session_first_audio', render.voice_id, time.perf_counter() - started)
+        frame_size = max(1, audio_format.sample_rate * FRAME_MS // 1000) * audio_format.channels * audio_format.sample_width
+        for start in range(0, len(frames), frame_size):
+            while self.window and self.seq - self.acked >= self.window:
+                self.credit.clear()
+                await self.credit.wait()
+            if render.utterance < self.live:
+                return
+            await self.send_bytes(FRAME_HEADER.pack(self.seq, render.utterance) + frames[start:start + frame_size])
+            self.seq += 1
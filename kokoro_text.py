@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+Kokoro Text Normalization
+Turns markdown, code, numbers and abbreviations into speakable prosody segments in one pass
+"""
+
+import os
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# Fenced code blocks: 'read' speaks every line, 'announce' only says how long the block is
+CODE_BLOCKS = os.environ.get('KOKORO_CODE_BLOCKS', 'read')
+
+# Segment boundaries, weakest first
+BOUNDARIES = ('clause', 'sentence', 'paragraph')
+# Extra silence in seconds after each boundary, between streamed chunks
+DEFAULT_PAUSES = {'clause': 0.0, 'sentence': 0.0, 'paragraph': 0.25}
+
+# Expanded only with their exact spelling and trailing period
+ABBREVIATIONS = {
+    'Dr.': 'Doctor',
+    'Mr.': 'Mister',
+    'Mrs.': 'Missus',
+    'Ms.': 'Miz',
+    'Prof.': 'Professor',
+    'Jr.': 'Junior',
+    'Sr.': 'Senior',
+    'vs.': 'versus',
+    'approx.': 'approximately',
+    'e.g.': 'for example',
+    'i.e.': 'that is',
+    'etc.': 'et cetera',
+    'fig.': 'figure',
+    'Fig.': 'figure'
+}
+# Abbreviations that also end the sentence when a capital letter or the end of the line follows
+SENTENCE_FINAL_ABBREVIATIONS = {'etc.'}
+
+ONES = ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten',
+        'eleven', 'twelve', 'thirteen', 'fourteen', 'fifteen', 'sixteen', 'seventeen', 'eighteen', 'nineteen']
+TENS = ['', '', 'twenty', 'thirty', 'forty', 'fifty', 'sixty', 'seventy', 'eighty', 'ninety']
+SCALES = ['', 'thousand', 'million', 'billion', 'trillion']
+IRREGULAR_ORDINALS = {'one': 'first', 'two': 'second', 'three': 'third', 'five': 'fifth',
+                      'eight': 'eighth', 'nine': 'ninth', 'twelve': 'twelfth'}
+# Longer numbers are read digit by digit
+MAX_NUMBER_DIGITS = 15
+# symbol -> (unit, units, subunit, subunits)
+CURRENCIES = {
+    '$': ('dollar', 'dollars', 'cent', 'cents'),
+    '€': ('euro', 'euros', 'cent', 'cents'),
+    '£': ('pound', 'pounds', 'penny', 'pence')
+}
+
+# How symbols are read inside code; brackets and quotes are silent
+CODE_SYMBOLS = {
+    '==': 'equals equals', '!=': 'not equals', '<=': 'less or equal', '>=': 'greater or equal',
+    '->': 'arrow', '=>': 'arrow', '::': 'colon colon', '&&': 'and', '||': 'or', '**': 'power',
+    '+=': 'plus equals', '-=': 'minus equals', '+': 'plus', '-': 'minus', '*': 'times', '/': 'slash',
+    '%': 'percent', '=': 'equals', '<': 'less than', '>': 'greater than', '!': 'not', '&': 'and',
+    '|': 'pipe', '.': 'dot', '@': 'at', '#': 'hash', ',': ','
+}
+# Symbols in prose that engines tend to skip or spell out
+PROSE_SYMBOLS = {'&': 'and', '+': 'plus', '=': 'equals', '@': 'at'}
+
+# Block structure, matched at the start of each line
+FENCE = re.compile(r'\s*(?:```|~~~)')
+HEADING = re.compile(r'\s{0,3}#{1,6}\s+')
+LIST_ITEM = re.compile(r'\s*(?:[-*+]|\d+[.)])\s+')
+QUOTE = re.compile(r'\s*>\s?')
+RULE = re.compile(r'\s*(?:[-*_]\s*){3,}$')
+TABLE_DIVIDER = re.compile(r'\s*\|?\s*:?-+:?\s*(?:\|\s*:?-+:?\s*)*\|?\s*$')
+
+# Digits with optional thousands separators, every group after the first exactly three digits long
+GROUPED_DIGITS = r'(?:\d{1,3}(?:,\d{3})+(?!\d)|\d+)'
+
+# Inline tokens, tried in order at each position. A failed attempt must not rescan
+# the rest of the line from every position, or a line of '[' or '_' takes quadratic
+# time: link labels and targets stop at the next bracket, and an identifier never
+# starts inside a run of more than three underscores
+INLINE_TOKEN = re.compile(r'''
+    (?P<code>`[^`\n]+`)
+  | !\[(?P<alt>[^\[\]\n]*)\]\([^()\[\]\s]*\)
+  | \[(?P<label>[^\[\]\n]+)\]\([^()\[\]\s]*\)
+  | (?P<url>\b(?:https?://|www\.)[^\s<>()\[\]]*[^\s<>()\[\].,;:!?'"])
+  | (?<![\w.])(?P<abbr>''' + '|'.join(re.escape(a) for a in sorted(ABBREVIATIONS, key=len, reverse=True)) + r''')
+  | (?P<initialism>\b(?:[A-Za-z]\.){2,})
+  | (?P<money>[$€£]''' + GROUPED_DIGITS + r'''(?:\.\d+)?)
+  | (?P<version>\bv\d+(?:\.\d+)+\b|\b\d+(?:\.\d+){2,}\b)
+  | (?<![\w.:])(?P<time>(?:[01]?\d|2[0-3]):[0-5]\d(?::[0-5]\d)?(?:[ap]m\b)?)(?![\d:])
+  | (?<![\w.])(?P<number>-?''' + GROUPED_DIGITS + r'''(?:\.\d+)?)(?P<suffix>%|st\b|nd\b|rd\b|th\b)?
+  | (?!_{4})(?P<identifier>
+        [A-Za-z_][A-Za-z0-9_]*(?:(?:\.|::|->)[A-Za-z_][A-Za-z0-9_]*)+(?:\(\))?
+      | _{0,3}[A-Za-z][A-Za-z0-9]*(?:_+[A-Za-z0-9]+)+_{0,3}(?:\(\))?
+      | [a-z]+[0-9]*(?:[A-Z][a-z0-9]*)+(?:\(\))?
+      | [A-Z][a-z0-9]+(?:[A-Z][a-z0-9]*)+(?:\(\))?
+      | [A-Za-z_]\w*\(\))
+  | (?P<word>[^\W_]+(?:'[^\W_]+)*)
+  | (?P<emphasis>\*{1,3}|~~|_{1,3})
+  | (?P<terminal>[.!?…]+(?P<closing>["')\]”’]*))(?=\s|$)
+  | (?P<clause>[,;:—])(?=\s|$)
+  | (?P<symbol>[&+=@])
+  | (?P<space>\s+)
+  | (?P<other>.)
+''', re.VERBOSE)
+SENTENCE_START = re.compile(r'\s*(?:[A-Z]|$)')
+CODE_TOKEN = re.compile(r'''
+    (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<symbol>==|!=|<=|>=|->|=>|::|&&|\|\||\*\*|\+=|-=|[-+*/%=<>!&|.@\#,])
+''', re.VERBOSE)
+IDENTIFIER_SEPARATOR = re.compile(r'\.|::|->')
+CAMEL_BOUNDARY = re.compile(r'(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])')
+
+class Segment(NamedTuple):
+    """A speakable run of text and the boundary that ends it"""
+    text: str
+    boundary: str      # 'clause', 'sentence' or 'paragraph'
+    kind: str          # 'prose', 'heading', 'list', 'table' or 'code'
+
+class Chunk(NamedTuple):
+    """A unit of chunked synthesis and the silence that follows it"""
+    text: str
+    pause: float
+
+def number_words(n: int) -> str:
+    if n < 0:
+        return 'minus ' + number_words(-n)
+    if n < 20:
+        return ONES[n]
+    if n < 100:
+        return TENS[n // 10] + ('-' + ONES[n % 10] if n % 10 else '')
+    if n < 1000:
+        return ONES[n // 100] + ' hundred' + (' ' + number_words(n % 100) if n % 100 else '')
+    groups = []
+    scale = 0
+    while n:
+        n, group = divmod(n, 1000)
+        if group:
+            groups.append(number_words(group) + (' ' + SCALES[scale] if scale else ''))
+        scale += 1
+    return ' '.join(reversed(groups))
+
+def digit_words(digits: str) -> str:
+    return ' '.join(ONES[int(d)] for d in digits if d.isdigit())
+
+def year_words(n: int) -> str:
+    """1999 as 'nineteen ninety-nine', 1905 as 'nineteen oh five'"""
+    century, rest = divmod(n, 100)
+    if rest == 0:
+        return number_words(century) + ' hundred'
+    return number_words(century) + (' oh ' if rest < 10 else ' ') + number_words(rest)
+
+def ordinal_words(n: int) -> str:
+    words = number_words(n)
+    head, separator, last = max(words.rpartition(' '), words.rpartition('-'), key=lambda p: len(p[0]))
+    if last in IRREGULAR_ORDINALS:
+        last = IRREGULAR_ORDINALS[last]
+    elif last.endswith('y'):
+        last = last[:-1] + 'ieth'
+    else:
+        last += 'th'
+    return head + separator + last
+
+def speak_number(token: str, suffix: Optional[str] = None) -> str:
+    """Read a number token, optionally followed by % or an ordinal suffix"""
+    negative = token.startswith('-')
+    whole, _, fraction = token.lstrip('-').partition('.')
+    digits = whole.replace(',', '')
+    if len(digits) > MAX_NUMBER_DIGITS:
+        words = digit_words(digits)
+    elif suffix in ('st', 'nd', 'rd', 'th') and not fraction:
+        words = ordinal_words(int(digits))
+    elif (len(whole) == 4 and not negative and not fraction and not suffix
+          and 1100 <= int(digits) <= 2099 and not 2000 <= int(digits) <= 2009):
+        words = year_words(int(digits))
+    else:
+        words = number_words(int(digits))
+    if fraction:
+        words += ' point ' + digit_words(fraction)
+    if negative:
+        words = 'minus ' + words
+    return words + (' percent' if suffix == '%' else '')
+
+def speak_time(token: str) -> str:
+    """'10:30' as 'ten thirty', '9:05pm' as 'nine oh five p m', '10:00' as 'ten o'clock'"""
+    clock, meridiem = token.rstrip('apm'), token[len(token.rstrip('apm')):]
+    hours, minutes, *seconds = (int(part) for part in clock.split(':'))
+    if minutes == 0 and not seconds:
+        words = f"{number_words(hours)} o'clock"
+    else:
+        words = number_words(hours) + (' oh ' if minutes < 10 else ' ') + number_words(minutes)
+    if seconds and seconds[0]:
+        words += f" and {number_words(seconds[0])} second{'' if seconds[0] == 1 else 's'}"
+    if meridiem:
+        words += ' ' + ' '.join(meridiem)
+    return words
+
+def speak_money(token: str) -> str:
+    unit, units, subunit, subunits = CURRENCIES[token[0]]
+    whole, _, fraction = token[1:].replace(',', '').partition('.')
+    if len(fraction) > 2:
+        return f"{speak_number(whole + '.' + fraction)} {units}"
+    amount = int(whole)
+    words = f"{number_words(amount)} {unit if amount == 1 else units}"
+    cents = int(fraction.ljust(2, '0')) if fraction else 0
+    if cents:
+        words += f" and {number_words(cents)} {subunit if cents == 1 else subunits}"
+    return words
+
+def split_identifier(name: str) -> str:
+    """'getUserName' -> 'get User Name', '__init__' -> 'init'"""
+    words = ' '.join(part for part in name.split('_') if part)
+    return CAMEL_BOUNDARY.sub(' ', words)
+
+def speak_identifier(token: str) -> str:
+    """Dotted and scoped names read with their separators, calls without parentheses"""
+    if token.endswith('()'):
+        token = token[:-2]
+    parts = []
+    position = 0
+    for separator in IDENTIFIER_SEPARATOR.finditer(token):
+        parts.append(split_identifier(token[position:separator.start()]))
+        parts.append(CODE_SYMBOLS[separator.group()])
+        position = separator.end()
+    parts.append(split_identifier(token[position:]))
+    return ' '.join(part for part in parts if part)
+
+def speak_code(code: str) -> str:
+    """Read a line of code: names split into words, operators named, brackets silent"""
+    words = []
+    for match in CODE_TOKEN.finditer(code):
+        if match.group('name'):
+            words.append(split_identifier(match.group('name')))
+        elif match.group('number'):
+            words.append(speak_number(match.group('number')))
+        else:
+            words.append(CODE_SYMBOLS[match.group('symbol')])
+    return ' '.join(word for word in words if word).replace(' ,', ',')
+
+def speak_url(url: str) -> str:
+    host = re.sub(r'^(?:https?://)?(?:www\.)?', '', url).split('/', 1)[0]
+    return 'link to ' + host.replace('.', ' dot ')
+
+class _Segmenter:
+    """Collects speakable pieces and closes them into segments"""
+    
+    def __init__(self, terminals: Dict[str, str]):
+        self.terminals = terminals
+        self.segments: List[Segment] = []
+        self.parts: List[str] = []
+    
+    def add(self, text: str):
+        self.parts.append(text)
+    
+    def close(self, boundary: str, kind: str = 'prose', punctuation: str = '', closing: str = ''):
+        text = ' '.join(''.join(self.parts).split())
+        self.parts = []
+        if any(c.isalnum() for c in text):
+            if not punctuation and boundary != 'clause' and text[-1] not in '.!?…':
+                # Engines only pause at punctuation, so give headings, list items and code lines some
+                punctuation = '.'
+            if punctuation:
+                text += self.terminals.get(punctuation, punctuation)
+            # Closing quotes and brackets stay with the sentence they end
+            text += closing
+            self.segments.append(Segment(text, boundary, kind))
+        elif self.segments and BOUNDARIES.index(boundary) > BOUNDARIES.index(self.segments[-1].boundary):
+            # Nothing new to say: strengthen the boundary that ends the previous segment
+            self.segments[-1] = self.segments[-1]._replace(boundary=boundary)
+    
+    def inline(self, line: str, kind: str = 'prose'):
+        """Tokenize one line of prose; sentences and clauses may continue onto the next line"""
+        for match in INLINE_TOKEN.finditer(line):
+            group = match.lastgroup
+            token = match.group()
+            if group == 'suffix':
+                group = 'number'
+            if group == 'space':
+                self.add(' ')
+            elif group == 'word':
+                self.add(token)
+            elif group == 'terminal':
+                closing = match.group('closing')
+                self.close('sentence', kind, token[:len(token) - len(closing)], closing)
+            elif group == 'clause':
+                while self.parts and self.parts[-1] == ' ':
+                    self.parts.pop()
+                self.add(',' if token == '—' else token)
+                self.close('clause', kind)
+            elif group == 'number':
+                self.add(speak_number(match.group('number'), match.group('suffix')))
+            elif group == 'identifier':
+                self.add(speak_identifier(token))
+            elif group == 'code':
+                self.add(speak_code(token[1:-1]))
+            elif group in ('alt', 'label'):
+                self.add(match.group(group))
+            elif group == 'url':
+                self.add(speak_url(token))
+            elif group == 'abbr':
+                self.add(ABBREVIATIONS[token])
+                if token in SENTENCE_FINAL_ABBREVIATIONS and SENTENCE_START.match(line, match.end()):
+                    self.close('sentence', kind, '.')
+            elif group == 'initialism':
+                self.add(' '.join(token.replace('.', '')))
+            elif group == 'money':
+                self.add(speak_money(token))
+            elif group == 'time':
+                self.add(speak_time(token))
+            elif group == 'version':
+                self.add(('version ' if token.startswith('v') else '')
+                         + ' point '.join(number_words(int(part)) for part in token.lstrip('v').split('.')))
+            elif group == 'symbol':
+                self.add(f" {PROSE_SYMBOLS[token]} ")
+            elif group == 'other':
+                # A colon or comma that is not a clause break, time or digit group ('3:2', '1,2345')
+                # is read as a pause; anything else (brackets, quotes, hyphens) passes through
+                self.add(', ' if token in ',:' else token)
+
+def normalize_text(text: str, prosody: Optional[Dict[str, Any]] = None) -> List[Segment]:
+    """Split text into speakable segments in a single linear pass
+    
+    `prosody` holds a voice's rules: 'terminals' maps sentence-ending
+    punctuation to what the voice says instead (e.g. '.' -> '...').
+    """
+    segmenter = _Segmenter((prosody or {}).get('terminals', {}))
+    code_lines: Optional[int] = None
+    
+    for line in text.splitlines():
+        if FENCE.match(line):
+            if code_lines is None:
+                segmenter.close('paragraph')
+                code_lines = 0
+            else:
+                if CODE_BLOCKS == 'announce':
+                    segmenter.add(f"Code block, {number_words(code_lines)} line{'' if code_lines == 1 else 's'}")
+                segmenter.close('paragraph', 'code', '.')
+                code_lines = None
+        elif code_lines is not None:
+            code_lines += 1
+            if CODE_BLOCKS == 'read' and line.strip():
+                segmenter.add(speak_code(line))
+                segmenter.close('sentence', 'code')
+        elif not line.strip() or RULE.match(line):
+            segmenter.close('paragraph')
+        elif HEADING.match(line):
+            segmenter.close('paragraph')
+            segmenter.inline(line[HEADING.match(line).end():], 'heading')
+            segmenter.close('paragraph', 'heading', '.')
+        elif LIST_ITEM.match(line):
+            segmenter.close('sentence')
+            segmenter.inline(line[LIST_ITEM.match(line).end():], 'list')
+            segmenter.close('sentence', 'list')
+        elif line.lstrip().startswith('|'):
+            if not TABLE_DIVIDER.match(line):
+                cells = [cell.strip() for cell in line.strip().strip('|').split('|')]
+                segmenter.inline(', '.join(cell for cell in cells if cell), 'table')
+                segmenter.close('sentence', 'table')
+        else:
+            quote = QUOTE.match(line)
+            segmenter.inline(line[quote.end():] if quote else line)
+            segmenter.add(' ')
+    
+    if code_lines is not None and CODE_BLOCKS == 'announce':
+        segmenter.add(f"Code block, {number_words(code_lines)} line{'' if code_lines == 1 else 's'}")
+    segmenter.close('paragraph')
+    return segmenter.segments
+
+def split_ready_text(text: str) -> Tuple[str, str]:
+    """Split text that is still arriving into what can be spoken now and what has to wait for more
+    
+    Text is ready up to its last complete sentence, its last complete block
+    line (blank line, rule, heading, list item or table row) or the end of its
+    last closed code block. A sentence only ends once whitespace follows its
+    terminal, since "3." may yet become "3.14".
+    """
+    ready = 0
+    offset = 0
+    in_code = False
+    for line in text.splitlines(keepends=True):
+        end = offset + len(line)
+        complete = line.endswith(('\n', '\r'))
+        if FENCE.match(line):
+            if complete:
+                if in_code:
+                    ready = end
+                in_code = not in_code
+            else:
+                break
+        elif in_code:
+            pass
+        elif not line.strip() or RULE.match(line) or HEADING.match(line) or LIST_ITEM.match(line) \
+                or line.lstrip().startswith('|'):
+            if complete:
+                ready = end
+        else:
+            for match in INLINE_TOKEN.finditer(line):
+                if match.lastgroup == 'terminal':
+                    after = match.end()
+                    while line[after:after + 1] in ('"', "'", ')', ']'):
+                        after += 1
+                    if line[after:after + 1].isspace():
+                        ready = offset + after
+        offset = end
+    return text[:ready], text[ready:]
+
+def segments_text(segments: List[Segment]) -> str:
+    """The text handed to the engine and hashed into the cache key"""
+    return ' '.join(segment.text for segment in segments)
+
+def chunk_segments(segments: List[Segment], max_chars: int,
+                   prosody: Optional[Dict[str, Any]] = None) -> List[Chunk]:
+    """Group segments into chunks of at most `max_chars`, one or more per sentence
+    
+    A long sentence is regrouped at its clauses and, failing that, hard-wrapped
+    at word boundaries. Each chunk carries the voice's pause for the boundary
+    that ends it.
+    """
+    pauses = {**DEFAULT_PAUSES, **(prosody or {}).get('pauses', {})}
+    chunks: List[Chunk] = []
+    pieces: List[List[Any]] = []
+    
+    for segment in segments:
+        if pieces and len(pieces[-1][0]) + 1 + len(segment.text) <= max_chars:
+            pieces[-1] = [f"{pieces[-1][0]} {segment.text}", segment.boundary]
+        else:
+            pieces.append([segment.text, segment.boundary])
+        if segment.boundary == 'clause':
+            continue
+        
+        # Sentence complete: emit its pieces, hard-wrapping any that are still too long
+        for text, boundary in pieces:
+            start = 0
+            while len(text) - start > max_chars:
+                cut = text.rfind(' ', start, start + max_chars)
+                if cut <= start:
+                    cut = start + max_chars
+                chunks.append(Chunk(text[start:cut], 0.0))
+                start = cut + 1 if text[cut:cut + 1] == ' ' else cut
+            if text[start:].strip():
+                chunks.append(Chunk(text[start:], pauses.get(boundary, 0.0)))
+        pieces = []
+    return chunks
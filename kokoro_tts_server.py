@@ -5,36 +5,327 @@ Provides high-quality text-to-speech with magical character voices
 """
 
 import asyncio
+import concurrent.futures
+import copy
+import csv
 import json
 import logging
 import os
 import tempfile
 import time
+import uuid
+import zipfile
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from collections import deque
+from typing import Dict, Iterator, List, NamedTuple, Optional, Any, Tuple
 
-import torch
-import torchaudio
-import numpy as np
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
-import pyttsx3
+from kokoro_admission import (
+    AdmissionController,
+    AdmissionRejected,
+    AdmissionTicket,
+    ClientRateLimiter,
+    Overloaded,
+    estimate_audio_seconds
+)
+from kokoro_audio import decode_wav, silence, wav_duration, wav_header
+from kokoro_backends import (
+    DEFAULT_BACKEND,
+    VOICE_BACKENDS,
+    parse_voice_backends
+)
+from kokoro_cache import AudioCache, InflightRequests, cache_key
+from kokoro_encoding import NotAcceptable, OutputFormat, UnsupportedFormat, encode_audio, negotiate_format
+from kokoro_metrics import (
+    AUDIO_SECONDS,
+    CONTENT_TYPE,
+    ERRORS,
+    HTTP_RESPONSES,
+    REALTIME_FACTOR,
+    REGISTRY,
+    RENDER_SECONDS,
+    SEGMENTS,
+    STAGE_SECONDS,
+    TRIMMED_BYTES,
+    TRIMMED_SECONDS,
+    VOICE_PACK_LOOKUPS,
+    WORKER_BUSY_SECONDS,
+    Family,
+    observe_stage
+)
+from kokoro_pack import PackClip, VoicePackStore
+from kokoro_scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_NORMAL,
+    CancellationToken,
+    ClientTokens,
+    JobScheduler,
+    parse_priority
+)
+from kokoro_text import Chunk, Segment, chunk_segments, normalize_text, segments_text
+from kokoro_voice_index import VoiceIndex
+from kokoro_workers import TRIM_SILENCE, WORKER_MODE, WorkerProcess, WorkerRenderer, levels_audio, loudness_target
 import threading
 import queue
 import io
-import wave
+
+# Heavy dependencies (numpy via kokoro_dsp, pyttsx3, torch) are imported where they are
+# first needed so that importing this module stays cheap
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for frontend access
+CORS(app, expose_headers=['X-Segments', 'X-Segments-Reused', 'X-Voice-Pack', 'Content-Range'])  # Enable CORS for frontend access
+
+# Synthesis pool sizing (overridable from the environment)
+STARTUP_TIMEOUT = float(os.environ.get('KOKORO_STARTUP_TIMEOUT', 60))
+# Render every voice once after startup; /health reports 'warming' until that is done
+PREWARM = os.environ.get('KOKORO_PREWARM', '1') != '0'
+# Phrases pre-rendered into the audio cache at background priority once warm
+PRERENDER_MANIFEST = os.environ.get('KOKORO_PRERENDER_MANIFEST', '')
+# How often to re-check the installed system voices (0 disables)
+VOICE_REFRESH_SECONDS = float(os.environ.get('KOKORO_VOICE_REFRESH_SECONDS', 600))
+DEFAULT_WORKERS = int(os.environ.get('KOKORO_WORKERS', min(4, os.cpu_count() or 1)))
+DEFAULT_QUEUE_SIZE = int(os.environ.get('KOKORO_QUEUE_SIZE', 32))
+
+# Audio cache sizing in megabytes; a disk size of 0 disables the disk tier
+CACHE_MEMORY_MB = float(os.environ.get('KOKORO_CACHE_MB', 64))
+CACHE_DISK_MB = float(os.environ.get('KOKORO_DISK_CACHE_MB', 0))
+# Disk tier location; server processes pointed at the same directory share it
+CACHE_DIR = os.environ.get('KOKORO_CACHE_DIR', '')
+
+# Voice pack (a kokoro_bulk.py output directory) served before synthesizing, and how often it is checked for changes
+VOICE_PACK = os.environ.get('KOKORO_VOICE_PACK', '')
+VOICE_PACK_CHECK_SECONDS = float(os.environ.get('KOKORO_VOICE_PACK_CHECK_SECONDS', 5))
+
+# Streaming synthesis: longest chunk sent to one worker
+STREAM_CHUNK_CHARS = int(os.environ.get('KOKORO_STREAM_CHUNK_CHARS', 200))
+# Render multi-sentence texts chunk by chunk and stitch them, so an edit re-renders only what changed
+SEGMENT_CACHE = os.environ.get('KOKORO_SEGMENT_CACHE', '1') != '0'
+# Cache tag of chunks rendered without leveling, for streams that level all their chunks together
+UNLEVELED_TAG = 'wav-unleveled'
+
+# Largest number of utterances accepted by /synthesize/batch
+MAX_BATCH_ITEMS = int(os.environ.get('KOKORO_MAX_BATCH_ITEMS', 64))
+
+# Admission control: per-request caps (0 disables) and the longest expected queueing delay accepted
+MAX_TEXT_CHARS = int(os.environ.get('KOKORO_MAX_TEXT_CHARS', 20000))
+MAX_AUDIO_SECONDS = float(os.environ.get('KOKORO_MAX_AUDIO_SECONDS', 600))
+MAX_QUEUE_SECONDS = float(os.environ.get('KOKORO_MAX_QUEUE_SECONDS', 30))
+# Per-client token bucket: requests per second (0 disables) and burst size
+RATE_LIMIT = float(os.environ.get('KOKORO_RATE_LIMIT', 0))
+RATE_BURST = float(os.environ.get('KOKORO_RATE_BURST', 10))
+
+# Greeting spoken by /test/<voice_id>, also used to prewarm each voice
+TEST_PHRASE = "Greetings! This is {name} speaking. How do I sound?"
+
+class SynthesisQueueFull(Overloaded):
+    """Raised when the synthesis job queue cannot accept more work"""
+    
+    reason = 'queue_full'
+
+class SynthesisCancelled(Exception):
+    """Raised when a request's cancellation token fired before its audio was ready"""
+
+class Phrase(NamedTuple):
+    """One (voice, text) pair from a phrase manifest, with the entry's optional id"""
+    voice_id: str
+    text: str
+    name: Optional[str] = None
+
+class SynthesisJob:
+    """A single unit of synthesis work carrying its own voice settings"""
+    
+    def __init__(self, text: str, voice_id: str, voice_config: Dict[str, Any], priority: int = PRIORITY_NORMAL,
+                 level: bool = True):
+        self.text = text
+        self.voice_id = voice_id
+        self.voice_config = voice_config
+        self.priority = priority
+        # False leaves loudness normalization and trimming to the caller
+        self.level = level
+        self.queued_at: Optional[float] = None
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+    
+    def run(self, voice_engine: 'KokoroVoiceEngine', worker: 'SynthesisWorker') -> Any:
+        return voice_engine.render_job(worker, self)
+
+class VoiceGroupJob(SynthesisJob):
+    """Several utterances for one voice, rendered back to back on one worker
+    
+    The future resolves to a list holding audio bytes or the exception for
+    each text, so one bad utterance does not fail its neighbours.
+    """
+    
+    def __init__(self, texts: List[str], voice_id: str, voice_config: Dict[str, Any], priority: int = PRIORITY_NORMAL):
+        super().__init__(' '.join(texts), voice_id, voice_config, priority)
+        self.texts = texts
+    
+    def run(self, voice_engine: 'KokoroVoiceEngine', worker: 'SynthesisWorker') -> Any:
+        return voice_engine.render_group(worker, self)
+
+class VoiceInventoryJob(SynthesisJob):
+    """Enumerate installed voices on a worker's default backend"""
+    
+    def __init__(self):
+        super().__init__('', '', {})
+    
+    def run(self, voice_engine: 'KokoroVoiceEngine', worker: 'SynthesisWorker') -> Any:
+        return worker.renderer.list_voices()
+
+class SynthesisWorker(threading.Thread):
+    """Worker thread that renders with its own backends, or drives its own worker process"""
+    
+    def __init__(self, pool: 'SynthesisWorkerPool', index: int):
+        super().__init__(name=f"kokoro-synth-{index}", daemon=True)
+        self.pool = pool
+        self.index = index
+        scratch_file = pool.voice_engine.scratch_dir / f"worker_{os.getpid()}_{index}.wav"
+        if pool.mode == 'process':
+            self.renderer = WorkerProcess(index, pool.num_workers, scratch_file)
+        else:
+            self.renderer = WorkerRenderer(scratch_file, pool.num_workers)
+        self.ready = threading.Event()
+        self.busy = False
+    
+    @property
+    def engine_ready(self) -> bool:
+        return self.renderer.engine_ready
+    
+    def claim(self, job: SynthesisJob) -> bool:
+        """Whether to take `job` now: it is routed here, or its own worker cannot take it
+        
+        Runs under the queue lock, so a claiming worker is marked busy before
+        the others look at the queue again.
+        """
+        owner = self.pool.route(job.voice_id)
+        if owner is None or owner is self or owner.busy or not owner.engine_ready:
+            self.busy = True
+            return True
+        return False
+    
+    def run(self):
+        try:
+            self.renderer.start()
+        except Exception as e:
+            logger.error(f"Worker {self.name} failed to initialize TTS engine: {e}")
+        finally:
+            self.ready.set()
+        
+        while True:
+            job = self.pool.scheduler.get(self.claim if self.pool.routes else None)
+            if job is None:
+                break
+            if not job.future.set_running_or_notify_cancel():
+                # Claiming it marked this worker busy
+                self.busy = False
+                continue
+            
+            started = time.perf_counter()
+            if job.voice_id and job.queued_at is not None:
+                observe_stage('queue_wait', job.voice_id, started - job.queued_at)
+            
+            self.busy = True
+            try:
+                if not self.engine_ready:
+                    raise Exception("TTS engine not initialized")
+                job.future.set_result(job.run(self.pool.voice_engine, self))
+            except Exception as e:
+                job.future.set_exception(e)
+            finally:
+                self.busy = False
+                WORKER_BUSY_SECONDS.inc(time.perf_counter() - started)
+        
+        self.renderer.close()
+
+class SynthesisWorkerPool:
+    """Fixed set of synthesis workers fed from a bounded priority queue
+    
+    In process mode every worker drives its own process, and each voice is
+    routed to one worker so that its backend and effects stay warm there;
+    a busy worker's voices are picked up by whichever worker is free.
+    """
+    
+    def __init__(self, voice_engine: 'KokoroVoiceEngine', num_workers: int, queue_size: int,
+                 mode: str = WORKER_MODE):
+        if mode not in ('thread', 'process'):
+            raise ValueError(f"Unknown worker mode '{mode}' (choose from thread, process)")
+        self.voice_engine = voice_engine
+        self.num_workers = max(1, num_workers)
+        self.mode = mode
+        self.scheduler = JobScheduler(queue_size)
+        self.workers: List[SynthesisWorker] = []
+        # voice_id -> the worker it is routed to (process mode only)
+        self.routes: Dict[str, SynthesisWorker] = {}
+    
+    def route(self, voice_id: str) -> Optional[SynthesisWorker]:
+        return self.routes.get(voice_id)
+    
+    def start(self, timeout: float = 30.0) -> int:
+        """Start all workers and return how many initialised an engine"""
+        self.workers = [SynthesisWorker(self, i) for i in range(self.num_workers)]
+        if self.mode == 'process':
+            # Voices are dealt out in turn, so every process warms an equal share
+            self.routes = {voice_id: self.workers[i % len(self.workers)]
+                           for i, voice_id in enumerate(self.voice_engine.voice_configs)}
+        for worker in self.workers:
+            worker.start()
+        
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            worker.ready.wait(max(0.0, deadline - time.monotonic()))
+        
+        if self.mode == 'thread' and len(self.workers) > 1 and any(
+                getattr(backend, 'shared', False) for worker in self.workers for backend in worker.renderer.backends.values()):
+            logger.warning(f"⚠️ {len(self.workers)} thread workers share one pyttsx3 engine and render one clip at a time; "
+                           f"set KOKORO_WORKER_MODE=process to render system voices in parallel")
+        return sum(1 for worker in self.workers if worker.engine_ready)
+    
+    def submit(self, job: SynthesisJob, timeout: Optional[float] = None) -> concurrent.futures.Future:
+        """Queue a job at its priority, waiting up to `timeout` seconds for space (no wait by default)"""
+        job.queued_at = time.perf_counter()
+        try:
+            self.scheduler.put(job, timeout=timeout)
+        except queue.Full:
+            ERRORS.inc(stage='queue_full', voice_id=job.voice_id or 'none')
+            raise SynthesisQueueFull(f"Synthesis queue is full ({self.scheduler.qsize()} jobs pending)",
+                                     self.voice_engine.admission.estimated_wait())
+        return job.future
+    
+    def shutdown(self):
+        """Stop all workers once the queued jobs have drained"""
+        self.scheduler.close(len(self.workers))
+        for worker in self.workers:
+            worker.join(timeout=5)
+    
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            'mode': self.mode,
+            'workers': len(self.workers),
+            'ready_workers': sum(1 for worker in self.workers if worker.engine_ready),
+            'backends': sorted({name for worker in self.workers for name in worker.renderer.backend_names()}),
+            'busy_workers': sum(1 for worker in self.workers if worker.busy),
+            'queue_depth': self.scheduler.qsize(),
+            'queue_capacity': self.scheduler.maxsize,
+            **self.scheduler.stats()
+        }
+        if self.mode == 'process':
+            stats['processes'] = [{
+                'pid': worker.renderer.pid,
+                'alive': worker.renderer.alive,
+                'restarts': worker.renderer.restarts,
+                'voices': sorted(voice_id for voice_id, owner in self.routes.items() if owner is worker)
+            } for worker in self.workers]
+        return stats
 
 class KokoroVoiceEngine:
     """Advanced TTS engine with character-specific voice synthesis"""
     
-    def __init__(self):
+    def __init__(self, num_workers: int = DEFAULT_WORKERS, queue_size: int = DEFAULT_QUEUE_SIZE):
         self.voice_configs = {
             'elvish_female': {
                 'name': 'Arwen',
@@ -43,6 +334,10 @@ class KokoroVoiceEngine:
                 'speed_factor': 0.9,
                 'emotion': 'gentle',
                 'accent': 'british',
+                # Elvish elegance: a slight pause at every clause
+                'prosody': {'pauses': {'clause': 0.15}},
+                # A little softer than the other voices (LUFS)
+                'loudness': -18.0,
                 'characteristics': {
                     'breathiness': 0.2,
                     'warmth': 0.8,
@@ -56,6 +351,7 @@ class KokoroVoiceEngine:
                 'speed_factor': 0.85,
                 'emotion': 'wise',
                 'accent': 'british',
+                'prosody': {'pauses': {'clause': 0.15}},
                 'characteristics': {
                     'breathiness': 0.1,
                     'warmth': 0.7,
@@ -69,6 +365,10 @@ class KokoroVoiceEngine:
                 'speed_factor': 0.8,
                 'emotion': 'powerful',
                 'accent': 'deep',
+                # Dramatic pauses for dragon speech
+                'prosody': {'terminals': {'.': '...'}, 'pauses': {'sentence': 0.4}},
+                # A dragon fills the room
+                'loudness': -14.0,
                 'characteristics': {
                     'breathiness': 0.0,
                     'warmth': 0.3,
@@ -97,6 +397,8 @@ class KokoroVoiceEngine:
                 'speed_factor': 1.1,
                 'emotion': 'aggressive',
                 'accent': 'rough',
+                # Direct and forceful: questions become demands
+                'prosody': {'terminals': {'?': '?!'}},
                 'characteristics': {
                     'breathiness': 0.0,
                     'warmth': 0.2,
@@ -111,6 +413,7 @@ class KokoroVoiceEngine:
                 'speed_factor': 1.0,
                 'emotion': 'fierce',
                 'accent': 'commanding',
+                'prosody': {'terminals': {'?': '?!'}},
                 'characteristics': {
                     'breathiness': 0.0,
                     'warmth': 0.3,
@@ -133,182 +436,811 @@ class KokoroVoiceEngine:
                 }
             }
         }
+        for voice_id, override in parse_voice_backends(VOICE_BACKENDS).items():
+            if voice_id in self.voice_configs:
+                self.voice_configs[voice_id].update(override)
         
-        self.tts_engine = None
-        self.audio_queue = queue.Queue()
+        self.pool = SynthesisWorkerPool(self, num_workers, queue_size)
+        self.voice_index = VoiceIndex()
         self.is_initialized = False
+        self.startup_seconds: Optional[float] = None
+        self._startup: Optional[concurrent.futures.Future] = None
+        # Set once every voice has been rendered once (immediately when prewarm is disabled)
+        self.warmed = threading.Event()
+        self.prewarm_seconds: Optional[float] = None
+        self.prerender = {'phrases': 0, 'rendered': 0, 'cached': 0, 'failed': 0, 'done': not PRERENDER_MANIFEST}
+        self._startup_lock = threading.Lock()
         self.temp_dir = Path(tempfile.gettempdir()) / "kokoro_tts"
         self.temp_dir.mkdir(exist_ok=True)
+        # Worker scratch files live in RAM where the OS provides a tmpfs
+        shm_dir = Path('/dev/shm')
+        self.scratch_dir = shm_dir / "kokoro_tts" if shm_dir.is_dir() else self.temp_dir
+        self.scratch_dir.mkdir(exist_ok=True)
+        self.cache = AudioCache(
+            max_memory_bytes=int(CACHE_MEMORY_MB * 1024 * 1024),
+            disk_dir=Path(CACHE_DIR) if CACHE_DIR else self.temp_dir / "cache",
+            max_disk_bytes=int(CACHE_DISK_MB * 1024 * 1024)
+        )
+        self.inflight = InflightRequests()
+        self.clients = ClientTokens()
+        self.admission = AdmissionController(self.pool.num_workers, MAX_TEXT_CHARS, MAX_AUDIO_SECONDS, MAX_QUEUE_SECONDS)
+        self.rate_limiter = ClientRateLimiter(RATE_LIMIT, RATE_BURST)
+        self.voice_pack = VoicePackStore(VOICE_PACK)
+        REGISTRY.register_collector(self.collect_metrics)
+    
+    def start(self) -> concurrent.futures.Future:
+        """Initialize the TTS engine in the background (idempotent)
         
-        # Initialize TTS engine
+        Construction stays cheap; the returned future resolves to True once
+        the workers are ready, or False if no engine could be created.
+        """
+        with self._startup_lock:
+            if self._startup is None:
+                self._startup = concurrent.futures.Future()
+                threading.Thread(target=self._run_startup, name='kokoro-startup', daemon=True).start()
+            return self._startup
+    
+    def _run_startup(self):
+        started = time.monotonic()
+        # Pack hits need no worker, so the pack loads alongside the engine
+        if self.voice_pack.path is not None:
+            threading.Thread(target=self._voice_pack_loop, name='kokoro-voice-pack', daemon=True).start()
         self._initialize_engine()
+        self.startup_seconds = round(time.monotonic() - started, 3)
+        self._startup.set_result(self.is_initialized)
+        if not self.is_initialized:
+            return
+        
+        # Requests are served from here on; readiness holds at 'warming' until every voice has rendered once
+        if PREWARM:
+            self._prewarm()
+        self.warmed.set()
+        if PRERENDER_MANIFEST:
+            self._prerender(Path(PRERENDER_MANIFEST))
+    
+    @property
+    def readiness(self) -> str:
+        """'stopped', 'starting', 'warming', 'ready' or 'failed'"""
+        if self._startup is None:
+            return 'stopped'
+        if not self._startup.done():
+            return 'starting'
+        if not self.is_initialized:
+            return 'failed'
+        return 'ready' if self.warmed.is_set() else 'warming'
+    
+    async def wait_until_ready(self) -> None:
+        """Start the engine if needed and wait for it without blocking the event loop"""
+        if not self.is_initialized and not await asyncio.wrap_future(self.start()):
+            raise Exception("TTS engine not initialized")
+    
+    def ensure_ready(self, timeout: float = STARTUP_TIMEOUT) -> None:
+        """Blocking variant of wait_until_ready for synchronous callers"""
+        if not self.is_initialized and not self.start().result(timeout):
+            raise Exception("TTS engine not initialized")
     
     def _initialize_engine(self):
-        """Initialize the TTS engine with optimal settings"""
+        """Start the synthesis workers, each with its own TTS engine"""
         try:
-            self.tts_engine = pyttsx3.init()
+            ready = self.pool.start()
+            if not ready:
+                raise Exception("no synthesis worker could create an engine")
             
-            # Get available voices
-            voices = self.tts_engine.getProperty('voices')
-            logger.info(f"Available voices: {len(voices) if voices else 0}")
+            # Index available voices once instead of scanning them per request
+            self.refresh_voice_index()
+            logger.info(f"Available voices: {len(self.voice_index.voices)}")
             
-            # Set default properties
-            self.tts_engine.setProperty('rate', 200)
-            self.tts_engine.setProperty('volume', 0.8)
+            if VOICE_REFRESH_SECONDS > 0:
+                threading.Thread(target=self._voice_refresh_loop, name='kokoro-voice-refresh', daemon=True).start()
             
             self.is_initialized = True
-            logger.info("✨ Kokoro TTS Engine initialized successfully")
+            logger.info(f"✨ Kokoro TTS Engine initialized successfully ({ready}/{self.pool.num_workers} workers)")
             
         except Exception as e:
             logger.error(f"Failed to initialize TTS engine: {e}")
             self.is_initialized = False
     
-    def get_voice_config(self, voice_id: str) -> Dict[str, Any]:
-        """Get configuration for a specific voice"""
-        return self.voice_configs.get(voice_id, self.voice_configs['kiro_assistant'])
+    def test_phrase(self, voice_id: str) -> str:
+        return TEST_PHRASE.format(name=self.get_voice_config(voice_id)['name'])
     
-    def apply_voice_characteristics(self, voice_config: Dict[str, Any]) -> None:
-        """Apply voice characteristics to the TTS engine"""
-        if not self.tts_engine:
-            return
-            
-        try:
-            # Adjust rate based on speed factor
-            base_rate = 200
-            adjusted_rate = int(base_rate * voice_config['speed_factor'])
-            self.tts_engine.setProperty('rate', adjusted_rate)
-            
-            # Try to select appropriate system voice
-            voices = self.tts_engine.getProperty('voices')
-            if voices:
-                target_voice = None
-                
-                # Voice selection logic
-                if voice_config['base_voice'] == 'female':
-                    target_voice = next((v for v in voices if 'female' in v.name.lower() or 'zira' in v.name.lower() or 'hazel' in v.name.lower()), None)
+    def _prewarm(self):
+        """Render each voice's test phrase once, so no request pays for backend,
+        voice and effects setup, and /test is served from the cache
+        """
+        started = time.monotonic()
+        submitted = []
+        for voice_id, voice_config in self.voice_configs.items():
+            processed_text = self.preprocess_text(self.test_phrase(voice_id), voice_config)
+            try:
+                submitted.append((voice_id, self.submit_processed(processed_text, voice_id, voice_config,
+                                                                  timeout=STARTUP_TIMEOUT)))
+            except SynthesisQueueFull as e:
+                logger.warning(f"Could not prewarm {voice_id}: {e}")
+        
+        for voice_id, future in submitted:
+            try:
+                future.result(STARTUP_TIMEOUT)
+            except Exception as e:
+                logger.warning(f"Could not prewarm {voice_id}: {e}")
+        self.prewarm_seconds = round(time.monotonic() - started, 3)
+        logger.info(f"🔥 Prewarmed {len(submitted)} voices in {self.prewarm_seconds}s")
+    
+    def read_phrase_manifest(self, path: Path) -> List[Phrase]:
+        """One Phrase per voice of every entry in a manifest
+        
+        A .json manifest is a list of phrases, each a string (every voice) or
+        {"text": ..., "voices": [...], "id": ...}; a .jsonl manifest holds one
+        such phrase per line, and a .csv manifest has a header naming `text`
+        and optionally `voice` and `id` columns. Any other file holds one
+        phrase per line.
+        """
+        suffix = path.suffix.lower()
+        if suffix == '.json':
+            entries = json.loads(path.read_text(encoding='utf-8'))
+        elif suffix == '.jsonl':
+            entries = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines() if line.strip()]
+        elif suffix == '.csv':
+            with open(path, newline='', encoding='utf-8') as f:
+                entries = list(csv.DictReader(f))
+        else:
+            entries = [line.strip() for line in path.read_text(encoding='utf-8').splitlines()]
+        
+        phrases = []
+        for entry in entries:
+            if isinstance(entry, str):
+                entry = {'text': entry}
+            text = entry.get('text')
+            if not text or not isinstance(text, str):
+                continue
+            voices = entry.get('voices') or ([entry['voice']] if entry.get('voice') else list(self.voice_configs))
+            for voice_id in voices:
+                if voice_id in self.voice_configs:
+                    phrases.append(Phrase(voice_id, text, entry.get('id') or None))
                 else:
-                    target_voice = next((v for v in voices if 'male' in v.name.lower() or 'david' in v.name.lower() or 'mark' in v.name.lower()), None)
-                
-                if target_voice:
-                    self.tts_engine.setProperty('voice', target_voice.id)
-                    logger.info(f"🎭 Selected voice: {target_voice.name} for {voice_config['name']}")
-                    
+                    logger.warning(f"Phrase manifest names unknown voice {voice_id}")
+        return phrases
+    
+    def _prerender(self, manifest: Path):
+        """Fill the audio cache from a phrase manifest without crowding out live requests"""
+        try:
+            phrases = self.read_phrase_manifest(manifest)
         except Exception as e:
-            logger.warning(f"Could not apply voice characteristics: {e}")
+            logger.warning(f"Could not read phrase manifest {manifest}: {e}")
+            self.prerender['done'] = True
+            return
+        
+        self.prerender['phrases'] = len(phrases)
+        pending: deque = deque()
+        
+        def settle(future: concurrent.futures.Future):
+            try:
+                future.result()
+                self.prerender['rendered'] += 1
+            except Exception as e:
+                self.prerender['failed'] += 1
+                logger.warning(f"Could not pre-render phrase: {e}")
+        
+        for voice_id, text, _ in phrases:
+            voice_config = self.voice_configs[voice_id]
+            try:
+                # Background priority and a window of one job per worker keep live traffic first
+                future = self.submit_processed(self.preprocess_text(text, voice_config), voice_id, voice_config,
+                                               timeout=60, priority=PRIORITY_BACKGROUND)
+            except SynthesisQueueFull as e:
+                self.prerender['failed'] += 1
+                logger.warning(f"Could not pre-render phrase: {e}")
+                continue
+            if future.done() and not future.exception():
+                self.prerender['cached'] += 1
+                continue
+            pending.append(future)
+            while len(pending) >= self.pool.num_workers:
+                settle(pending.popleft())
+        
+        while pending:
+            settle(pending.popleft())
+        self.prerender['done'] = True
+        logger.info(f"📼 Pre-rendered {self.prerender['rendered']} phrases "
+                    f"({self.prerender['cached']} already cached, {self.prerender['failed']} failed)")
+    
+    def refresh_voice_index(self, timeout: float = 30.0) -> bool:
+        """Re-enumerate system voices on a worker; returns True if the inventory changed"""
+        job = VoiceInventoryJob()
+        voices, default_voice_id = self.pool.submit(job, timeout=timeout).result(timeout)
+        return self.voice_index.update(voices, default_voice_id)
+    
+    def _voice_refresh_loop(self):
+        while True:
+            time.sleep(VOICE_REFRESH_SECONDS)
+            try:
+                if self.refresh_voice_index():
+                    logger.info("🗂️ System voices changed, character voices re-resolved")
+            except Exception as e:
+                logger.warning(f"Could not refresh system voice index: {e}")
+    
+    def _voice_pack_loop(self):
+        while True:
+            self.voice_pack.refresh()
+            time.sleep(VOICE_PACK_CHECK_SECONDS)
+    
+    def packed_clip(self, text: str, voice_id: str, output: Optional[OutputFormat] = None) -> Optional[PackClip]:
+        """The voice pack's clip of this text, voice and format, if it has one"""
+        if self.voice_pack.pack is None:
+            return None
+        voice_id = self.resolve_voice_id(voice_id)
+        clip = self.voice_pack.get(self.content_key(text, voice_id, output))
+        VOICE_PACK_LOOKUPS.inc(voice_id=voice_id, result='hit' if clip is not None else 'miss')
+        return clip
+    
+    def resolve_voice_id(self, voice_id: str) -> str:
+        """Map unknown voice ids onto the default voice"""
+        return voice_id if voice_id in self.voice_configs else 'kiro_assistant'
+    
+    def get_voice_config(self, voice_id: str) -> Dict[str, Any]:
+        """Get configuration for a specific voice"""
+        return self.voice_configs[self.resolve_voice_id(voice_id)]
+    
+    def update_voice_config(self, voice_id: str, updates: Dict[str, Any]) -> None:
+        """Edit a voice and drop only that voice's cached audio"""
+        config = self.voice_configs[voice_id]
+        for field, value in updates.items():
+            if field == 'characteristics':
+                config['characteristics'] = {**config['characteristics'], **value}
+            else:
+                config[field] = value
+        
+        # Workers rebuild the voice's effects chain on its next render, as its config hash has changed
+        removed = self.cache.invalidate_voice(voice_id)
+        logger.info(f"🔧 Updated voice {voice_id}, invalidated {removed} cached clips")
+    
+    def system_voice_id(self, voice_config: Dict[str, Any]) -> Optional[str]:
+        """Pre-resolved system voice for a character voice, else the default system voice"""
+        target_voice = self.voice_index.resolve(voice_config)
+        return target_voice.id if target_voice else self.voice_index.default_voice_id
+    
+    def segment_text(self, text: str, voice_config: Dict[str, Any]) -> List[Segment]:
+        """Normalize text into speakable segments with the voice's prosody rules"""
+        return normalize_text(text, voice_config.get('prosody'))
     
     def preprocess_text(self, text: str, voice_config: Dict[str, Any]) -> str:
-        """Preprocess text based on character and language"""
-        processed_text = text
+        """Speakable text for one render; also what the cache key is built from"""
+        return segments_text(self.segment_text(text, voice_config))
+    
+    def split_into_chunks(self, segments: List[Segment], voice_config: Dict[str, Any],
+                          max_chars: int = STREAM_CHUNK_CHARS) -> List[Chunk]:
+        """Group segments into sentence-sized chunks, each followed by the voice's pause"""
+        return chunk_segments(segments, max_chars, voice_config.get('prosody'))
+    
+    def content_key(self, text: str, voice_id: str, output: Optional[OutputFormat] = None) -> str:
+        """Content address of the clip synthesize_speech returns for these arguments"""
+        voice_id = self.resolve_voice_id(voice_id)
+        voice_config = self.voice_configs[voice_id]
+        return cache_key(self.preprocess_text(text, voice_config), voice_id, voice_config,
+                         output.cache_tag if output is not None else 'wav')
+    
+    def render_cost(self, processed_text: str, voice_id: str, voice_config: Dict[str, Any],
+                    level: bool = True) -> float:
+        """Estimated audio seconds a render would produce; cached audio costs nothing"""
+        if cache_key(processed_text, voice_id, voice_config, 'wav' if level else UNLEVELED_TAG) in self.cache:
+            return 0.0
+        return estimate_audio_seconds(processed_text, voice_config.get('speed_factor', 1.0))
+    
+    def submit_processed(self, processed_text: str, voice_id: str, voice_config: Dict[str, Any],
+                         timeout: Optional[float] = None, priority: int = PRIORITY_NORMAL,
+                         token: Optional[CancellationToken] = None, level: bool = True) -> concurrent.futures.Future:
+        """Resolve already-preprocessed text from the cache or queue it for a worker
         
-        # Add character-specific speech patterns
-        character_name = voice_config['name']
+        With `level` False the clip is rendered without loudness normalization
+        and trimming, for a caller that levels a whole stream itself.
+        """
+        key = cache_key(processed_text, voice_id, voice_config, 'wav' if level else UNLEVELED_TAG)
+        cached = self.cache.get(key)
+        if cached is not None:
+            future = concurrent.futures.Future()
+            future.set_result(cached)
+            return future
         
-        if character_name == 'Smaug':
-            # Add dramatic pauses and emphasis for dragon speech
-            processed_text = processed_text.replace('.', '... ')
-            processed_text = processed_text.replace('!', '! ')
-            
-        elif character_name in ['Arwen', 'Legolas']:
-            # Add elvish elegance with slight pauses
-            processed_text = processed_text.replace(',', ', ')
-            
-        elif character_name in ['Uruk', 'Ghashak']:
-            # Make orcish speech more direct and forceful
-            processed_text = processed_text.replace('?', '?!')
+        # Each job carries its own copy of the voice settings
+        job = SynthesisJob(processed_text, voice_id, copy.deepcopy(voice_config), priority, level)
+        
+        def start() -> concurrent.futures.Future:
+            future = self.pool.submit(job, timeout=timeout)
             
-        elif character_name == 'Kiro':
-            # Add friendly, enthusiastic tone
-            processed_text = processed_text.replace('!', '! ')
+            def store(done: concurrent.futures.Future):
+                if not done.cancelled() and done.exception() is None:
+                    self.cache.put(key, voice_id, done.result())
             
-        return processed_text
+            # Registered before the waiters are released, so the next identical request hits the cache
+            future.add_done_callback(store)
+            return future
+        
+        # Identical requests already in flight share that render instead of queuing another;
+        # a more urgent joiner promotes the shared job
+        future = self.inflight.submit(key, start, priority, lambda urgent: self.pool.scheduler.promote(job, urgent))
+        if token is not None:
+            token.attach(future)
+        return future
     
-    async def synthesize_speech(self, text: str, voice_id: str, **kwargs) -> bytes:
-        """Synthesize speech with the specified voice"""
-        if not self.is_initialized:
-            raise Exception("TTS engine not initialized")
+    async def synthesize_speech(self, text: str, voice_id: str, output: Optional[OutputFormat] = None,
+                                priority: int = PRIORITY_NORMAL, token: Optional[CancellationToken] = None,
+                                report: Optional[Dict[str, Any]] = None, **kwargs) -> bytes:
+        """Synthesize speech with the specified voice, encoded as `output` (WAV by default)
+        
+        `report`, if given, receives 'segments' and 'segments_reused': how many
+        chunks the text was split into and how many came from the cache.
+        """
+        try:
+            return await self._synthesize(text, voice_id, output, priority, token, report if report is not None else {})
+        except asyncio.CancelledError:
+            # Cancelling the token cancels the pending render, which surfaces here
+            if token is not None and token.cancelled:
+                raise SynthesisCancelled("Synthesis was cancelled")
+            raise
+    
+    async def _synthesize(self, text: str, voice_id: str, output: Optional[OutputFormat],
+                          priority: int, token: Optional[CancellationToken], report: Dict[str, Any]) -> bytes:
+        await self.wait_until_ready()
         
+        self.admission.check_text(text)
+        voice_id = self.resolve_voice_id(voice_id)
         voice_config = self.get_voice_config(voice_id)
-        processed_text = self.preprocess_text(text, voice_config)
+        with STAGE_SECONDS.time(stage='preprocess', voice_id=voice_id):
+            segments = self.segment_text(text, voice_config)
+            processed_text = segments_text(segments)
+            chunks = self.split_into_chunks(segments, voice_config) if SEGMENT_CACHE else []
+        # Until a render says otherwise, everything came from the cache
+        report.update(segments=max(1, len(chunks)), segments_reused=max(1, len(chunks)))
         
-        # Apply voice characteristics
-        self.apply_voice_characteristics(voice_config)
+        async def render() -> bytes:
+            if len(chunks) > 1:
+                return await self._render_segments(processed_text, chunks, voice_id, voice_config,
+                                                   priority, token, report)
+            cost = self.render_cost(processed_text, voice_id, voice_config)
+            ticket = self.admission.admit(cost, priority)
+            try:
+                audio_data = await asyncio.wrap_future(
+                    self.submit_processed(processed_text, voice_id, voice_config, priority=priority, token=token)
+                )
+            finally:
+                ticket.release()
+            report['segments_reused'] = 0 if cost else 1
+            return audio_data
         
-        # Generate unique filename
-        timestamp = int(time.time() * 1000)
-        audio_file = self.temp_dir / f"kokoro_{voice_id}_{timestamp}.wav"
+        if output is None or output.cache_tag == 'wav':
+            return await render()
         
+        # Encoded variants are cached under their own key, next to the WAV they come from
+        key = cache_key(processed_text, voice_id, voice_config, output.cache_tag)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        
+        wav_data = await render()
         try:
-            # Synthesize to file
-            self.tts_engine.save_to_file(processed_text, str(audio_file))
-            self.tts_engine.runAndWait()
-            
-            # Wait for file to be created
-            max_wait = 10  # seconds
-            wait_time = 0
-            while not audio_file.exists() and wait_time < max_wait:
-                await asyncio.sleep(0.1)
-                wait_time += 0.1
-            
-            if not audio_file.exists():
-                raise Exception("Audio file was not created")
-            
-            # Read the audio file
-            with open(audio_file, 'rb') as f:
-                audio_data = f.read()
+            with STAGE_SECONDS.time(stage='encode', voice_id=voice_id):
+                encoded = await asyncio.get_running_loop().run_in_executor(None, encode_audio, wav_data, output)
+        except Exception:
+            ERRORS.inc(stage='encode', voice_id=voice_id)
+            raise
+        self.cache.put(key, voice_id, encoded)
+        return encoded
+    
+    async def _render_segments(self, processed_text: str, chunks: List[Chunk], voice_id: str,
+                               voice_config: Dict[str, Any], priority: int, token: Optional[CancellationToken],
+                               report: Dict[str, Any]) -> bytes:
+        """Render a text chunk by chunk and stitch the chunks with short crossfades
+        
+        Chunks never span sentences and each is cached on its own (under the
+        same keys streaming uses), so replaying an edited text only renders
+        the sentences that changed. The stitched clip is cached as a whole too.
+        """
+        key = cache_key(processed_text, voice_id, voice_config, 'wav')
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        
+        costs = deque(self.render_cost(chunk.text, voice_id, voice_config) for chunk in chunks)
+        reused = sum(1 for chunk in chunks if cache_key(chunk.text, voice_id, voice_config, 'wav') in self.cache)
+        ticket = self.admission.admit(sum(costs), priority)
+        
+        # Like a stream: every worker busy plus one chunk ready, so other requests still get a turn
+        window = self.pool.num_workers + 1
+        remaining = deque(chunks)
+        pending: deque = deque()
+        clips = []
+        try:
+            while remaining or pending:
+                while remaining and len(pending) < window:
+                    pending.append((self.submit_processed(remaining.popleft().text, voice_id, voice_config,
+                                                          priority=priority, token=token), costs.popleft()))
+                future, cost = pending.popleft()
+                try:
+                    clips.append(await asyncio.wrap_future(future))
+                finally:
+                    ticket.release(cost)
+        finally:
+            for future, _ in pending:
+                future.cancel()
+            ticket.release()
+        
+        from kokoro_dsp import stitch_clips
+        with STAGE_SECONDS.time(stage='stitch', voice_id=voice_id):
+            audio_data = await asyncio.get_running_loop().run_in_executor(
+                None, stitch_clips, clips, [chunk.pause for chunk in chunks]
+            )
+        self.cache.put(key, voice_id, audio_data)
+        
+        report['segments_reused'] = reused
+        SEGMENTS.inc(reused, voice_id=voice_id, result='reused')
+        SEGMENTS.inc(len(chunks) - reused, voice_id=voice_id, result='rendered')
+        return audio_data
+    
+    def stream_speech(self, text: str, voice_id: str, priority: int = PRIORITY_INTERACTIVE,
+                      token: Optional[CancellationToken] = None) -> Iterator[bytes]:
+        """Start chunked synthesis and return a generator of WAV stream bytes
+        
+        The first chunks are queued before returning so that a full queue is
+        reported to the caller instead of breaking an already-started stream.
+        Every chunk is its own job, so more urgent work can overtake a stream
+        between chunks, and a cancelled token ends the stream at the next one.
+        Chunks are rendered unleveled and go through one Leveler for the whole
+        stream, so the gain follows the stream and pauses between chunks stay.
+        """
+        self.ensure_ready()
+        
+        self.admission.check_text(text)
+        voice_id = self.resolve_voice_id(voice_id)
+        voice_config = self.get_voice_config(voice_id)
+        with STAGE_SECONDS.time(stage='preprocess', voice_id=voice_id):
+            chunks = self.split_into_chunks(self.segment_text(text, voice_config), voice_config)
+        
+        level = not levels_audio(voice_config)
+        # The whole stream is admitted up front; each chunk gives its share back once rendered
+        costs = deque(self.render_cost(chunk.text, voice_id, voice_config, level) for chunk in chunks)
+        ticket = self.admission.admit(sum(costs), priority)
+        
+        # Keep every worker busy plus one chunk ready to go
+        window = self.pool.num_workers + 1
+        pending = deque()
+        try:
+            for chunk in chunks[:window]:
+                future = self.submit_processed(chunk.text, voice_id, voice_config, priority=priority, token=token,
+                                               level=level)
+                pending.append((future, chunk.pause, costs.popleft()))
+        except Exception:
+            ticket.release()
+            for future, _, _ in pending:
+                future.cancel()
+            raise
+        return self._stream_chunks(deque(zip(chunks[window:], costs)), pending, voice_id, voice_config,
+                                   priority, token, ticket)
+    
+    def _stream_chunks(self, remaining: deque, pending: deque, voice_id: str, voice_config: Dict[str, Any],
+                       priority: int, token: Optional[CancellationToken], ticket: AdmissionTicket) -> Iterator[bytes]:
+        """Yield a WAV header, then each chunk's PCM and trailing pause in order as it finishes"""
+        stream_format = None
+        leveler = None
+        try:
+            while pending:
+                future, pause, cost = pending.popleft()
+                try:
+                    audio_data = future.result()
+                except concurrent.futures.CancelledError:
+                    logger.info(f"🛑 Stream for {voice_id} cancelled")
+                    return
+                finally:
+                    ticket.release(cost)
+                audio_format, frames = decode_wav(audio_data)
+                if remaining:
+                    chunk, cost = remaining.popleft()
+                    pending.append((self.submit_processed(chunk.text, voice_id, voice_config, timeout=30,
+                                                          priority=priority, token=token,
+                                                          level=not levels_audio(voice_config)),
+                                    chunk.pause, cost))
+                
+                if stream_format is None:
+                    stream_format = audio_format
+                    if levels_audio(voice_config):
+                        from kokoro_dsp import Leveler
+                        leveler = Leveler(audio_format.sample_rate, audio_format.channels,
+                                          loudness_target(voice_config), TRIM_SILENCE)
+                    # The leveler writes 16-bit PCM
+                    yield wav_header(stream_format if leveler is None else stream_format._replace(sample_width=2))
+                elif audio_format != stream_format:
+                    raise Exception(f"Chunk format {audio_format} does not match stream format {stream_format}")
+                if pause > 0 and pending:
+                    frames += silence(stream_format, pause)
+                if leveler is not None:
+                    frames = leveler.process_pcm(frames, stream_format)
+                if frames:
+                    yield frames
+            if leveler is not None:
+                yield leveler.flush_pcm()
+        finally:
+            # Client went away or a chunk failed: drop work nobody will read
+            for future, _, _ in pending:
+                future.cancel()
+            ticket.release()
+            if leveler is not None and leveler.trimmed_frames:
+                TRIMMED_SECONDS.inc(leveler.trimmed_seconds, voice_id=voice_id)
+                TRIMMED_BYTES.inc(leveler.trimmed_frames * stream_format.channels * 2, voice_id=voice_id)
+    
+    def health_status(self) -> Dict[str, Any]:
+        """Payload for the /health endpoint"""
+        readiness = self.readiness
+        return {
+            'status': {'ready': 'healthy', 'failed': 'unhealthy'}.get(readiness, 'starting'),
+            'service': 'Kokoro TTS Server',
+            'version': '1.0.0',
+            'initialized': self.is_initialized,
+            'ready': readiness == 'ready',
+            'readiness': readiness,
+            'startup_seconds': self.startup_seconds,
+            'prewarm_seconds': self.prewarm_seconds,
+            'prerender': dict(self.prerender),
+            'available_voices': list(self.voice_configs.keys()),
+            'synthesis_pool': self.pool.stats(),
+            'voice_index': self.voice_index.stats(),
+            'cache': self.cache.stats(),
+            'voice_pack': self.voice_pack.stats(),
+            'coalescing': self.inflight.stats(),
+            'cancellation': self.clients.stats(),
+            'admission': {**self.admission.stats(), 'rate_limit': self.rate_limiter.stats()}
+        }
+    
+    def describe_voices(self) -> List[Dict[str, Any]]:
+        """Public description of every configured voice"""
+        voices = []
+        for voice_id, config in self.voice_configs.items():
+            backend_voice = self.voice_index.resolve(config)
+            voices.append({
+                'id': voice_id,
+                'name': config['name'],
+                'language': config.get('accent', 'neutral'),
+                'gender': config['base_voice'],
+                'characteristics': config['characteristics'],
+                'backend': config.get('backend', DEFAULT_BACKEND),
+                'backend_voice': {'id': backend_voice.id, 'name': backend_voice.name} if backend_voice else None
+            })
+        return voices
+    
+    async def synthesize_batch(self, items: List[Any], priority: int = PRIORITY_NORMAL,
+                               token: Optional[CancellationToken] = None) -> List[Dict[str, Any]]:
+        """Render many utterances at once, grouped by voice
+        
+        Returns one result per item, in order, holding either 'audio' or 'error'.
+        """
+        await self.wait_until_ready()
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        groups: Dict[str, List[Tuple[int, str]]] = {}
+        total_cost = 0.0
+        
+        for index, item in enumerate(items):
+            text = item.get('text') if isinstance(item, dict) else None
+            if not text or not isinstance(text, str):
+                results[index] = {'voice': None, 'error': 'No text provided'}
+                continue
             
-            # Clean up
+            voice_id = self.resolve_voice_id(item.get('voice', 'kiro_assistant'))
+            voice_config = self.get_voice_config(voice_id)
             try:
-                audio_file.unlink()
-            except:
-                pass
+                self.admission.check_text(text)
+                with STAGE_SECONDS.time(stage='preprocess', voice_id=voice_id):
+                    processed_text = self.preprocess_text(text, voice_config)
+                
+                cached = self.cache.get(cache_key(processed_text, voice_id, voice_config, 'wav'))
+                if cached is None:
+                    cost = estimate_audio_seconds(processed_text, voice_config.get('speed_factor', 1.0))
+                    self.admission.check_audio(cost)
+            except AdmissionRejected as e:
+                results[index] = {'voice': voice_id, 'error': str(e)}
+                continue
             
-            logger.info(f"🎵 Generated {len(audio_data)} bytes of audio for {voice_config['name']}")
-            return audio_data
+            if cached is not None:
+                results[index] = {'voice': voice_id, 'audio': cached}
+            else:
+                total_cost += cost
+                groups.setdefault(voice_id, []).append((index, processed_text))
+        
+        # The batch is admitted or shed as a whole
+        ticket = self.admission.reserve(total_cost, priority)
+        try:
+            await self._render_groups(groups, results, priority, token)
+        finally:
+            ticket.release()
+        return results
+    
+    async def _render_groups(self, groups: Dict[str, List[Tuple[int, str]]], results: List[Optional[Dict[str, Any]]],
+                             priority: int, token: Optional[CancellationToken]):
+        """Queue each voice's uncached texts as group jobs and collect their outcomes into `results`"""
+        
+        # One job per voice, split further only when there are fewer voices than workers
+        parts_per_voice = max(1, self.pool.num_workers // max(1, len(groups)))
+        submitted = []
+        for voice_id, members in groups.items():
+            voice_config = self.get_voice_config(voice_id)
+            size = -(-len(members) // parts_per_voice)
+            for start in range(0, len(members), size):
+                part = members[start:start + size]
+                job = VoiceGroupJob([text for _, text in part], voice_id, copy.deepcopy(voice_config), priority)
+                try:
+                    submitted.append((part, voice_id, voice_config, self.pool.submit(job)))
+                except SynthesisQueueFull as e:
+                    for index, _ in part:
+                        results[index] = {'voice': voice_id, 'error': str(e)}
+                    continue
+                if token is not None:
+                    token.attach(job.future)
+        
+        for part, voice_id, voice_config, future in submitted:
+            try:
+                outcomes = await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                if token is None or not token.cancelled:
+                    raise
+                outcomes = [SynthesisCancelled("Synthesis was cancelled")] * len(part)
+            except Exception as e:
+                outcomes = [e] * len(part)
             
+            for (index, processed_text), outcome in zip(part, outcomes):
+                if isinstance(outcome, Exception):
+                    results[index] = {'voice': voice_id, 'error': str(outcome)}
+                else:
+                    self.cache.put(cache_key(processed_text, voice_id, voice_config, 'wav'), voice_id, outcome)
+                    results[index] = {'voice': voice_id, 'audio': outcome}
+    
+    def render_job(self, worker: SynthesisWorker, job: SynthesisJob) -> bytes:
+        """Render a job on a worker-owned backend (runs on the worker thread)"""
+        outcome = self.render_texts(worker, [job.text], job.voice_id, job.voice_config, job.level)[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    
+    def render_group(self, worker: SynthesisWorker, job: VoiceGroupJob) -> List[Any]:
+        """Render every text of a group in one backend call, so the voice is applied once"""
+        return self.render_texts(worker, job.texts, job.voice_id, job.voice_config, job.level)
+    
+    def render_texts(self, worker: SynthesisWorker, texts: List[str], voice_id: str,
+                     voice_config: Dict[str, Any], level: bool = True) -> List[Any]:
+        """Synthesize texts with the voice's backend and apply its effects
+        
+        Returns audio bytes or the exception for each text.
+        """
+        try:
+            rendered = worker.renderer.render(texts, voice_id, voice_config, self.system_voice_id(voice_config), level)
         except Exception as e:
-            logger.error(f"Speech synthesis failed: {e}")
-            # Clean up on error
-            try:
-                if audio_file.exists():
-                    audio_file.unlink()
-            except:
-                pass
-            raise
+            rendered = [(e, 0.0, 0.0)] * len(texts)
+        
+        results = []
+        for audio_data, seconds, trimmed_seconds in rendered:
+            if isinstance(audio_data, Exception):
+                ERRORS.inc(stage='synthesis', voice_id=voice_id)
+                logger.error(f"Speech synthesis failed: {audio_data}")
+            else:
+                self._record_render(voice_id, audio_data, seconds, trimmed_seconds)
+                logger.info(f"🎵 Generated {len(audio_data)} bytes of audio for {voice_config['name']}")
+            results.append(audio_data)
+        return results
+    
+    def _record_render(self, voice_id: str, audio_data: bytes, seconds: float, trimmed_seconds: float = 0.0):
+        """Account one render's audio length against its wall time (real-time factor)
+        
+        The length counts the silence trimmed from the clip: the backend spent
+        its time rendering that too, and admission estimates untrimmed audio.
+        """
+        try:
+            audio_seconds = wav_duration(audio_data) + trimmed_seconds
+        except Exception:
+            return
+        self.admission.observe(audio_seconds, seconds)
+        AUDIO_SECONDS.inc(audio_seconds, voice_id=voice_id)
+        RENDER_SECONDS.inc(seconds, voice_id=voice_id)
+        if seconds > 0:
+            REALTIME_FACTOR.observe(audio_seconds / seconds, voice_id=voice_id)
+    
+    def collect_metrics(self) -> Iterator[Family]:
+        """Gauges read from the pool, queue, cache and coalescing state at scrape time"""
+        pool = self.pool.stats()
+        cache = self.cache.stats()
+        inflight = self.inflight.stats()
+        workers = pool['workers']
+        yield ('kokoro_ready', 'gauge', 'Whether the engine is ready to synthesize',
+               [({}, 1 if self.readiness == 'ready' else 0)])
+        yield ('kokoro_queue_depth', 'gauge', 'Jobs waiting for a synthesis worker',
+               [({'priority': priority}, count) for priority, count in pool['queued_by_priority'].items()])
+        yield ('kokoro_queue_capacity', 'gauge', 'Jobs the synthesis queue can hold', [({}, pool['queue_capacity'])])
+        yield ('kokoro_workers', 'gauge', 'Synthesis workers with a ready engine', [({}, pool['ready_workers'])])
+        yield ('kokoro_workers_busy', 'gauge', 'Synthesis workers currently rendering', [({}, pool['busy_workers'])])
+        yield ('kokoro_worker_utilization', 'gauge', 'Share of synthesis workers currently rendering',
+               [({}, pool['busy_workers'] / workers if workers else 0)])
+        yield ('kokoro_cache_hits_total', 'counter', 'Audio cache hits by tier',
+               [({'tier': 'memory'}, cache['memory_hits']), ({'tier': 'disk'}, cache['disk_hits'])])
+        yield ('kokoro_cache_misses_total', 'counter', 'Audio cache misses', [({}, cache['misses'])])
+        yield ('kokoro_cache_bytes', 'gauge', 'Audio cache size by tier',
+               [({'tier': 'memory'}, cache['memory_bytes']), ({'tier': 'disk'}, cache['disk_bytes'])])
+        yield ('kokoro_coalesced_requests_total', 'counter', 'Requests served by joining an identical in-flight render',
+               [({}, inflight['coalesced_requests'])])
+        yield ('kokoro_in_flight_renders', 'gauge', 'Distinct renders currently in flight', [({}, inflight['in_flight'])])
+        yield ('kokoro_admission_wait_seconds', 'gauge', 'Estimated queueing delay for a newly admitted request',
+               [({}, self.admission.estimated_wait())])
 
 # Global voice engine instance
 voice_engine = KokoroVoiceEngine()
 
+@app.after_request
+def count_response(response):
+    HTTP_RESPONSES.inc(endpoint=request.endpoint or 'unknown', status=str(response.status_code))
+    return response
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'service': 'Kokoro TTS Server',
-        'version': '1.0.0',
-        'initialized': voice_engine.is_initialized,
-        'available_voices': list(voice_engine.voice_configs.keys())
-    })
+    return jsonify(voice_engine.health_status())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics for this server process"""
+    return Response(REGISTRY.render(), mimetype=CONTENT_TYPE)
 
 @app.route('/voices', methods=['GET'])
 def get_voices():
     """Get available voice configurations"""
-    voices = []
-    for voice_id, config in voice_engine.voice_configs.items():
-        voices.append({
-            'id': voice_id,
-            'name': config['name'],
-            'language': config.get('accent', 'neutral'),
-            'gender': config['base_voice'],
-            'characteristics': config['characteristics']
-        })
+    return jsonify({'voices': voice_engine.describe_voices()})
+
+def request_client_id(headers, data: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Client id for per-client cancellation: the X-Client-Id header, else a client_id field"""
+    return headers.get('X-Client-Id') or (data or {}).get('client_id')
+
+def segment_headers(report: Dict[str, Any]) -> Dict[str, str]:
+    """How much of a response was stitched from cached segments"""
+    return {'X-Segments': str(report.get('segments', 1)), 'X-Segments-Reused': str(report.get('segments_reused', 0))}
+
+def rate_limit_key(client_id: Optional[str]) -> str:
+    """Clients are rate limited by client id, else by address"""
+    return client_id or request.remote_addr or 'anonymous'
+
+def rejection(error: AdmissionRejected):
+    """Error response for a request turned away by admission control"""
+    response = jsonify({'error': str(error)})
+    if error.retry_after_header:
+        response.headers['Retry-After'] = error.retry_after_header
+    return response, error.status
+
+def cancel_when_closed(stream: Iterator[bytes], client_id: Optional[str],
+                       token: CancellationToken) -> Iterator[bytes]:
+    """Pass a stream through, cancelling its outstanding chunks once it is closed or finished"""
+    try:
+        yield from stream
+    finally:
+        token.cancel()
+        voice_engine.clients.release(client_id, token)
+
+def audio_file(audio_data: bytes, output: OutputFormat, stem: str, voice_id: str,
+               headers: Optional[Dict[str, str]] = None, etag: Optional[str] = None) -> Response:
+    """Send encoded audio from memory; the body depends on Accept, so say so to caches
     
-    return jsonify({'voices': voices})
+    GET requests may ask for a byte range, checked against `etag` by If-Range.
+    """
+    response = send_file(
+        io.BytesIO(audio_data),
+        mimetype=output.codec.mimetype,
+        as_attachment=False,
+        download_name=f'{stem}.{output.codec.extension}',
+        etag=etag or True
+    )
+    response.headers['Vary'] = 'Accept'
+    response.headers.update(headers or {})
+    # The WSGI server closes the response once the body has been written out
+    started = time.perf_counter()
+    response.call_on_close(lambda: observe_stage('response_send', voice_id, time.perf_counter() - started))
+    return response
 
-@app.route('/synthesize', methods=['POST'])
+@app.route('/synthesize', methods=['GET', 'POST'])
 async def synthesize():
-    """Main TTS synthesis endpoint"""
+    """Main TTS synthesis endpoint; GET takes the same fields as query parameters"""
     try:
-        data = request.get_json()
+        data = request.args.to_dict() if request.method == 'GET' else request.get_json()
         
         if not data:
             return jsonify({'error': 'No JSON data provided'}), 400
@@ -319,64 +1251,256 @@ async def synthesize():
         if not text:
             return jsonify({'error': 'No text provided'}), 400
         
-        logger.info(f"🎭 Synthesizing: '{text[:50]}...' with voice: {voice_id}")
+        try:
+            output = negotiate_format(data, request.headers.get('Accept'))
+            priority = parse_priority(data.get('priority'), PRIORITY_INTERACTIVE)
+        except NotAcceptable as e:
+            return jsonify({'error': str(e)}), 406
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        logger.info(f"🎭 Synthesizing: '{text[:50]}...' with voice: {voice_id} as {output.name}")
         
         # Generate speech
-        audio_data = await voice_engine.synthesize_speech(text, voice_id, **data)
+        client_id = request_client_id(request.headers, data)
+        token = voice_engine.clients.issue(client_id)
+        report = {}
+        try:
+            voice_engine.rate_limiter.check(rate_limit_key(client_id))
+            clip = voice_engine.packed_clip(text, voice_id, output)
+            if clip is not None:
+                # The WSGI server only writes bytes, so the clip is copied out of the mapping here
+                return audio_file(bytes(clip.data), output, f'{voice_id}_speech', clip.entry.voice_id,
+                                  {'X-Voice-Pack': 'hit'}, etag=clip.entry.key)
+            audio_data = await voice_engine.synthesize_speech(
+                text, voice_id, output=output, priority=priority, token=token, report=report
+            )
+        except AdmissionRejected as e:
+            return rejection(e)
+        except SynthesisCancelled as e:
+            return jsonify({'error': str(e)}), 499
+        except UnsupportedFormat as e:
+            return jsonify({'error': str(e)}), 406
+        finally:
+            voice_engine.clients.release(client_id, token)
+        
+        # Return audio straight from memory
+        return audio_file(audio_data, output, f'{voice_id}_speech', voice_engine.resolve_voice_id(voice_id),
+                          segment_headers(report))
+        
+    except Exception as e:
+        logger.error(f"Synthesis error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/synthesize/stream', methods=['POST'])
+def synthesize_stream():
+    """Chunked TTS endpoint: audio starts after the first sentence is rendered"""
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': 'No JSON data provided'}), 400
+        
+        text = data.get('text', '')
+        voice_id = data.get('voice', 'kiro_assistant')
+        
+        if not text:
+            return jsonify({'error': 'No text provided'}), 400
         
-        # Create temporary file for response
-        temp_file = voice_engine.temp_dir / f"response_{int(time.time() * 1000)}.wav"
-        with open(temp_file, 'wb') as f:
-            f.write(audio_data)
+        try:
+            priority = parse_priority(data.get('priority'), PRIORITY_INTERACTIVE)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        logger.info(f"🌊 Streaming: '{text[:50]}...' with voice: {voice_id}")
+        
+        client_id = request_client_id(request.headers, data)
+        token = voice_engine.clients.issue(client_id)
+        try:
+            voice_engine.rate_limiter.check(rate_limit_key(client_id))
+            stream = voice_engine.stream_speech(text, voice_id, priority=priority, token=token)
+        except AdmissionRejected as e:
+            token.cancel()
+            voice_engine.clients.release(client_id, token)
+            return rejection(e)
         
-        # Return audio file
-        return send_file(
-            str(temp_file),
+        return Response(
+            cancel_when_closed(stream, client_id, token),
             mimetype='audio/wav',
-            as_attachment=False,
-            download_name=f'{voice_id}_speech.wav'
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
         )
         
     except Exception as e:
-        logger.error(f"Synthesis error: {e}")
+        logger.error(f"Streaming synthesis error: {e}")
         return jsonify({'error': str(e)}), 500
 
+def batch_manifest(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Per-item status for a batch response, without the audio itself"""
+    manifest = []
+    for index, result in enumerate(results):
+        entry = {'index': index, 'voice': result['voice']}
+        if 'audio' in result:
+            entry.update({'status': 'ok', 'bytes': len(result['audio'])})
+        else:
+            entry.update({'status': 'error', 'error': result['error']})
+        manifest.append(entry)
+    return manifest
+
+def encode_batch_multipart(results: List[Dict[str, Any]]) -> Tuple[bytes, str]:
+    """multipart/mixed body (a JSON manifest part, then one part per item) and its mimetype"""
+    boundary = uuid.uuid4().hex
+    manifest = batch_manifest(results)
+    
+    def part(headers: Dict[str, str], body: bytes) -> bytes:
+        lines = [f'--{boundary}'] + [f'{name}: {value}' for name, value in headers.items()]
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8') + body + b'\r\n'
+    
+    body = [part({'Content-Type': 'application/json', 'Content-Disposition': 'inline; name="manifest"'},
+                 json.dumps({'items': manifest}).encode('utf-8'))]
+    for entry, result in zip(manifest, results):
+        headers = {'X-Item-Index': str(entry['index']), 'X-Item-Status': entry['status']}
+        if 'audio' in result:
+            headers['Content-Type'] = 'audio/wav'
+            headers['Content-Disposition'] = f'attachment; name="item-{entry["index"]}"; filename="{entry["index"]}_{entry["voice"]}.wav"'
+            body.append(part(headers, result['audio']))
+        else:
+            headers['Content-Type'] = 'application/json'
+            headers['Content-Disposition'] = f'inline; name="item-{entry["index"]}"'
+            body.append(part(headers, json.dumps(entry).encode('utf-8')))
+    body.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    
+    return b''.join(body), f'multipart/mixed; boundary={boundary}'
+
+def encode_batch_zip(results: List[Dict[str, Any]]) -> bytes:
+    """Uncompressed zip with one WAV per item plus index.json
+    
+    index.json records each clip's byte offset inside the archive, so clients
+    can slice clips out of the body without unpacking it.
+    """
+    manifest = batch_manifest(results)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for entry, result in zip(manifest, results):
+            if 'audio' not in result:
+                continue
+            entry['file'] = f"{entry['index']:04d}_{entry['voice']}.wav"
+            info = zipfile.ZipInfo(entry['file'])
+            archive.writestr(info, result['audio'])
+            # Local header is 30 bytes plus the name; writestr adds no extra field
+            entry['offset'] = info.header_offset + 30 + len(info.filename.encode('utf-8'))
+        archive.writestr('index.json', json.dumps({'items': manifest}, indent=2))
+    
+    return buffer.getvalue()
+
+@app.route('/synthesize/batch', methods=['POST'])
+async def synthesize_batch():
+    """Render several utterances in one call, grouped by voice"""
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': 'No JSON data provided'}), 400
+        
+        items = data.get('items')
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'No items provided'}), 400
+        if len(items) > MAX_BATCH_ITEMS:
+            return jsonify({'error': f'Too many items (max {MAX_BATCH_ITEMS})'}), 400
+        
+        response_format = data.get('format', 'multipart')
+        if response_format not in ('multipart', 'zip'):
+            return jsonify({'error': f"Unknown batch format '{response_format}'"}), 400
+        
+        try:
+            priority = parse_priority(data.get('priority'), PRIORITY_NORMAL)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        logger.info(f"📦 Batch synthesizing {len(items)} items")
+        
+        client_id = request_client_id(request.headers, data)
+        token = voice_engine.clients.issue(client_id)
+        try:
+            # Each item costs one request against the client's rate limit
+            voice_engine.rate_limiter.check(rate_limit_key(client_id), cost=len(items))
+            results = await voice_engine.synthesize_batch(items, priority=priority, token=token)
+        except AdmissionRejected as e:
+            return rejection(e)
+        finally:
+            voice_engine.clients.release(client_id, token)
+        
+        if response_format == 'zip':
+            return send_file(
+                io.BytesIO(encode_batch_zip(results)),
+                mimetype='application/zip',
+                as_attachment=True,
+                download_name='batch_speech.zip'
+            )
+        
+        body, mimetype = encode_batch_multipart(results)
+        return Response(body, mimetype=mimetype)
+        
+    except Exception as e:
+        logger.error(f"Batch synthesis error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/cancel', methods=['POST'])
+def cancel_requests():
+    """Cancel every outstanding request of one client"""
+    data = request.get_json(silent=True)
+    client_id = request_client_id(request.headers, data)
+    
+    if not client_id:
+        return jsonify({'error': 'No client_id provided'}), 400
+    
+    cancelled = voice_engine.clients.cancel(client_id)
+    logger.info(f"🛑 Cancelled {cancelled} request(s) for client {client_id}")
+    return jsonify({'client_id': client_id, 'cancelled': cancelled})
+
 @app.route('/test/<voice_id>', methods=['GET'])
 async def test_voice(voice_id):
     """Test a specific voice"""
     try:
-        test_text = f"Greetings! This is {voice_engine.get_voice_config(voice_id)['name']} speaking. How do I sound?"
+        test_text = voice_engine.test_phrase(voice_id)
         
-        audio_data = await voice_engine.synthesize_speech(test_text, voice_id)
+        # Previews are background work unless asked otherwise
+        try:
+            output = negotiate_format(request.args, request.headers.get('Accept'))
+            priority = parse_priority(request.args.get('priority'), PRIORITY_BACKGROUND)
+        except NotAcceptable as e:
+            return jsonify({'error': str(e)}), 406
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Create temporary file for response
-        temp_file = voice_engine.temp_dir / f"test_{voice_id}_{int(time.time() * 1000)}.wav"
-        with open(temp_file, 'wb') as f:
-            f.write(audio_data)
+        client_id = request_client_id(request.headers, request.args)
+        token = voice_engine.clients.issue(client_id)
+        try:
+            voice_engine.rate_limiter.check(rate_limit_key(client_id))
+            audio_data = await voice_engine.synthesize_speech(
+                test_text, voice_id, output=output, priority=priority, token=token
+            )
+        except AdmissionRejected as e:
+            return rejection(e)
+        except SynthesisCancelled as e:
+            return jsonify({'error': str(e)}), 499
+        except UnsupportedFormat as e:
+            return jsonify({'error': str(e)}), 406
+        finally:
+            voice_engine.clients.release(client_id, token)
         
-        return send_file(
-            str(temp_file),
-            mimetype='audio/wav',
-            as_attachment=False,
-            download_name=f'test_{voice_id}.wav'
-        )
+        return audio_file(audio_data, output, f'test_{voice_id}', voice_engine.resolve_voice_id(voice_id))
         
     except Exception as e:
         logger.error(f"Voice test error: {e}")
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    # Development server; use kokoro_asgi.py for the production ASGI server
     print("🎭 Starting Kokoro TTS Server...")
-    print("🎵 Magical voices loading...")
-    
-    # Clean up old temp files on startup
-    try:
-        for old_file in voice_engine.temp_dir.glob("*.wav"):
-            old_file.unlink()
-    except:
-        pass
+    print("🎵 Magical voices loading in the background...")
+    voice_engine.start()
     
-    print("✨ Kokoro TTS Server ready!")
+    print("✨ Kokoro TTS Server accepting requests (see /health for readiness)")
     print("🌟 Available at: http://localhost:5002")
     print("🎪 Available voices:")
     for voice_id, config in voice_engine.voice_configs.items():
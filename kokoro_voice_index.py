@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Kokoro System Voice Index
+Resolves character voices onto installed system voices once, not per request
+"""
+
+import hashlib
+import logging
+import re
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Whole-word name hints per gender; matching on tokens keeps 'male' out of 'female'
+GENDER_HINTS = {
+    'female': {'female', 'woman', 'zira', 'hazel', 'susan', 'eva', 'helena', 'samantha',
+               'victoria', 'karen', 'moira', 'tessa', 'fiona', 'f1', 'f2', 'f3', 'f4', 'f5'},
+    'male': {'male', 'man', 'david', 'mark', 'george', 'james', 'richard', 'daniel',
+             'alex', 'fred', 'oliver', 'm1', 'm2', 'm3', 'm4', 'm5', 'm6', 'm7'}
+}
+# Tokens in a voice's name or languages that suggest a voice_configs accent
+ACCENT_HINTS = {
+    'british': {'gb', 'uk', 'british', 'england', 'hazel', 'george', 'susan', 'daniel'},
+    'deep': {'bass', 'deep'},
+    'rough': {'croak', 'rough'}
+}
+
+# Ranking weights, highest total wins
+SCORE_EXPLICIT = 1000      # voice config names the system voice id or name
+SCORE_GENDER = 100         # reported gender matches (mismatch subtracts)
+SCORE_GENDER_HINT = 50     # name hint matches (opposite hint subtracts)
+SCORE_ACCENT = 20          # accent hint matches
+SCORE_ENGLISH = 10         # voice speaks some variety of English
+
+class SystemVoice(NamedTuple):
+    """Backend-neutral snapshot of one installed voice"""
+    id: str
+    name: str
+    languages: Tuple[str, ...]
+    gender: Optional[str]
+
+def _as_text(value: Any) -> str:
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', errors='ignore')
+    # espeak prefixes language codes with a priority byte
+    return ''.join(ch for ch in str(value) if ch.isprintable()).strip()
+
+def describe_system_voice(voice: Any) -> SystemVoice:
+    """Convert a pyttsx3 Voice into a SystemVoice"""
+    languages = tuple(_as_text(language).lower() for language in (getattr(voice, 'languages', None) or []))
+    gender = getattr(voice, 'gender', None)
+    gender = _as_text(gender).lower() if gender else None
+    # NSSpeechSynthesizer reports e.g. 'VoiceGenderFemale'
+    if gender and gender.endswith('female'):
+        gender = 'female'
+    elif gender and gender.endswith('male'):
+        gender = 'male'
+    elif gender not in ('male', 'female'):
+        gender = None
+    return SystemVoice(str(voice.id), _as_text(voice.name), languages, gender)
+
+def _tokens(voice: SystemVoice) -> set:
+    text = ' '.join((voice.name, voice.id) + voice.languages).lower()
+    return set(token for token in re.split(r'[^a-z0-9]+', text) if token)
+
+def score_voice(voice: SystemVoice, voice_config: Dict[str, Any]) -> int:
+    """Rank how well an installed voice fits a character voice"""
+    explicit = voice_config.get('system_voice')
+    if explicit and explicit in (voice.id, voice.name):
+        return SCORE_EXPLICIT
+    
+    wanted = voice_config.get('base_voice')
+    other = {'female': 'male', 'male': 'female'}.get(wanted)
+    tokens = _tokens(voice)
+    score = 0
+    
+    if voice.gender and wanted:
+        score += SCORE_GENDER if voice.gender == wanted else -SCORE_GENDER
+    if wanted in GENDER_HINTS and tokens & GENDER_HINTS[wanted]:
+        score += SCORE_GENDER_HINT
+    if other and tokens & GENDER_HINTS[other]:
+        score -= SCORE_GENDER_HINT
+    
+    accent_hints = ACCENT_HINTS.get(voice_config.get('accent'))
+    if accent_hints and tokens & accent_hints:
+        score += SCORE_ACCENT
+    if any(language.startswith('en') for language in voice.languages) or 'english' in tokens:
+        score += SCORE_ENGLISH
+    return score
+
+class VoiceIndex:
+    """Installed-voice inventory plus cached character-to-system-voice resolutions
+    
+    Resolutions are keyed by the parts of a voice config that influence the
+    match, so editing a voice re-resolves only that profile, and the cache is
+    dropped only when the installed inventory actually changes.
+    """
+    
+    def __init__(self):
+        self.voices: List[SystemVoice] = []
+        self.default_voice_id: Optional[str] = None
+        self.fingerprint: Optional[str] = None
+        self._resolved: Dict[tuple, Optional[SystemVoice]] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _profile(voice_config: Dict[str, Any]) -> tuple:
+        return (voice_config.get('base_voice'), voice_config.get('accent'), voice_config.get('system_voice'))
+    
+    def update(self, voices: Iterable[SystemVoice], default_voice_id: Optional[str] = None) -> bool:
+        """Install a fresh inventory; returns True if it differs from the current one"""
+        voices = list(voices)
+        digest = hashlib.sha256('\n'.join(sorted(f"{v.id}\t{v.name}" for v in voices)).encode('utf-8')).hexdigest()
+        with self._lock:
+            # Later refreshes run on engines that have since switched voices,
+            # so only the first enumeration defines the default
+            if self.default_voice_id is None:
+                self.default_voice_id = default_voice_id
+            if digest == self.fingerprint:
+                return False
+            self.voices = voices
+            self.fingerprint = digest
+            self._resolved.clear()
+        logger.info(f"🗂️ System voice index built from {len(voices)} voices")
+        return True
+    
+    def resolve(self, voice_config: Dict[str, Any]) -> Optional[SystemVoice]:
+        """Best installed voice for a character voice, or None to keep the engine default"""
+        profile = self._profile(voice_config)
+        with self._lock:
+            if profile in self._resolved:
+                return self._resolved[profile]
+            
+            best, best_score = None, 0
+            # Strictly greater keeps the earliest voice on ties
+            for voice in self.voices:
+                score = score_voice(voice, voice_config)
+                if score > best_score:
+                    best, best_score = voice, score
+            self._resolved[profile] = best
+        
+        if best:
+            logger.info(f"🎭 Resolved {voice_config.get('name')} to system voice: {best.name}")
+        return best
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'system_voices': len(self.voices),
+            'resolved_profiles': len(self._resolved)
+        }
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Kokoro Synthesis Workers
+What one synthesis worker renders with, and worker processes that hand audio back through shared memory
+"""
+
+import importlib
+import logging
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from kokoro_backends import DEFAULT_BACKEND, RenderOutcome, SynthesisBackend, create_backend
+from kokoro_cache import config_hash
+from kokoro_metrics import REGISTRY, TRIMMED_BYTES, TRIMMED_SECONDS, forward_metrics, observe_stage, take_forwarded
+from kokoro_voice_index import SystemVoice
+
+# numpy is only needed once clips are post-processed, so kokoro_dsp is imported there
+if TYPE_CHECKING:
+    from kokoro_dsp import VoiceEffectsChain
+
+logger = logging.getLogger(__name__)
+
+# Post-synthesis voice effects (pitch, EQ, breath, reverb, gruffness)
+VOICE_EFFECTS = os.environ.get('KOKORO_VOICE_EFFECTS', '1') != '0'
+# Loudness every clip is normalized to, in LUFS, for voices without a 'loudness' of their own ('off' disables)
+LOUDNESS_TARGET = os.environ.get('KOKORO_LOUDNESS_TARGET', '-16')
+# Trim leading and trailing silence from every clip
+TRIM_SILENCE = os.environ.get('KOKORO_TRIM_SILENCE', '1') != '0'
+# 'thread' runs the workers inside the server process; 'process' gives every worker its own process
+WORKER_MODE = os.environ.get('KOKORO_WORKER_MODE', 'thread')
+# "module:function" called in every worker process before it creates a backend (e.g. register_backend)
+WORKER_INIT = os.environ.get('KOKORO_WORKER_INIT', '')
+# Initial shared-memory buffer per worker process; it grows to fit the largest render seen
+WORKER_BUFFER_BYTES = int(float(os.environ.get('KOKORO_WORKER_BUFFER_MB', 4)) * 1024 * 1024)
+# How long a worker process may take to start and create its default backend
+PROCESS_START_TIMEOUT = 30.0
+
+# Audio bytes or the exception for one text, the seconds spent rendering it and the seconds of silence trimmed
+# from it, so render speed is measured against all the audio the backend produced
+Rendered = Tuple[RenderOutcome, float, float]
+
+def loudness_target(voice_config: Dict[str, Any]) -> Optional[float]:
+    """The voice's loudness target in LUFS, or None when normalization is off"""
+    if LOUDNESS_TARGET.lower() == 'off':
+        return None
+    return float(voice_config.get('loudness', LOUDNESS_TARGET))
+
+def levels_audio(voice_config: Dict[str, Any]) -> bool:
+    """Whether the voice's clips are loudness normalized or trimmed at all"""
+    return TRIM_SILENCE or loudness_target(voice_config) is not None
+
+class WorkerRenderer:
+    """Backends and effect chains owned by one synthesis worker
+    
+    Everything here is used from a single thread: the worker thread, or the
+    main thread of a worker process.
+    """
+    
+    def __init__(self, scratch_file: Path, workers: int):
+        self.scratch_file = scratch_file
+        self.workers = workers
+        # backend name -> instance (the default backend's, for one that is unavailable)
+        self.backends: Dict[str, SynthesisBackend] = {}
+        # (voice_id, sample_rate) -> (config hash, chain); rebuilt only when a voice changes
+        self.effect_chains: Dict[tuple, tuple] = {}
+    
+    @property
+    def engine_ready(self) -> bool:
+        return DEFAULT_BACKEND in self.backends
+    
+    def backend_names(self) -> List[str]:
+        return sorted({backend.name for backend in list(self.backends.values())})
+    
+    def start(self):
+        """Create the default backend; raises if it cannot be created"""
+        self.backend(DEFAULT_BACKEND)
+    
+    def backend(self, name: str) -> SynthesisBackend:
+        """This worker's instance of a backend, created on first use"""
+        backend = self.backends.get(name)
+        if backend is None:
+            try:
+                backend = create_backend(name, scratch_file=self.scratch_file, workers=self.workers)
+            except Exception as e:
+                if name == DEFAULT_BACKEND or not self.engine_ready:
+                    raise
+                logger.warning(f"Synthesis backend '{name}' unavailable, using {DEFAULT_BACKEND}: {e}")
+                backend = self.backends[DEFAULT_BACKEND]
+            self.backends[name] = backend
+        return backend
+    
+    def list_voices(self) -> Tuple[List[SystemVoice], Optional[str]]:
+        return self.backend(DEFAULT_BACKEND).list_voices()
+    
+    def effects_chain(self, voice_id: str, voice_config: Dict[str, Any], sample_rate: int) -> 'VoiceEffectsChain':
+        """Return the voice's effects chain, building it once per config and sample rate"""
+        chain_key = (voice_id, sample_rate)
+        digest = config_hash(voice_config)
+        entry = self.effect_chains.get(chain_key)
+        if entry is None or entry[0] != digest:
+            from kokoro_dsp import VoiceEffectsChain
+            entry = (digest, VoiceEffectsChain(voice_id, voice_config, sample_rate))
+            self.effect_chains[chain_key] = entry
+        return entry[1]
+    
+    def render(self, texts: List[str], voice_id: str, voice_config: Dict[str, Any],
+               system_voice_id: Optional[str], level: bool = True) -> List[Rendered]:
+        """Synthesize texts with the voice's backend, then apply its effects and, if `level`, its leveling"""
+        started = time.perf_counter()
+        try:
+            backend = self.backend(voice_config.get('backend', DEFAULT_BACKEND))
+            outcomes = backend.render(texts, voice_id, voice_config, system_voice_id)
+        except Exception as e:
+            outcomes = [e] * len(texts)
+        # Backends that render several texts at once only know their combined time
+        synthesis_seconds = (time.perf_counter() - started) / max(1, len(texts))
+        
+        target_lufs = loudness_target(voice_config) if level else None
+        trim = TRIM_SILENCE and level
+        chain_for_rate = None
+        if VOICE_EFFECTS:
+            chain_for_rate = lambda sample_rate: self.effects_chain(voice_id, voice_config, sample_rate)
+        
+        rendered: List[Rendered] = []
+        for audio_data in outcomes:
+            if isinstance(audio_data, Exception):
+                rendered.append((audio_data, 0.0, 0.0))
+                continue
+            
+            effects_started = time.perf_counter()
+            trimmed_seconds = 0.0
+            try:
+                if chain_for_rate is not None or target_lufs is not None or trim:
+                    from kokoro_dsp import postprocess
+                    clip = postprocess(audio_data, chain_for_rate, target_lufs, trim)
+                    audio_data = clip.audio
+                    observe_stage('postprocess', voice_id, time.perf_counter() - effects_started)
+                    trimmed_seconds = clip.trimmed_seconds
+                    if clip.trimmed_bytes:
+                        TRIMMED_SECONDS.inc(clip.trimmed_seconds, voice_id=voice_id)
+                        TRIMMED_BYTES.inc(clip.trimmed_bytes, voice_id=voice_id)
+            except Exception as e:
+                rendered.append((e, 0.0, 0.0))
+                continue
+            rendered.append((audio_data, synthesis_seconds + time.perf_counter() - effects_started, trimmed_seconds))
+        return rendered
+    
+    def close(self):
+        for backend in set(self.backends.values()):
+            backend.close()
+
+def _run_worker_init():
+    """Call KOKORO_WORKER_INIT, so backends registered in the server exist in worker processes too"""
+    if not WORKER_INIT:
+        return
+    module_name, _, function_name = WORKER_INIT.partition(':')
+    getattr(importlib.import_module(module_name), function_name or 'init')()
+
+def _worker_process_main(conn, index: int, workers: int, scratch_file: Path, buffer_name: str):
+    """Entry point of a worker process: serve render requests from `conn`
+    
+    Audio is written into the shared buffer the front end allocated, and only
+    its offsets and lengths travel over the pipe.
+    """
+    logging.basicConfig(level=logging.INFO)
+    # Metrics go back to the front end with each reply, where /metrics is served
+    forward_metrics()
+    renderer = WorkerRenderer(scratch_file, workers)
+    buffer = shared_memory.SharedMemory(name=buffer_name)
+    try:
+        _run_worker_init()
+        renderer.start()
+    except Exception as e:
+        conn.send(('failed', str(e)))
+        buffer.close()
+        return
+    conn.send(('ready', renderer.backend_names()))
+    
+    try:
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                break
+            kind = request[0]
+            if kind == 'stop':
+                break
+            
+            try:
+                if kind == 'voices':
+                    conn.send(('voices', renderer.list_voices()))
+                    continue
+                
+                _, texts, voice_id, voice_config, system_voice_id, level = request
+                rendered = renderer.render(texts, voice_id, voice_config, system_voice_id, level)
+                needed = sum(len(audio_data) for audio_data, _, _ in rendered if not isinstance(audio_data, Exception))
+                if needed > buffer.size:
+                    # The front end replaces the buffer with a larger one and sends its name
+                    conn.send(('grow', needed))
+                    buffer.close()
+                    buffer = shared_memory.SharedMemory(name=conn.recv()[1])
+                
+                results = []
+                offset = 0
+                for audio_data, seconds, trimmed_seconds in rendered:
+                    if isinstance(audio_data, Exception):
+                        results.append(('error', str(audio_data), seconds))
+                        continue
+                    buffer.buf[offset:offset + len(audio_data)] = audio_data
+                    results.append(('audio', offset, len(audio_data), seconds, trimmed_seconds))
+                    offset += len(audio_data)
+                conn.send(('rendered', results, renderer.backend_names(), take_forwarded()))
+            except Exception as e:
+                conn.send(('error', str(e)))
+    finally:
+        renderer.close()
+        buffer.close()
+
+class WorkerProcess:
+    """Front-end side of one worker process, driven by its synthesis worker thread
+    
+    Requests and replies are small pickled tuples; rendered audio comes back
+    through a shared-memory buffer owned by this side, so it is copied once
+    instead of being pickled through the pipe. A process that dies is
+    restarted on the next request.
+    """
+    
+    def __init__(self, index: int, workers: int, scratch_file: Path):
+        self.index = index
+        self.workers = workers
+        self.scratch_file = scratch_file
+        self.process: Optional[multiprocessing.process.BaseProcess] = None
+        self.conn = None
+        self.buffer = shared_memory.SharedMemory(create=True, size=WORKER_BUFFER_BYTES)
+        self.backends: List[str] = []
+        self.started = False
+        self.restarts = 0
+    
+    @property
+    def engine_ready(self) -> bool:
+        """Whether the process came up once; a process that died since is restarted by the next request"""
+        return self.started
+    
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+    
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process is not None else None
+    
+    def backend_names(self) -> List[str]:
+        return list(self.backends)
+    
+    def start(self):
+        """Spawn the process and wait until it has created its default backend"""
+        # Spawned rather than forked: the server process already runs threads
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_process_main,
+            args=(child_conn, self.index, self.workers, self.scratch_file, self.buffer.name),
+            name=f"kokoro-synth-process-{self.index}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        
+        try:
+            if not self.conn.poll(PROCESS_START_TIMEOUT):
+                raise EOFError(f"no reply within {PROCESS_START_TIMEOUT:g}s")
+            status, detail = self.conn.recv()
+        except EOFError as e:
+            status, detail = 'failed', f"Worker process {self.index} exited during startup ({e or 'no reply'})"
+        if status != 'ready':
+            self._stop_process()
+            raise Exception(detail)
+        self.backends = detail
+        self.started = True
+        logger.info(f"🧩 Worker process {self.index} ready (pid {self.process.pid}, {', '.join(self.backends)})")
+    
+    def _request(self, message: tuple) -> tuple:
+        """Send one request and return its reply, restarting the process if it has died"""
+        if not self.alive:
+            self._restart()
+        try:
+            self.conn.send(message)
+            reply = self.conn.recv()
+            if reply[0] == 'grow':
+                self._grow(reply[1])
+                reply = self.conn.recv()
+        except (EOFError, OSError) as e:
+            self._restart()
+            raise Exception(f"Worker process {self.index} exited during the request") from e
+        if reply[0] == 'error':
+            raise Exception(reply[1])
+        return reply
+    
+    def _grow(self, needed: int):
+        old = self.buffer
+        self.buffer = shared_memory.SharedMemory(create=True, size=max(needed, old.size * 2))
+        self.conn.send(('buffer', self.buffer.name))
+        old.close()
+        old.unlink()
+    
+    def _restart(self):
+        self._stop_process()
+        self.restarts += 1
+        logger.warning(f"Restarting worker process {self.index}")
+        self.start()
+    
+    def list_voices(self) -> Tuple[List[SystemVoice], Optional[str]]:
+        return self._request(('voices',))[1]
+    
+    def render(self, texts: List[str], voice_id: str, voice_config: Dict[str, Any],
+               system_voice_id: Optional[str], level: bool = True) -> List[Rendered]:
+        _, results, self.backends, observations = self._request(('render', texts, voice_id, voice_config,
+                                                                 system_voice_id, level))
+        REGISTRY.replay(observations)
+        
+        rendered: List[Rendered] = []
+        for result in results:
+            if result[0] == 'error':
+                rendered.append((Exception(result[1]), result[2], 0.0))
+            else:
+                _, offset, length, seconds, trimmed_seconds = result
+                rendered.append((bytes(self.buffer.buf[offset:offset + length]), seconds, trimmed_seconds))
+        return rendered
+    
+    def _stop_process(self):
+        if self.process is None:
+            return
+        try:
+            if self.process.is_alive():
+                self.conn.send(('stop',))
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=5)
+        self.conn.close()
+        self.process = None
+    
+    def close(self):
+        self._stop_process()
+        self.buffer.close()
+        self.buffer.unlink()
@@ -150,8 +150,10 @@ pause
             f.write(script_content)
         print("✅ Created start_kokoro.bat")
     else:
+        # espeak and NSSpeechSynthesizer render one clip at a time per process
         script_content = '''#!/bin/bash
 echo "🎭 Starting Kokoro TTS Server..."
+export KOKORO_WORKER_MODE="${KOKORO_WORKER_MODE:-process}"
 kokoro_venv/bin/python kokoro_tts_server.py
 '''
         with open("start_kokoro.sh", "w") as f:
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+# The server modules live at the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def server():
+    """The TTS server module with its engine started on the stub backend
+    
+    The server reads its configuration at import, so it is imported here
+    and nowhere at module level in the tests.
+    """
+    os.environ.update({
+        'KOKORO_WORKERS': '2',
+        'KOKORO_WORKER_MODE': 'thread',
+        'KOKORO_PREWARM': '0',
+        'KOKORO_PRERENDER_MANIFEST': '',
+        'KOKORO_VOICE_PACK': '',
+        'KOKORO_DISK_CACHE_MB': '0',
+        'KOKORO_RATE_LIMIT': '0'
+    })
+    import kokoro_benchmark
+    kokoro_benchmark.register_stub_backends()
+    import kokoro_tts_server
+    
+    assert kokoro_tts_server.voice_engine.start().result(timeout=120)
+    yield kokoro_tts_server
+    kokoro_tts_server.voice_engine.pool.shutdown()
+
+
+@pytest.fixture
+def engine(server):
+    return server.voice_engine
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from kokoro_admission import (
+    INITIAL_RENDER_RATIO,
+    RENDER_RATIO_SMOOTHING,
+    AdmissionController,
+    AudioTooLong,
+    ClientRateLimiter,
+    Overloaded,
+    RateLimited,
+    TextTooLong
+)
+from kokoro_audio import AudioFormat, silence, wav_header
+from kokoro_scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+
+
+def controller(**kwargs):
+    options = {'workers': 1, 'max_text_chars': 100, 'max_audio_seconds': 60, 'max_wait_seconds': 10}
+    options.update(kwargs)
+    return AdmissionController(**options)
+
+
+def wav(seconds):
+    audio_format = AudioFormat(1, 2, 16000)
+    frames = silence(audio_format, seconds)
+    return wav_header(audio_format, len(frames)) + frames
+
+
+def test_size_caps():
+    admission = controller()
+    with pytest.raises(TextTooLong):
+        admission.check_text('x' * 101)
+    with pytest.raises(AudioTooLong):
+        admission.admit(61)
+
+
+def test_idle_server_admits_one_large_request():
+    admission = controller()
+    admission.reserve(50)
+    assert admission.stats()['outstanding_audio_seconds'] == 50
+
+
+def test_sheds_once_the_queue_would_wait_too_long():
+    admission = controller()
+    ticket = admission.reserve(30)
+    # 30s queued at 0.25 render seconds per audio second is 7.5s of wait
+    admission.reserve(4, PRIORITY_INTERACTIVE)
+    with pytest.raises(Overloaded) as rejected:
+        admission.reserve(4, PRIORITY_BACKGROUND)
+    assert rejected.value.retry_after > 0
+    ticket.release()
+    admission.reserve(4, PRIORITY_BACKGROUND)
+
+
+def test_release_is_partial_and_idempotent():
+    admission = controller()
+    ticket = admission.reserve(10)
+    ticket.release(4)
+    assert admission.outstanding == pytest.approx(6)
+    ticket.release()
+    ticket.release()
+    assert admission.outstanding == 0
+
+
+def test_observe_moves_the_render_ratio_toward_measured_renders():
+    admission = controller()
+    admission.observe(audio_seconds=2.0, render_seconds=2.0)
+    assert admission.render_ratio == pytest.approx(
+        INITIAL_RENDER_RATIO + RENDER_RATIO_SMOOTHING * (1.0 - INITIAL_RENDER_RATIO)
+    )
+    admission.observe(audio_seconds=0.0, render_seconds=5.0)
+    assert admission.render_ratio < 1.0
+
+
+def test_calibration_counts_trimmed_silence(engine, monkeypatch):
+    monkeypatch.setattr(engine, 'admission', controller())
+    # One second of audio kept and one trimmed, rendered in one second: half a second per audio second
+    engine._record_render('kiro_assistant', wav(1.0), seconds=1.0, trimmed_seconds=1.0)
+    assert engine.admission.render_ratio == pytest.approx(
+        INITIAL_RENDER_RATIO + RENDER_RATIO_SMOOTHING * (0.5 - INITIAL_RENDER_RATIO)
+    )
+
+
+def test_synthesis_returns_its_reservation(engine):
+    asyncio.run(engine.synthesize_speech('Admission is returned after this render.', 'kiro_assistant'))
+    assert engine.admission.outstanding == 0
+
+
+def test_rate_limiter_rejects_past_the_burst():
+    limiter = ClientRateLimiter(rate=1, burst=2)
+    limiter.check('a')
+    limiter.check('a')
+    with pytest.raises(RateLimited) as rejected:
+        limiter.check('a')
+    assert rejected.value.retry_after_header == '1'
+    limiter.check('b')
+    assert ClientRateLimiter(rate=0, burst=1).check('a') is None
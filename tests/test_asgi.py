@@ -0,0 +1,130 @@
+import asyncio
+import concurrent.futures
+import json
+import threading
+import time
+
+import httpx
+import pytest
+
+
+@pytest.fixture
+def asgi(server):
+    import kokoro_asgi
+    return kokoro_asgi
+
+
+def test_stream_waits_for_a_starting_engine_without_blocking_the_loop(asgi, engine, monkeypatch):
+    started = concurrent.futures.Future()
+    monkeypatch.setattr(engine, 'is_initialized', False)
+    monkeypatch.setattr(engine, 'start', lambda: started)
+    
+    def finish_startup():
+        engine.is_initialized = True
+        started.set_result(True)
+    timer = threading.Timer(1.0, finish_startup)
+    
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi.app), base_url='http://test') as client:
+            before = time.perf_counter()
+            stream = asyncio.ensure_future(client.post('/synthesize/stream', json={'text': 'Wait for me.'}))
+            await asyncio.sleep(0.1)
+            health = await client.get('/health')
+            return health, time.perf_counter() - before, await stream
+    
+    timer.start()
+    health, health_seconds, stream = asyncio.run(main())
+    assert health.status_code == 200
+    assert health_seconds < 0.5
+    assert stream.status_code == 200
+    assert stream.content[:4] == b'RIFF'
+
+
+def asgi_request(asgi, method, path, **kwargs):
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi.app), base_url='http://test') as client:
+            return await client.request(method, path, **kwargs)
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize('field', ['voice_id', 'speed'])
+def test_unknown_body_fields_are_ignored(server, asgi, field):
+    body = {'text': 'Extra fields are not passed on.', 'voice': 'kiro_assistant', field: 'x'}
+    response = server.app.test_client().post('/synthesize', json=body)
+    assert response.status_code == 200
+    assert response.data[:4] == b'RIFF'
+    response = asgi_request(asgi, 'POST', '/synthesize', json=body)
+    assert response.status_code == 200
+    assert response.content[:4] == b'RIFF'
+
+
+def test_health_and_voices_match_the_flask_server(server, asgi):
+    health = asgi_request(asgi, 'GET', '/health')
+    assert health.status_code == 200
+    assert health.json()['status'] == 'healthy'
+    assert health.json()['available_voices'] == server.app.test_client().get('/health').get_json()['available_voices']
+    voices = asgi_request(asgi, 'GET', '/voices')
+    assert voices.json() == server.app.test_client().get('/voices').get_json()
+
+
+@pytest.mark.parametrize('method, kwargs', [
+    ('POST', {'json': {'text': 'Spoken through the ASGI app.', 'voice': 'elvish_female'}}),
+    ('GET', {'params': {'text': 'Spoken through the ASGI app.', 'voice': 'elvish_female'}})
+])
+def test_synthesize_returns_wav(asgi, method, kwargs):
+    response = asgi_request(asgi, method, '/synthesize', **kwargs)
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'audio/wav'
+    assert response.headers['x-segments'] == '1'
+    assert response.content[:4] == b'RIFF'
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'content': b'not json', 'headers': {'Content-Type': 'application/json'}},
+    {'json': {'voice': 'kiro_assistant'}},
+    {'json': {'text': 'Too urgent.', 'priority': 'immediately'}}
+])
+def test_synthesize_rejects_bad_requests(asgi, kwargs):
+    response = asgi_request(asgi, 'POST', '/synthesize', **kwargs)
+    assert response.status_code == 400
+    assert 'error' in response.json()
+
+
+def test_get_synthesize_serves_byte_ranges(asgi):
+    params = {'text': 'Read back in parts.'}
+    whole = asgi_request(asgi, 'GET', '/synthesize', params=params)
+    assert whole.status_code == 200
+    assert whole.headers['accept-ranges'] == 'bytes'
+    part = asgi_request(asgi, 'GET', '/synthesize', params=params, headers={'Range': 'bytes=0-99'})
+    assert part.status_code == 206
+    assert part.content == whole.content[:100]
+    assert part.headers['content-range'] == f'bytes 0-99/{len(whole.content)}'
+
+
+def test_test_voice_speaks_the_sample(asgi):
+    response = asgi_request(asgi, 'GET', '/test/elvish_female')
+    assert response.status_code == 200
+    assert response.headers['content-disposition'] == 'inline; filename="test_elvish_female.wav"'
+    assert response.content[:4] == b'RIFF'
+
+
+def test_cancel_needs_a_client_id(asgi):
+    assert asgi_request(asgi, 'POST', '/cancel', json={}).status_code == 400
+    response = asgi_request(asgi, 'POST', '/cancel', headers={'X-Client-Id': 'nobody'})
+    assert response.status_code == 200
+    assert response.json() == {'client_id': 'nobody', 'cancelled': 0}
+
+
+def test_session_speaks_over_a_websocket(asgi):
+    from starlette.testclient import TestClient
+    
+    # Not entered as a context manager, which would run the app's shutdown and stop the shared pool
+    client = TestClient(asgi.app)
+    with client.websocket_connect('/session?voice=kiro_assistant&window=0') as socket:
+        assert socket.receive_json()['type'] == 'ready'
+        socket.send_json({'type': 'text', 'text': 'Hello over the socket.'})
+        socket.send_json({'type': 'flush'})
+        while True:
+            message = socket.receive()
+            if message.get('text') is not None and json.loads(message['text']) == {'type': 'done', 'utterance': 1}:
+                break
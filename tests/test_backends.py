@@ -0,0 +1,25 @@
+import logging
+
+import pytest
+
+import kokoro_backends
+
+
+@pytest.fixture
+def shared_backend(server, monkeypatch):
+    """The default backend taking turns on one engine, as espeak and NSSpeechSynthesizer do"""
+    from kokoro_benchmark import StubEngine
+    
+    class SharedBackend(kokoro_backends.Pyttsx3Backend):
+        shared = True
+    monkeypatch.setitem(kokoro_backends.BACKENDS, kokoro_backends.DEFAULT_BACKEND,
+                        lambda **kwargs: SharedBackend(engine_factory=StubEngine, **kwargs))
+
+
+@pytest.mark.parametrize('workers, warned', [(2, True), (1, False)])
+def test_thread_workers_sharing_one_engine_are_warned_about(server, engine, shared_backend, caplog, workers, warned):
+    pool = server.SynthesisWorkerPool(engine, workers, 8, 'thread')
+    with caplog.at_level(logging.WARNING):
+        assert pool.start() == workers
+    pool.shutdown()
+    assert ('KOKORO_WORKER_MODE=process' in caplog.text) == warned
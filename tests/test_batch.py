@@ -0,0 +1,59 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
+
+
+ITEMS = [
+    {'text': 'The first item of the batch.', 'voice': 'kiro_assistant'},
+    {'text': ''},
+    {'text': 'The third item, in another voice.', 'voice': 'elvish_female'}
+]
+
+
+def test_zip_holds_one_clip_per_item_and_an_index(client):
+    response = client.post('/synthesize/batch', json={'items': ITEMS, 'format': 'zip'})
+    assert response.status_code == 200
+    body = response.get_data()
+    archive = zipfile.ZipFile(io.BytesIO(body))
+    items = json.loads(archive.read('index.json'))['items']
+    assert [item['status'] for item in items] == ['ok', 'error', 'ok']
+    assert items[2]['voice'] == 'elvish_female'
+    for item in (items[0], items[2]):
+        clip = archive.read(item['file'])
+        assert clip[:4] == b'RIFF'
+        # The recorded offset lets a client slice the clip out without unzipping
+        assert body[item['offset']:item['offset'] + item['bytes']] == clip
+
+
+def test_multipart_starts_with_the_manifest(client):
+    response = client.post('/synthesize/batch', json={'items': ITEMS})
+    assert response.status_code == 200
+    assert response.mimetype == 'multipart/mixed'
+    boundary = response.mimetype_params['boundary'].encode()
+    parts = response.get_data().split(b'--' + boundary)[1:-1]
+    assert len(parts) == 1 + len(ITEMS)
+    manifest = json.loads(parts[0].split(b'\r\n\r\n', 1)[1])
+    assert [item['status'] for item in manifest['items']] == ['ok', 'error', 'ok']
+    assert b'X-Item-Status: error' in parts[2]
+
+
+@pytest.mark.parametrize('body', [
+    {},
+    {'items': []},
+    {'items': [{'text': 'x'}], 'format': 'tar'},
+    {'items': [{'text': 'x'}], 'priority': 'urgent'}
+])
+def test_malformed_batches_are_rejected(client, body):
+    assert client.post('/synthesize/batch', json=body).status_code == 400
+
+
+def test_too_many_items_are_rejected(client, server):
+    items = [{'text': 'x'}] * (server.MAX_BATCH_ITEMS + 1)
+    assert client.post('/synthesize/batch', json={'items': items}).status_code == 400
@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+
+from kokoro_pack import read_index
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# kokoro_bulk configures the server at import, so it runs in its own process on the stub backend
+RUN_BULK = '''
+import sys
+import kokoro_benchmark
+kokoro_benchmark.register_stub_backends()
+import kokoro_bulk
+sys.argv = ['kokoro_bulk'] + sys.argv[1:]
+sys.exit(kokoro_bulk.main())
+'''
+
+
+def bulk(tmp_path, manifest, *args):
+    env = dict(os.environ, PYTHONPATH=ROOT, KOKORO_DISK_CACHE_MB='0', KOKORO_CACHE_DIR=str(tmp_path / 'cache'))
+    result = subprocess.run([sys.executable, '-c', RUN_BULK, str(manifest), '--output', str(tmp_path / 'pack'),
+                             '--worker-mode', 'thread', *args],
+                            cwd=ROOT, env=env, capture_output=True, text=True, timeout=300)
+    return result.returncode, json.loads(result.stdout)
+
+
+def test_multi_sentence_phrases_fit_in_the_queue(tmp_path):
+    manifest = tmp_path / 'phrases.jsonl'
+    with open(manifest, 'w', encoding='utf-8') as f:
+        for phrase in range(20):
+            text = ' '.join(f'Phrase {phrase} has sentence number {sentence}.' for sentence in range(6))
+            f.write(json.dumps({'text': text, 'voice': 'kiro_assistant'}) + '\n')
+    
+    # Eight workers two phrases each, every phrase several chunks ahead: far past the default queue
+    status, stats = bulk(tmp_path, manifest, '--workers', '8')
+    assert status == 0
+    assert stats['rendered'] == 20 and stats['failed'] == 0
+    entries, clean = read_index(tmp_path / 'pack')
+    assert clean and len(entries) == 20
+    
+    # A second run resumes the pack and renders nothing
+    status, stats = bulk(tmp_path, manifest, '--workers', '2')
+    assert status == 0
+    assert stats['skipped'] == 20 and stats['rendered'] == 0
@@ -0,0 +1,85 @@
+import asyncio
+import copy
+
+from kokoro_cache import AudioCache, cache_key
+
+
+def test_key_changes_with_voice_config_and_format():
+    key = cache_key('Hello.', 'kiro', {'rate': 180})
+    assert key == cache_key('Hello.', 'kiro', {'rate': 180})
+    assert key != cache_key('Hello.', 'kiro', {'rate': 200})
+    assert key != cache_key('Hello.', 'kiro', {'rate': 180}, 'opus@native/default')
+    assert key != cache_key('Hello.', 'other', {'rate': 180})
+
+
+def test_memory_tier_evicts_least_recently_read():
+    cache = AudioCache(max_memory_bytes=20)
+    cache.put('a', 'kiro', b'x' * 8)
+    cache.put('b', 'kiro', b'y' * 8)
+    assert cache.get('a') == b'x' * 8
+    cache.put('c', 'kiro', b'z' * 8)
+    assert 'b' not in cache
+    assert cache.get('a') == b'x' * 8
+    assert cache.get('c') == b'z' * 8
+    assert cache.stats()['evictions'] == 1
+
+
+def test_clip_larger_than_memory_tier_is_not_kept():
+    cache = AudioCache(max_memory_bytes=4)
+    cache.put('a', 'kiro', b'x' * 8)
+    assert cache.get('a') is None
+
+
+def test_invalidate_voice_only_drops_that_voice(tmp_path):
+    cache = AudioCache(max_memory_bytes=1024, disk_dir=tmp_path, max_disk_bytes=1024)
+    cache.put('a', 'kiro', b'one')
+    cache.put('b', 'kiro', b'two')
+    cache.put('c', 'other', b'three')
+    assert cache.invalidate_voice('kiro') == 4
+    assert 'a' not in cache and 'b' not in cache
+    assert cache.get('c') == b'three'
+    assert not list((tmp_path / 'kiro').glob('*.bin'))
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    AudioCache(max_memory_bytes=1024, disk_dir=tmp_path, max_disk_bytes=1024).put('a', 'kiro', b'clip')
+    cache = AudioCache(max_memory_bytes=1024, disk_dir=tmp_path, max_disk_bytes=1024)
+    assert cache.get('a') == b'clip'
+    assert cache.stats()['disk_hits'] == 1
+
+
+def test_disk_tier_evicts_to_its_limit(tmp_path):
+    cache = AudioCache(max_memory_bytes=0, disk_dir=tmp_path, max_disk_bytes=20)
+    for key in 'abc':
+        cache.put(key, 'kiro', b'x' * 8)
+    assert cache.stats()['disk_bytes'] <= 20
+    assert len(list(tmp_path.glob('*/*.bin'))) == 2
+
+
+def test_lookup_finds_clip_written_by_another_process(tmp_path):
+    reader = AudioCache(max_memory_bytes=1024, disk_dir=tmp_path, max_disk_bytes=1024)
+    writer = AudioCache(max_memory_bytes=1024, disk_dir=tmp_path, max_disk_bytes=1024)
+    writer.put('a', 'kiro', b'shared')
+    assert 'a' in reader
+    assert reader.get('a') == b'shared'
+    assert reader.stats()['disk_hits'] == 1
+
+
+def test_editing_a_voice_only_invalidates_its_clips(engine):
+    text = 'Every voice caches this sentence on its own.'
+    for voice_id in ('kiro_assistant', 'elvish_female'):
+        asyncio.run(engine.synthesize_speech(text, voice_id))
+    edited = engine.content_key(text, 'kiro_assistant')
+    kept = engine.content_key(text, 'elvish_female')
+    assert edited in engine.cache and kept in engine.cache
+    
+    config = engine.voice_configs['kiro_assistant']
+    original = copy.deepcopy(config)
+    try:
+        engine.update_voice_config('kiro_assistant', {'speed_factor': 1.2})
+        assert edited not in engine.cache
+        assert kept in engine.cache
+        assert engine.content_key(text, 'kiro_assistant') != edited
+    finally:
+        config.clear()
+        config.update(original)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from kokoro_audio import AudioFormat
+from kokoro_dsp import VoiceEffectsChain, float_to_pcm16, pcm_to_float
+
+RATE = 24000
+
+
+def tone(frequency=300.0, seconds=1.0):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (0.5 * np.sin(2 * np.pi * frequency * t))[:, None].astype(np.float32)
+
+
+def dominant_frequency(samples):
+    spectrum = np.abs(np.fft.rfft(samples[:, 0]))
+    return np.argmax(spectrum) * RATE / len(samples)
+
+
+def test_neutral_voice_leaves_audio_untouched():
+    samples = tone()
+    assert np.allclose(VoiceEffectsChain('plain', {}, RATE).process(samples), samples)
+
+
+def test_chain_is_deterministic_per_voice():
+    config = {'pitch_shift': -0.2, 'characteristics': {'breathiness': 0.3, 'warmth': 0.8}}
+    first = VoiceEffectsChain('elvish_female', config, RATE).process(tone())
+    second = VoiceEffectsChain('elvish_female', config, RATE).process(tone())
+    assert np.array_equal(first, second)
+
+
+@pytest.mark.parametrize('pitch_shift', [0.3, -0.3])
+def test_pitch_shift_moves_the_fundamental_and_keeps_the_length(pitch_shift):
+    samples = tone()
+    shifted = VoiceEffectsChain('voice', {'pitch_shift': pitch_shift}, RATE).process(samples)
+    assert len(shifted) == len(samples)
+    assert (dominant_frequency(shifted) > 300) == (pitch_shift > 0)
+
+
+def test_reverb_adds_a_tail():
+    samples = tone(seconds=0.5)
+    reverberant = VoiceEffectsChain('dragon', {'characteristics': {'reverb': 0.3}}, RATE).process(samples)
+    assert len(reverberant) > len(samples)
+
+
+def test_saturation_and_eq_never_clip():
+    config = {'characteristics': {'gruffness': 1.0, 'warmth': 1.0, 'clarity': 1.0}}
+    processed = VoiceEffectsChain('orc', config, RATE).process(tone() * 2)
+    assert np.max(np.abs(processed)) <= 0.99 + 1e-6
+
+
+def test_pcm_round_trip():
+    samples = tone()
+    frames = float_to_pcm16(samples)
+    assert np.allclose(pcm_to_float(frames, AudioFormat(1, 2, RATE)), samples, atol=1e-4)
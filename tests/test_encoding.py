@@ -0,0 +1,68 @@
+import pytest
+
+import kokoro_encoding
+from kokoro_encoding import UnsupportedFormat, negotiate_format
+
+BROWSER_ACCEPT = 'audio/webm,audio/ogg,audio/wav;q=0.9,audio/*;q=0.9,*/*;q=0.5'
+
+
+@pytest.fixture
+def wav_only(monkeypatch):
+    monkeypatch.setattr(kokoro_encoding, 'encodable', lambda name: name == 'wav')
+
+
+@pytest.fixture
+def all_codecs(monkeypatch):
+    monkeypatch.setattr(kokoro_encoding, 'encodable', lambda name: True)
+
+
+def test_accept_prefers_opus_when_it_can_be_encoded(all_codecs):
+    assert negotiate_format({}, BROWSER_ACCEPT).name == 'opus'
+
+
+def test_accept_skips_codecs_that_cannot_be_encoded(wav_only):
+    assert negotiate_format({}, BROWSER_ACCEPT).name == 'wav'
+    assert negotiate_format({}, 'audio/ogg, audio/*;q=0.5').name == 'wav'
+
+
+def test_accept_without_wav_or_wildcard_is_refused(wav_only):
+    with pytest.raises(UnsupportedFormat):
+        negotiate_format({}, 'audio/ogg')
+
+
+def test_unencodable_default_falls_back_to_wav(wav_only, monkeypatch):
+    monkeypatch.setattr(kokoro_encoding, 'DEFAULT_FORMAT', 'opus')
+    assert negotiate_format({}, 'application/json').name == 'wav'
+
+
+def test_explicit_format_is_kept(wav_only):
+    assert negotiate_format({'format': 'opus'}, BROWSER_ACCEPT).name == 'opus'
+
+
+def flask_status(server, path, headers=None):
+    return server.app.test_client().get(path, headers=headers).status_code
+
+
+def asgi_status(path, headers=None):
+    import kokoro_asgi
+    from starlette.testclient import TestClient
+    return TestClient(kokoro_asgi.app).get(path, headers=headers).status_code
+
+
+@pytest.mark.parametrize('path', ['/test/kiro_assistant', '/synthesize?text=Hello'])
+def test_accept_only_unencodable_codecs_is_406(server, wav_only, path):
+    assert flask_status(server, path, {'Accept': 'audio/mpeg'}) == 406
+    assert asgi_status(path, {'Accept': 'audio/mpeg'}) == 406
+
+
+@pytest.mark.parametrize('query', ['format=tar', 'sample_rate=fast', 'sample_rate=100', 'format=wav&bitrate=64'])
+def test_bad_format_fields_are_400(server, wav_only, query):
+    path = f'/test/kiro_assistant?{query}'
+    assert flask_status(server, path, {'Accept': 'audio/mpeg'}) == 400
+    assert asgi_status(path) == 400
+
+
+def test_accept_with_wildcard_is_served_as_wav(server, wav_only):
+    response = server.app.test_client().get('/test/kiro_assistant', headers={'Accept': 'audio/mpeg, */*;q=0.1'})
+    assert response.status_code == 200
+    assert response.mimetype == 'audio/wav'
@@ -0,0 +1,102 @@
+import concurrent.futures
+
+import pytest
+
+from kokoro_cache import InflightRequests
+
+
+class Render:
+    """A queued render the test finishes by hand"""
+    
+    def __init__(self):
+        self.future = concurrent.futures.Future()
+        self.starts = 0
+        self.promotions = []
+    
+    def start(self):
+        self.starts += 1
+        return self.future
+    
+    def promote(self, priority):
+        self.promotions.append(priority)
+
+
+def test_identical_requests_share_one_render():
+    inflight, render = InflightRequests(), Render()
+    first = inflight.submit('key', render.start)
+    second = inflight.submit('key', render.start)
+    assert render.starts == 1
+    render.future.set_result(b'audio')
+    assert first.result() == second.result() == b'audio'
+    assert inflight.stats()['in_flight'] == 0
+    assert inflight.stats()['coalesced_requests'] == 1
+
+
+def test_failure_reaches_every_waiter():
+    inflight, render = InflightRequests(), Render()
+    first = inflight.submit('key', render.start)
+    second = inflight.submit('key', render.start)
+    render.future.set_exception(RuntimeError('engine failed'))
+    for waiter in (first, second):
+        with pytest.raises(RuntimeError):
+            waiter.result()
+
+
+def test_one_waiter_giving_up_keeps_the_render_for_the_rest():
+    inflight, render = InflightRequests(), Render()
+    first = inflight.submit('key', render.start)
+    second = inflight.submit('key', render.start)
+    first.cancel()
+    assert not render.future.cancelled()
+    render.future.set_result(b'audio')
+    assert second.result() == b'audio'
+
+
+def test_queued_render_is_abandoned_when_every_waiter_gives_up():
+    inflight, render = InflightRequests(), Render()
+    first = inflight.submit('key', render.start)
+    second = inflight.submit('key', render.start)
+    first.cancel()
+    second.cancel()
+    assert render.future.cancelled()
+    assert inflight.stats()['abandoned_renders'] == 1
+    # The next request starts a fresh render
+    inflight.submit('key', Render().start)
+    assert inflight.stats()['renders_started'] == 2
+
+
+def test_running_render_stays_joinable_after_its_waiters_leave():
+    inflight, render = InflightRequests(), Render()
+    waiter = inflight.submit('key', render.start)
+    # A worker has picked the render up
+    render.future.set_running_or_notify_cancel()
+    waiter.cancel()
+    assert not render.future.cancelled()
+    later = inflight.submit('key', render.start)
+    assert render.starts == 1
+    render.future.set_result(b'audio')
+    assert later.result() == b'audio'
+
+
+def test_more_urgent_joiner_promotes_the_render():
+    inflight, render = InflightRequests(), Render()
+    inflight.submit('key', render.start, priority=2, promote=render.promote)
+    inflight.submit('key', render.start, priority=1)
+    inflight.submit('key', render.start, priority=2)
+    assert render.promotions == [1]
+    assert inflight.stats()['promoted_renders'] == 1
+
+
+def test_start_failure_reaches_waiters_that_joined_meanwhile():
+    inflight = InflightRequests()
+    joined = []
+    
+    def start():
+        joined.append(inflight.submit('key', start))
+        raise RuntimeError('queue full')
+    
+    with pytest.raises(RuntimeError):
+        inflight.submit('key', start)
+    with pytest.raises(RuntimeError):
+        joined[0].result()
+    assert inflight.stats()['in_flight'] == 0
@@ -0,0 +1,132 @@
+import pytest
+
+from kokoro_pack import (
+    INDEX_FILE,
+    PACK_FILE,
+    PackWriter,
+    RangeNotSatisfiable,
+    VoicePackStore,
+    byte_range,
+    read_index
+)
+
+
+def write_pack(directory, clips):
+    writer = PackWriter(directory)
+    for key, data in clips.items():
+        writer.add(key, 'kiro', f'text {key}', key, 'audio/wav', data)
+    writer.close()
+
+
+def test_reopened_pack_keeps_its_clips(tmp_path):
+    write_pack(tmp_path, {'a': b'first', 'b': b'second'})
+    writer = PackWriter(tmp_path)
+    assert 'a' in writer and 'b' in writer
+    entry = writer.add('c', 'kiro', 'text c', None, 'audio/wav', b'third')
+    writer.close()
+    assert entry.offset == len(b'firstsecond')
+    assert (tmp_path / PACK_FILE).read_bytes() == b'firstsecondthird'
+
+
+def test_resume_cuts_off_a_half_written_clip(tmp_path):
+    write_pack(tmp_path, {'a': b'first'})
+    with open(tmp_path / PACK_FILE, 'ab') as pack:
+        pack.write(b'partial clip with no index line')
+    writer = PackWriter(tmp_path)
+    assert writer.size == len(b'first')
+    writer.add('b', 'kiro', 'text b', None, 'audio/wav', b'second')
+    writer.close()
+    assert (tmp_path / PACK_FILE).read_bytes() == b'firstsecond'
+    entries, clean = read_index(tmp_path)
+    assert clean and entries['b'].offset == len(b'first')
+
+
+def test_torn_index_line_is_dropped(tmp_path):
+    write_pack(tmp_path, {'a': b'first'})
+    with open(tmp_path / INDEX_FILE, 'a', encoding='utf-8') as index:
+        index.write('{"key": "b", "voice_id"')
+    assert not read_index(tmp_path)[1]
+    PackWriter(tmp_path).close()
+    entries, clean = read_index(tmp_path)
+    assert clean and list(entries) == ['a']
+
+
+def test_entry_past_the_end_of_the_pack_is_dropped(tmp_path):
+    write_pack(tmp_path, {'a': b'first', 'b': b'second'})
+    with open(tmp_path / PACK_FILE, 'r+b') as pack:
+        pack.truncate(len(b'first') + 2)
+    entries, clean = read_index(tmp_path)
+    assert not clean and list(entries) == ['a']
+    writer = PackWriter(tmp_path)
+    assert writer.size == len(b'first')
+    writer.close()
+
+
+def swap_link(link, target):
+    """Repoint a symlink atomically, the way a new pack goes live"""
+    scratch = link.with_name(link.name + '.tmp')
+    scratch.symlink_to(target)
+    scratch.replace(link)
+
+
+def test_store_without_a_path_serves_nothing():
+    store = VoicePackStore('')
+    assert not store.refresh()
+    assert store.get('a') is None
+
+
+def test_store_refresh_only_reloads_changed_packs(tmp_path):
+    write_pack(tmp_path / 'pack', {'a': b'first'})
+    store = VoicePackStore(str(tmp_path / 'pack'))
+    assert store.refresh()
+    assert not store.refresh()
+    assert bytes(store.get('a').data) == b'first'
+    assert store.stats()['loads'] == 1
+
+
+def test_store_picks_up_clips_appended_in_place(tmp_path):
+    write_pack(tmp_path / 'pack', {'a': b'first'})
+    store = VoicePackStore(str(tmp_path / 'pack'))
+    store.refresh()
+    write_pack(tmp_path / 'pack', {'b': b'second'})
+    assert store.refresh()
+    assert bytes(store.get('b').data) == b'second'
+
+
+def test_store_swaps_to_a_repointed_pack(tmp_path):
+    write_pack(tmp_path / 'v1', {'a': b'old clip'})
+    write_pack(tmp_path / 'v2', {'b': b'new clip'})
+    link = tmp_path / 'live'
+    swap_link(link, tmp_path / 'v1')
+    store = VoicePackStore(str(link))
+    store.refresh()
+    sending = store.get('a')
+    
+    swap_link(link, tmp_path / 'v2')
+    assert store.refresh()
+    assert store.get('a') is None
+    assert bytes(store.get('b').data) == b'new clip'
+    # A response still sending from the replaced pack keeps its mapping
+    assert bytes(sending.data) == b'old clip'
+
+
+def test_store_keeps_serving_while_the_pack_is_missing(tmp_path):
+    write_pack(tmp_path / 'v1', {'a': b'first'})
+    link = tmp_path / 'live'
+    swap_link(link, tmp_path / 'v1')
+    store = VoicePackStore(str(link))
+    store.refresh()
+    link.unlink()
+    assert not store.refresh()
+    assert bytes(store.get('a').data) == b'first'
+
+
+def test_byte_range():
+    assert byte_range('bytes=0-3', 10) == (0, 4)
+    assert byte_range('bytes=5-', 10) == (5, 10)
+    assert byte_range('bytes=-4', 10) == (6, 10)
+    assert byte_range('bytes=0-99', 10) == (0, 10)
+    assert byte_range('bytes=0-1,4-5', 10) is None
+    assert byte_range('items=0-1', 10) is None
+    with pytest.raises(RangeNotSatisfiable):
+        byte_range('bytes=10-', 10)
@@ -0,0 +1,146 @@
+import concurrent.futures
+import queue
+import types
+
+import pytest
+
+from kokoro_scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_NORMAL,
+    CancellationToken,
+    ClientTokens,
+    JobScheduler,
+    parse_priority
+)
+
+
+class Job:
+    def __init__(self, name, priority=PRIORITY_NORMAL):
+        self.name = name
+        self.priority = priority
+        self.future = concurrent.futures.Future()
+    
+    def __repr__(self):
+        return self.name
+
+
+def drain(scheduler, **kwargs):
+    scheduler.close(1)
+    names = []
+    while True:
+        job = scheduler.get(**kwargs)
+        if job is None:
+            return names
+        names.append(job.name)
+
+
+def test_most_urgent_first_then_submission_order():
+    scheduler = JobScheduler(8)
+    for job in (Job('n1'), Job('b1', PRIORITY_BACKGROUND), Job('i1', PRIORITY_INTERACTIVE), Job('n2')):
+        scheduler.put(job)
+    assert drain(scheduler) == ['i1', 'n1', 'n2', 'b1']
+
+
+def test_cancelled_job_gives_its_slot_back():
+    scheduler = JobScheduler(1)
+    job = Job('cancelled')
+    scheduler.put(job)
+    with pytest.raises(queue.Full):
+        scheduler.put(Job('refused'))
+    job.future.cancel()
+    assert scheduler.qsize() == 0
+    scheduler.put(Job('next'))
+    assert drain(scheduler) == ['next']
+
+
+def test_background_jobs_fill_only_their_share():
+    scheduler = JobScheduler(4)
+    scheduler.put(Job('b1', PRIORITY_BACKGROUND))
+    scheduler.put(Job('b2', PRIORITY_BACKGROUND))
+    with pytest.raises(queue.Full):
+        scheduler.put(Job('b3', PRIORITY_BACKGROUND))
+    scheduler.put(Job('i1', PRIORITY_INTERACTIVE))
+
+
+def test_promote_moves_a_queued_job_up():
+    scheduler = JobScheduler(8)
+    background = Job('b1', PRIORITY_BACKGROUND)
+    scheduler.put(Job('n1'))
+    scheduler.put(background)
+    assert scheduler.promote(background, PRIORITY_INTERACTIVE)
+    assert not scheduler.promote(background, PRIORITY_NORMAL)
+    assert drain(scheduler) == ['b1', 'n1']
+    assert scheduler.stats()['promotions'] == 1
+
+
+def test_claim_leaves_other_jobs_queued():
+    scheduler = JobScheduler(8)
+    for job in (Job('kiro1', PRIORITY_INTERACTIVE), Job('elf1'), Job('kiro2')):
+        scheduler.put(job)
+    assert scheduler.get(claim=lambda job: job.name.startswith('elf')).name == 'elf1'
+    assert scheduler.qsize() == 2
+    assert drain(scheduler) == ['kiro1', 'kiro2']
+
+
+def test_claim_skips_cancelled_jobs():
+    scheduler = JobScheduler(8)
+    cancelled, kept = Job('elf1'), Job('elf2')
+    scheduler.put(cancelled)
+    scheduler.put(kept)
+    cancelled.future.cancel()
+    assert scheduler.get(claim=lambda job: True) is kept
+
+
+def test_stop_markers_queue_behind_every_job():
+    scheduler = JobScheduler(8)
+    scheduler.close(1)
+    scheduler.put(Job('b1', PRIORITY_BACKGROUND))
+    assert scheduler.get().name == 'b1'
+    assert scheduler.get() is None
+
+
+def test_token_cancels_attached_futures():
+    token = CancellationToken()
+    future = concurrent.futures.Future()
+    token.attach(future)
+    assert token.cancel()
+    assert future.cancelled()
+    assert not token.cancel()
+    late = concurrent.futures.Future()
+    token.attach(late)
+    assert late.cancelled()
+
+
+def test_client_tokens_cancel_only_that_client():
+    tokens = ClientTokens()
+    first, second, other = tokens.issue('a'), tokens.issue('a'), tokens.issue('b')
+    tokens.release('a', second)
+    assert tokens.cancel('a') == 1
+    assert first.cancelled and not second.cancelled and not other.cancelled
+
+
+def test_parse_priority():
+    assert parse_priority(None, PRIORITY_NORMAL) == PRIORITY_NORMAL
+    assert parse_priority('Interactive', PRIORITY_NORMAL) == PRIORITY_INTERACTIVE
+    with pytest.raises(ValueError):
+        parse_priority('urgent', PRIORITY_NORMAL)
+
+
+def test_worker_that_claims_a_cancelled_job_is_not_left_busy(server, engine):
+    # A routed pool of one, whose worker claims jobs and so marks itself busy
+    pool = types.SimpleNamespace(voice_engine=engine, mode='thread', num_workers=1, scheduler=JobScheduler(8),
+                                 routes={'unrouted': None}, route=lambda voice_id: None)
+    worker = server.SynthesisWorker(pool, 0)
+    job = server.SynthesisJob('Cancelled as it is taken.', 'kiro_assistant', engine.get_voice_config('kiro_assistant'))
+    
+    def cancelled_when_taken():
+        job.future.cancel()
+        return concurrent.futures.Future.set_running_or_notify_cancel(job.future)
+    job.future.set_running_or_notify_cancel = cancelled_when_taken
+    pool.scheduler.put(job)
+    pool.scheduler.close(1)
+    worker.start()
+    worker.join(timeout=30)
+    assert job.future.cancelled()
+    assert not worker.is_alive() and not worker.busy
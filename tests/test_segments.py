@@ -0,0 +1,41 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from kokoro_audio import wav_duration
+from kokoro_dsp import CROSSFADE_SECONDS, encode_wav, stitch_clips
+
+RATE = 16000
+
+
+def tone(seconds, rate=RATE):
+    t = np.arange(int(seconds * rate)) / rate
+    return encode_wav((0.5 * np.sin(2 * np.pi * 440 * t))[:, None].astype(np.float32), rate)
+
+
+def test_stitched_length_counts_pauses_and_crossfades():
+    stitched = stitch_clips([tone(1.0), tone(1.0)], [0.5, 0.5])
+    # Clip, pause, clip: two joins, and the last clip's pause is dropped
+    assert wav_duration(stitched) == pytest.approx(2.5 - 2 * CROSSFADE_SECONDS, abs=1 / RATE)
+
+
+def test_stitching_without_pauses_joins_clip_to_clip():
+    stitched = stitch_clips([tone(1.0), tone(0.5)], [0.0, 0.0])
+    assert wav_duration(stitched) == pytest.approx(1.5 - CROSSFADE_SECONDS, abs=1 / RATE)
+
+
+def test_stitching_rejects_mixed_formats():
+    with pytest.raises(ValueError):
+        stitch_clips([tone(0.5), tone(0.5, rate=22050)], [0.0, 0.0])
+
+
+def test_editing_one_sentence_only_renders_that_sentence(engine):
+    sentences = ['The first sentence stays.', 'The second sentence stays too.', 'The last one changes.']
+    report = {}
+    asyncio.run(engine.synthesize_speech(' '.join(sentences), 'kiro_assistant', report=report))
+    assert report == {'segments': 3, 'segments_reused': 0}
+    
+    sentences[-1] = 'The last one has changed.'
+    asyncio.run(engine.synthesize_speech(' '.join(sentences), 'kiro_assistant', report=report))
+    assert report == {'segments': 3, 'segments_reused': 2}
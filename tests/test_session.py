@@ -0,0 +1,181 @@
+import asyncio
+import concurrent.futures
+import time
+
+import pytest
+
+import kokoro_session
+from kokoro_session import FRAME_HEADER, SpeechSession
+
+REPLY = 'Here is the first sentence of the reply. And here is a second one, a little longer than the first.'
+
+
+class Client:
+    """Records what a session sends"""
+    
+    def __init__(self):
+        self.messages = []
+        self.frames = []
+    
+    async def send_json(self, message):
+        self.messages.append(message)
+    
+    async def send_bytes(self, data):
+        self.frames.append(FRAME_HEADER.unpack_from(data))
+    
+    def done(self, utterance):
+        return {'type': 'done', 'utterance': utterance} in self.messages
+
+
+async def until(condition, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        await asyncio.sleep(0.01)
+
+
+async def settle():
+    """Give the sender time to send anything it was going to"""
+    await asyncio.sleep(0.3)
+
+
+@pytest.fixture
+def untrimmed(monkeypatch):
+    """The stub backend renders silence, which trimming would hold back until the utterance ends"""
+    monkeypatch.setattr(kokoro_session, 'TRIM_SILENCE', False)
+
+
+def run_session(engine, scenario, **options):
+    async def main():
+        client = Client()
+        session = SpeechSession(engine, client.send_json, client.send_bytes, 'test')
+        session.configure(options)
+        try:
+            await scenario(session, client)
+        finally:
+            await session.close()
+    asyncio.run(main())
+
+
+def test_speaks_each_utterance_in_numbered_frames(engine):
+    async def scenario(session, client):
+        session.feed(REPLY)
+        session.flush()
+        await until(lambda: client.done(1))
+        session.feed('A second utterance.')
+        session.flush()
+        await until(lambda: client.done(2))
+        assert [seq for seq, _ in client.frames] == list(range(len(client.frames)))
+        utterances = [utterance for _, utterance in client.frames]
+        assert utterances == sorted(utterances) and set(utterances) == {1, 2}
+        assert client.messages[0]['type'] == 'format'
+        assert engine.admission.outstanding == 0
+    run_session(engine, scenario, window=0)
+
+
+def test_stops_at_the_window_until_frames_are_acknowledged(engine, untrimmed):
+    async def scenario(session, client):
+        session.feed(REPLY)
+        session.flush()
+        await until(lambda: len(client.frames) == 2)
+        await settle()
+        assert len(client.frames) == 2
+        session.ack(0)
+        await until(lambda: len(client.frames) == 3)
+        await settle()
+        assert len(client.frames) == 3
+        session.configure({'window': 0})
+        await until(lambda: client.done(1))
+    run_session(engine, scenario, window=2)
+
+
+def test_cancel_drops_unsent_frames_and_queued_renders(engine, untrimmed):
+    async def scenario(session, client):
+        session.feed(REPLY * 3)
+        await until(lambda: len(client.frames) == 2)
+        assert session.cancel() == 1
+        await settle()
+        assert len(client.frames) == 2
+        assert not client.done(1)
+        assert engine.admission.outstanding == 0
+        
+        session.configure({'window': 0})
+        session.feed('After the cancel.')
+        session.flush()
+        await until(lambda: client.done(2))
+        assert {utterance for _, utterance in client.frames[2:]} == {2}
+    run_session(engine, scenario, window=2)
+
+
+def test_text_turned_away_by_the_queue_is_not_spoken(engine, server, monkeypatch):
+    def queue_full(*args, **kwargs):
+        raise server.SynthesisQueueFull('Synthesis queue is full')
+    
+    async def scenario(session, client):
+        with monkeypatch.context() as patch:
+            patch.setattr(engine, 'submit_processed', queue_full)
+            with pytest.raises(server.SynthesisQueueFull):
+                session.feed(REPLY)
+        assert not session.renders
+        assert engine.admission.outstanding == 0
+        
+        # The session carries on with the next text
+        session.feed('Still here.')
+        session.flush()
+        await until(lambda: client.done(1))
+        assert client.frames
+    run_session(engine, scenario, window=0)
+
+
+def test_a_failed_render_is_reported_and_the_session_carries_on(engine, monkeypatch):
+    submit = engine.submit_processed
+    
+    def failing(text, *args, **kwargs):
+        if text.startswith('Broken'):
+            future = concurrent.futures.Future()
+            future.set_exception(RuntimeError('render failed'))
+            return future
+        if text.startswith('Garbled'):
+            future = concurrent.futures.Future()
+            future.set_result(b'not a wav file')
+            return future
+        return submit(text, *args, **kwargs)
+    
+    async def scenario(session, client):
+        monkeypatch.setattr(engine, 'submit_processed', failing)
+        for utterance, text in enumerate(['Broken sentence.', 'Garbled sentence.', 'Still here.'], 1):
+            session.feed(text)
+            session.flush()
+            await until(lambda: client.done(utterance))
+        errors = [message for message in client.messages if message['type'] == 'error']
+        assert [error['utterance'] for error in errors] == [1, 2]
+        assert errors[0]['message'] == 'render failed'
+        assert {utterance for _, utterance in client.frames} == {3}
+        assert not session.sender.done()
+        assert engine.admission.outstanding == 0
+    run_session(engine, scenario, window=0)
+
+
+def test_a_failed_socket_closes_the_session(engine, untrimmed):
+    async def main():
+        client = Client()
+        closed = []
+        
+        async def send_bytes(data):
+            raise ConnectionError('socket gone')
+        
+        async def close_transport(code):
+            closed.append(code)
+        
+        session = SpeechSession(engine, client.send_json, send_bytes, 'test', close_transport)
+        session.configure({'window': 0})
+        try:
+            session.feed(REPLY * 3)
+            session.flush()
+            await until(lambda: closed)
+            await until(lambda: engine.admission.outstanding == 0)
+            assert closed == [1011]
+            assert session.closed and session.sender.done() and not session.renders
+        finally:
+            await session.close()
+    asyncio.run(main())
@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+from kokoro_text import normalize_text, split_ready_text
+
+
+def texts(text):
+    return [segment.text for segment in normalize_text(text)]
+
+
+def test_closing_quote_stays_with_its_sentence():
+    assert texts('He said "Hi." Then left.') == ['He said "Hi."', 'Then left.']
+    assert texts('Call (me.) Now.') == ['Call (me.)', 'Now.']
+
+
+def test_split_ready_text_keeps_closing_quote():
+    assert split_ready_text('He said "Hi." Then') == ('He said "Hi."', ' Then')
+
+
+def test_thousands_groups_must_be_three_digits():
+    assert texts('Price: 1,2345') == ['Price:', 'one, two thousand three hundred forty-five.']
+    assert texts('1,234,567') == ['one million two hundred thirty-four thousand five hundred sixty-seven.']
+
+
+def test_money_groups_must_be_three_digits():
+    assert 'thirty-four5' not in texts('$1,2345')[0]
+    assert texts('$1,234.50') == ['one thousand two hundred thirty-four dollars and fifty cents.']
+
+
+def test_times_are_read_as_times():
+    assert texts('10:30') == ['ten thirty.']
+    assert texts('Meet at 9:05.') == ['Meet at nine oh five.']
+    assert texts('10:00') == ["ten o'clock."]
+    assert texts('7:30pm') == ['seven thirty p m.']
+
+
+def test_stray_colon_is_a_pause():
+    assert texts('Ratio 3:2 wins.') == ['Ratio three, two wins.']
+
+
+@pytest.mark.parametrize('pattern', ['[', '[a', '![', '[a](', '[a](x', '_', 'a_', '(', '1,', ':'])
+def test_pathological_lines_normalize_in_linear_time(pattern):
+    # Quadratic scanning took several seconds at this length
+    line = pattern * (16000 // len(pattern)) + 'a'
+    started = time.perf_counter()
+    normalize_text(line)
+    assert time.perf_counter() - started < 1.0
+
+
+def test_links_and_identifiers_still_read():
+    assert texts('See [the docs](https://example.com/a) now.') == ['See the docs now.']
+    assert texts('![logo](logo.png) here') == ['logo here.']
+    assert texts('Call __init__ and my_var_name.') == ['Call init and my var name.']